@@ -0,0 +1,76 @@
+"""
+Caché por empresa (tenant). Cada clave queda bajo un "scope" (catalog, reports, plans...)
+con una generación propia: invalidar = cambiar la generación, y todas las claves viejas
+del scope dejan de leerse sin tener que borrarlas una por una.
+Las señales de api/signals.py invalidan al guardar Product, Inventory, Sale, Subscription, Plan, etc.
+"""
+
+import threading
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+DEFAULT_TIMEOUT = 3600
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(event, n=1):
+    with _stats_lock: _stats[event] += n
+
+def _gen_key(company_id, scope): return f"gen:{company_id or 'global'}:{scope}"
+
+def tenant_key(company_id, scope, name):
+    """Clave namespaced: empresa + scope + generación vigente del scope."""
+    gen = cache.get_or_set(_gen_key(company_id, scope), uuid.uuid4().hex[:12], None)
+    return f"{company_id or 'global'}:{scope}:{gen}:{name}"
+
+def cached(company_id, scope, name, builder, timeout=DEFAULT_TIMEOUT):
+    """Devuelve el valor en caché o lo construye con builder() y lo guarda."""
+    key = tenant_key(company_id, scope, name)
+    value = cache.get(key)
+    if value is not None:
+        _count('hits')
+        return value
+    _count('misses')
+    value = builder()
+    cache.set(key, value, timeout)
+    return value
+
+async def atenant_key(company_id, scope, name):
+    gen = await cache.aget_or_set(_gen_key(company_id, scope), uuid.uuid4().hex[:12], None)
+    return f"{company_id or 'global'}:{scope}:{gen}:{name}"
+
+async def acached(company_id, scope, name, builder, timeout=DEFAULT_TIMEOUT):
+    """Versión para vistas async de cached(): builder es una corrutina (ORM async o sync_to_async)."""
+    key = await atenant_key(company_id, scope, name)
+    value = await cache.aget(key)
+    if value is not None:
+        _count('hits')
+        return value
+    _count('misses')
+    value = await builder()
+    await cache.aset(key, value, timeout)
+    return value
+
+def invalidate(company_id, *scopes):
+    """Invalida los scopes de una empresa (company_id=None para datos globales) al confirmar la transacción."""
+    def bump():
+        cache.set_many({_gen_key(company_id, s): uuid.uuid4().hex[:12] for s in scopes}, None)
+        _count('invalidations', len(scopes))
+    transaction.on_commit(bump)
+
+def cache_stats():
+    """Estadísticas de este proceso: aciertos, fallos, invalidaciones y tasa de acierto."""
+    with _stats_lock: stats = dict(_stats)
+    reads = stats.get('hits', 0) + stats.get('misses', 0)
+    return {
+        'hits': stats.get('hits', 0),
+        'misses': stats.get('misses', 0),
+        'invalidations': stats.get('invalidations', 0),
+        'hit_ratio': round(stats.get('hits', 0) / reads, 4) if reads else 0,
+        'backend': settings.CACHES['default']['BACKEND'],
+    }
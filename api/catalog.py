@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import Company, Product, ProductTombstone
+from .cache import acached
+
+CATALOG_FIELDS = ['id', 'sku', 'name', 'price']
+SEARCH_LIMIT = 50
+# Margen al pedir cambios "desde" una versión: cubre transacciones que confirmaron tarde
+SYNC_OVERLAP = timedelta(seconds=5)
+# Vida de los registros de borrado (manage.py prune_tombstones): una caja que no sincroniza hace más recibe el catálogo completo
+TOMBSTONE_TTL = timedelta(days=30)
+
+
+async def _arows(qs): return [[p['id'], p['sku'], p['name'], int(p['price'])] async for p in qs.values(*CATALOG_FIELDS)]
+
+def _to_version(dt): return int(dt.timestamp() * 1_000_000) if dt else 0
+def _from_version(version): return datetime.fromtimestamp(version / 1_000_000, tz=dt_timezone.utc)
+
+def _catalog_qs(company_id): return Product.objects.filter(company_id=company_id).order_by('name')
+def _search_qs(company_id, term, limit): return _catalog_qs(company_id).filter(Q(sku__istartswith=term) | Q(name__icontains=term))[:limit]
+def _delta_qs(company_id, since):
+    start = _from_version(since) - SYNC_OVERLAP
+    return (_catalog_qs(company_id).filter(updated_at__gt=start),
+            ProductTombstone.objects.filter(company_id=company_id, deleted_at__gt=start).values_list('product_id', flat=True))
+
+def delta_floor():
+    """Versión más antigua que admite sincronización incremental: los borrados anteriores pudieron purgarse."""
+    return _to_version(timezone.now() - TOMBSTONE_TTL + SYNC_OVERLAP)
+
+def prune_tombstones():
+    """Borra los registros de borrado de más de TOMBSTONE_TTL y los de empresas ya eliminadas -> cantidad borrada."""
+    stale = Q(deleted_at__lt=timezone.now() - TOMBSTONE_TTL) | ~Q(company_id__in=Company.objects.values('id'))
+    return ProductTombstone.objects.filter(stale).delete()[0]
+
+async def acatalog_version(company_id):
+    """Versión del catálogo = último cambio (edición o borrado) en microsegundos. En caché hasta el próximo cambio."""
+    async def build():
+        edited = (await Product.objects.filter(company_id=company_id).aaggregate(m=Max('updated_at')))['m']
+        deleted = (await ProductTombstone.objects.filter(company_id=company_id).aaggregate(m=Max('deleted_at')))['m']
+        return max(_to_version(edited), _to_version(deleted))
+    return await acached(company_id, 'catalog', 'version', build)
+
+async def afull_catalog(company_id):
+    """Catálogo completo en formato compacto (filas [id, sku, nombre, precio])."""
+    return await acached(company_id, 'catalog', 'full', lambda: _arows(_catalog_qs(company_id)))
+
+async def acatalog_delta(company_id, since):
+    """Productos cambiados y borrados desde la versión `since` (usa los índices por (company, fecha))."""
+    changed, deleted = _delta_qs(company_id, since)
+    return await _arows(changed), [pid async for pid in deleted]
+
+async def asearch_catalog(company_id, term, limit=SEARCH_LIMIT):
+    """Búsqueda por prefijo de SKU o texto contenido en el nombre."""
+    return await _arows(_search_qs(company_id, term, limit))
@@ -0,0 +1,141 @@
+"""
+Canal de eventos en vivo por empresa (Server-Sent Events en /events/) para el POS, el panel y los reportes.
+
+Publicar: el inventario, el registro de ventas y los cambios de catálogo llaman a publish_* dentro de
+su transacción. El lote se escribe al confirmar, así un rollback no publica nada. Cada empresa
+tiene en la caché un contador de secuencia y un lote por número, que vive EVENTS_TTL segundos.
+El contador usa cache.incr: con varios workers la caché debe ser redis (atómico y compartido); con locmem
+sólo ven los eventos las conexiones del mismo proceso, y con el backend 'file' el canal se apaga
+(settings.EVENTS_ENABLED) porque su incr no es atómico. También queda apagado fuera de ASGI: con WSGI /events/
+responde 204 y publicar sólo costaría queries y escrituras en la caché.
+
+Leer: cada conexión revisa el contador cada POLL_SECONDS y fusiona los lotes nuevos. El stock queda
+con el último valor por sucursal+producto y la suma de sus cambios; las ventas, sumadas por sucursal.
+Una ráfaga de cien ventas llega así como un mensaje por tipo. El número de lote va como id del mensaje:
+el navegador lo reenvía en Last-Event-ID al reconectar. Si se atrasó más que la vida de los lotes,
+recibe 'reset' y recarga los datos. Sólo se sirve con ASGI: cada conexión abierta es una corrutina; con WSGI
+ocuparía un hilo del servidor por pestaña durante STREAM_SECONDS.
+"""
+
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Inventory
+
+EVENTS_TTL = 300
+POLL_SECONDS = 1
+STREAM_SECONDS = 300    # luego el navegador reconecta solo con Last-Event-ID
+HEARTBEAT_SECONDS = 15  # comentario SSE para que los proxies no corten la conexión
+RETRY_MS = 3000
+MAX_BACKLOG = 1000      # lotes; más atrás se responde 'reset'
+
+
+def _seq_key(company_id): return f'events:{company_id}:seq'
+def _batch_key(company_id, seq): return f'events:{company_id}:{seq}'
+
+def _append(company_id, events):
+    cache.add(_seq_key(company_id), 0, None)
+    try: seq = cache.incr(_seq_key(company_id))
+    except ValueError:  # el contador salió de la caché entre add e incr
+        seq = 1
+        cache.set(_seq_key(company_id), seq, None)
+    cache.set(_batch_key(company_id, seq), events, EVENTS_TTL)
+
+def enabled(): return getattr(settings, 'EVENTS_ENABLED', False)
+
+def publish(company_id, events):
+    """Publica [(tipo, datos)] al confirmar la transacción en curso (de inmediato si no hay una)."""
+    if company_id and events and enabled(): transaction.on_commit(lambda: _append(company_id, events))
+
+def publish_stock(company_id, deltas):
+    """deltas {(branch_id, product_id): cambio}. Al confirmar lee el stock vigente de esas filas (1 query por KEY_CHUNK filas)."""
+    if not company_id or not deltas or not enabled(): return
+    def send():
+        from .inventory import key_chunks, match  # inventory importa este módulo
+        rows = [r for chunk in key_chunks(deltas) for r in Inventory.objects.filter(match(chunk)).values_list('branch_id', 'product_id', 'stock')]
+        _append(company_id, [('stock', [[b, p, stock, deltas[(b, p)]] for b, p, stock in rows])])
+    transaction.on_commit(send)
+
+def publish_sales(sales):
+    """Ventas de hoy recién registradas (pueden ser de varias empresas en la ingesta masiva)."""
+    by_company, today = {}, timezone.localdate()
+    for sale in sales:
+        # Una venta offline de otro día no suma a los totales "de hoy" de las pantallas abiertas
+        if timezone.localdate(sale.created_at) == today: by_company.setdefault(sale.company_id, []).append([sale.branch_id, int(sale.total)])
+    for company_id, rows in by_company.items(): publish(company_id, [('sale', rows)])
+
+def publish_catalog(company_id):
+    """Aviso de que cambió el catálogo: el POS pide el delta con su versión (?since=)."""
+    publish(company_id, [('catalog', None)])
+
+# ==========================================
+# LECTURA Y FUSIÓN
+# ==========================================
+
+def _message(event, data, seq=None):
+    return (f'id: {seq}\n' if seq is not None else '') + f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+class EventReader:
+    """Cursor de una conexión sobre los lotes de su empresa; sólo usa la caché."""
+
+    def __init__(self, company_id, last_id=None):
+        self.company_id = company_id
+        head = cache.get(_seq_key(company_id)) or 0
+        self.last = head if last_id is None or last_id > head else last_id  # sin Last-Event-ID: desde ahora
+        self.waits = 0
+
+    def poll(self):
+        """Texto SSE con lo publicado desde la última lectura, fusionado; '' si no hay nada."""
+        head = cache.get(_seq_key(self.company_id)) or 0
+        if head == self.last: return ''
+        if head < self.last or head - self.last > MAX_BACKLOG:
+            self.last = head
+            return _message('reset', {}, head)
+        seqs = range(self.last + 1, head + 1)
+        found = cache.get_many([_batch_key(self.company_id, s) for s in seqs])
+        stock, sales, catalog, reset = {}, {}, False, False
+        for seq in seqs:
+            batch = found.get(_batch_key(self.company_id, seq))
+            if batch is None:
+                # Otro proceso incrementó el contador pero aún no escribe el lote: se espera un par de lecturas;
+                # si sigue sin aparecer, expiró
+                self.waits += 1
+                if self.waits <= 2: break
+                reset = True
+            self.waits, self.last = 0, seq
+            for kind, data in batch or ():
+                if kind == 'stock':
+                    for b, p, value, delta in data:
+                        previous = stock.get((b, p))
+                        stock[(b, p)] = [b, p, value, delta + (previous[3] if previous else 0)]
+                elif kind == 'sale':
+                    for b, total in data:
+                        count, amount = sales.get(b, (0, 0))
+                        sales[b] = (count + 1, amount + total)
+                elif kind == 'catalog': catalog = True
+        messages = []
+        if reset: messages.append(('reset', {}))
+        if stock: messages.append(('stock', {'rows': list(stock.values())}))
+        if sales: messages.append(('sales', {'branches': {b: {'count': c, 'total': t} for b, (c, t) in sales.items()}}))
+        if catalog: messages.append(('catalog', {}))
+        return ''.join(_message(event, data, self.last if i == len(messages) - 1 else None) for i, (event, data) in enumerate(messages))
+
+async def astream(company_id, last_id=None, seconds=STREAM_SECONDS):
+    """Generador SSE de una conexión; las lecturas de caché usan el pool compartido de hilos, no el de la petición."""
+    reader = await sync_to_async(EventReader, thread_sensitive=False)(company_id, last_id)
+    poll = sync_to_async(reader.poll, thread_sensitive=False)
+    yield f'retry: {RETRY_MS}\n\n'
+    deadline, quiet = time.monotonic() + seconds, 0
+    while time.monotonic() < deadline:
+        await asyncio.sleep(POLL_SECONDS)
+        chunk = await poll()
+        quiet = 0 if chunk else quiet + POLL_SECONDS
+        if quiet >= HEARTBEAT_SECONDS: chunk, quiet = ': ping\n\n', 0
+        if chunk: yield chunk
@@ -0,0 +1,93 @@
+"""
+Exportaciones en streaming (CSV / NDJSON). Las filas salen de un único SELECT con los JOIN
+necesarios (SKU, sucursal, vendedor) y se leen con .iterator(chunk_size=...): en PostgreSQL
+es un cursor del lado del servidor, así la memoria no crece con el tamaño de la exportación.
+"""
+
+import csv
+import json
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from .models import Sale, SaleItem, Inventory
+
+EXPORT_CHUNK_SIZE = 2000
+FORMATS = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+# tipo -> columnas (encabezado, campo ORM)
+EXPORT_COLUMNS = {
+    'sales': [
+        ('id', 'id'), ('created_at', 'created_at'), ('branch', 'branch__name'), ('seller', 'seller__email'),
+        ('payment_method', 'payment_method'), ('total', 'total'), ('idempotency_key', 'idempotency_key'),
+    ],
+    'sale_items': [
+        ('sale_id', 'sale_id'), ('created_at', 'sale__created_at'), ('branch', 'sale__branch__name'), ('seller', 'sale__seller__email'),
+        ('sku', 'product__sku'), ('product', 'product__name'), ('quantity', 'quantity'), ('price', 'price_at_moment'), ('subtotal', 'subtotal'),
+    ],
+    'inventory': [
+        ('branch', 'branch__name'), ('sku', 'product__sku'), ('product', 'product__name'),
+        ('stock', 'stock'), ('min_stock', 'min_stock'), ('cost', 'product__cost'), ('price', 'product__price'),
+    ],
+}
+
+
+def date_bounds(date_from=None, date_to=None):
+    """Días locales [desde, hasta] -> rango semiabierto de datetimes (filtro sargable sobre created_at)."""
+    start = timezone.make_aware(datetime.combine(date_from, time.min)) if date_from else None
+    end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min)) if date_to else None
+    return start, end
+
+def export_queryset(company_id, kind, start=None, end=None):
+    """QuerySet de tuplas ya unidas por JOIN; start/end (datetime) filtran por fecha de venta."""
+    if kind == 'sales':
+        qs, date_field, order = Sale.objects.filter(company_id=company_id), 'created_at', ('created_at', 'id')
+    elif kind == 'sale_items':
+        qs, date_field, order = SaleItem.objects.filter(sale__company_id=company_id), 'sale__created_at', ('sale__created_at', 'id')
+    elif kind == 'inventory':  # foto del stock actual: sin filtro de fechas
+        qs, date_field, order = Inventory.objects.filter(branch__company_id=company_id), None, ('branch_id', 'product__sku')
+    else:
+        raise ValueError(f'Tipo de exportación desconocido: {kind}')
+    if date_field and start: qs = qs.filter(**{f'{date_field}__gte': start})
+    if date_field and end: qs = qs.filter(**{f'{date_field}__lt': end})
+    return qs.order_by(*order).values_list(*[field for _, field in EXPORT_COLUMNS[kind]])
+
+def _cell(value):
+    if isinstance(value, datetime): return timezone.localtime(value).isoformat(timespec='seconds')
+    if isinstance(value, Decimal): return int(value)  # montos en pesos, sin decimales
+    return value  # csv.writer escribe None como ''
+
+class _Echo:
+    """Pseudo-archivo para csv.writer: devuelve la línea en vez de guardarla."""
+    def write(self, value): return value
+
+def _formatter(kind, fmt):
+    """-> (primera línea o None, función fila -> línea de texto)."""
+    if fmt not in FORMATS: raise ValueError(f'Formato desconocido: {fmt}')
+    headers = [h for h, _ in EXPORT_COLUMNS[kind]]
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        return writer.writerow(headers), lambda row: writer.writerow([_cell(v) for v in row])
+    return None, lambda row: json.dumps(dict(zip(headers, map(_cell, row))), ensure_ascii=False) + '\n'
+
+def stream_export(company_id, kind, fmt='csv', start=None, end=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Generador de líneas de texto (CSV con encabezado o un objeto JSON por línea)."""
+    first, line = _formatter(kind, fmt)
+    if first: yield first
+    for row in export_queryset(company_id, kind, start, end).iterator(chunk_size=chunk_size): yield line(row)
+
+async def astream_export(company_id, kind, fmt='csv', start=None, end=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Lo mismo como generador async, para ASGI: Django consume un iterador síncrono con sync_to_async(list)
+    y armaría toda la exportación en memoria. Aquí se pide un bloque de chunk_size filas por vez al mismo
+    cursor, en el hilo de la petición (aiterator() no sirve: con values_list ejecuta la query en el loop).
+    """
+    first, line = _formatter(kind, fmt)
+    if first: yield first
+    rows = export_queryset(company_id, kind, start, end).iterator(chunk_size=chunk_size)
+    next_chunk = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    while chunk := await next_chunk():
+        for row in chunk: yield line(row)
@@ -0,0 +1,138 @@
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Branch, Product, Inventory, CompanyUsage
+from .usage import plan_slot, refresh_usage, PlanLimitReached
+from .cache import invalidate
+from .events import publish_catalog
+from .inventory import set_stock
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 200
+COLUMNS = ('sku', 'name', 'description', 'price', 'cost', 'stock', 'min_stock', 'branch')
+# Columnas opcionales: si el archivo no las trae, los productos existentes conservan su valor
+OPTIONAL_COLUMNS = {'description', 'cost', 'min_stock'}
+
+
+# ==========================================
+# LECTURA EN STREAMING (CSV / XLSX)
+# ==========================================
+
+def iter_rows(fileobj, filename):
+    """Recorre el archivo fila a fila (memoria acotada) -> dicts con encabezados en minúscula."""
+    if filename.lower().endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError('Para importar XLSX instale openpyxl (pip install openpyxl).')
+        sheet = load_workbook(fileobj, read_only=True, data_only=True).active
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(h or '').strip().lower() for h in next(rows, [])]
+        for values in rows:
+            yield {h: v for h, v in zip(header, values) if h}
+    else:
+        text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+        sample = text.read(4096)
+        text.seek(0)
+        try: dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error: dialect = csv.excel
+        for row in csv.DictReader(text, dialect=dialect):
+            yield {(k or '').strip().lower(): v for k, v in row.items()}
+
+def _text(row, key):
+    value = row.get(key)
+    return '' if value is None else str(value).strip()
+
+def _number(row, key, default=None):
+    raw = _text(row, key)
+    if raw == '':
+        if default is None: raise ValueError(f'Falta "{key}".')
+        return default
+    try: value = Decimal(raw)
+    except InvalidOperation: raise ValueError(f'"{key}" no es un número: {raw}')
+    if value < 0: raise ValueError(f'"{key}" no puede ser negativo.')
+    return int(value)
+
+# ==========================================
+# IMPORTACIÓN CON UPSERT POR LOTES
+# ==========================================
+
+def import_products(user, rows, branch=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Crea o actualiza productos (clave única company+sku) y fija el stock por sucursal.
+    Cada lote de `batch_size` filas es una transacción: 1 SELECT de SKUs existentes,
+    verificación del límite del plan, bulk_create(update_conflicts=...) de Product y de Inventory;
+    el stock se fija con inventory.set_stock, que deja la diferencia en el libro de movimientos.
+    La columna opcional `branch` (nombre o id) elige la sucursal; si no, se usa `branch`.
+    """
+    company = user.company
+    branches = list(Branch.objects.filter(company=company).order_by('id'))
+    by_key = {str(b.id): b for b in branches} | {b.name.strip().lower(): b for b in branches}
+    branch = branch or (branches[0] if branches else None)
+    result = {'rows': 0, 'created': 0, 'updated': 0, 'error_count': 0, 'errors': []}
+
+    def error(line, message):
+        result['error_count'] += 1
+        if len(result['errors']) < MAX_REPORTED_ERRORS: result['errors'].append({'line': line, 'error': message})
+
+    numbered = enumerate(rows, start=2)  # línea 1 = encabezados
+    while True:
+        batch = list(islice(numbered, batch_size))
+        if not batch: break
+        result['rows'] += len(batch)
+        present = OPTIONAL_COLUMNS & set(batch[0][1])  # todas las filas traen los encabezados del archivo
+        products, stock = {}, {}
+        for line, row in batch:
+            try:
+                sku, name = _text(row, 'sku'), _text(row, 'name')
+                if not sku or len(sku) > 50: raise ValueError('SKU vacío o de más de 50 caracteres.')
+                if not name: raise ValueError('Falta "name".')
+                product = Product(company=company, sku=sku, name=name[:100], description=_text(row, 'description'),
+                                  price=_number(row, 'price'), cost=_number(row, 'cost', default=0))
+                level = None
+                if _text(row, 'stock'):
+                    target = by_key.get(_text(row, 'branch').lower()) if _text(row, 'branch') else branch
+                    if target is None: raise ValueError('Sucursal no encontrada.')
+                    level = ((target.id, sku), (_number(row, 'stock'), _number(row, 'min_stock', default=5)))
+            except ValueError as e:
+                error(line, str(e))  # la fila completa se descarta: ni producto ni stock
+                continue
+            products[sku] = product
+            if level: stock[level[0]] = level[1]
+        if not products: continue
+
+        existing = set(Product.objects.filter(company=company, sku__in=products).values_list('sku', flat=True))
+        new_count = len(products) - len(existing)
+        try:
+            _upsert_batch(company, user, products, stock, new_count, present)
+        except PlanLimitReached as e:
+            error(batch[0][0], f'{e} Importación detenida en esta fila.')
+            break
+        result['created'] += new_count
+        result['updated'] += len(existing)
+
+    refresh_usage(company.id)
+    invalidate(company.id, 'catalog', 'reports')
+    publish_catalog(company.id)
+    return result
+
+def _upsert_batch(company, user, products, stock, new_count, present):
+    """
+    Upsert de un lote en una transacción; reserva cupo del plan sólo si hay productos nuevos.
+    En los productos existentes sólo se actualizan las columnas opcionales que trae el archivo (`present`).
+    """
+    with plan_slot(user, 'products', amount=new_count) if new_count else transaction.atomic():
+        Product.objects.bulk_create(products.values(), update_conflicts=True, unique_fields=['company', 'sku'],
+                                    update_fields=['name', 'price', 'updated_at'] + [f for f in ('description', 'cost') if f in present])
+        if new_count: CompanyUsage.objects.filter(company=company).update(products=F('products') + new_count)
+        if stock:
+            ids = dict(Product.objects.filter(company=company, sku__in={sku for _, sku in stock}).values_list('sku', 'id'))
+            rows = [Inventory(branch_id=bid, product_id=ids[sku], stock=0, min_stock=min_qty) for (bid, sku), (_, min_qty) in stock.items()]
+            if 'min_stock' in present: Inventory.objects.bulk_create(rows, update_conflicts=True, unique_fields=['branch', 'product'], update_fields=['min_stock'])
+            else: Inventory.objects.bulk_create(rows, ignore_conflicts=True)
+            set_stock(company.id, 'adjustment', {(bid, ids[sku]): qty for (bid, sku), (qty, _) in stock.items()}, user)
@@ -0,0 +1,118 @@
+"""
+Servicio único de inventario. Todo cambio de Inventory.stock pasa por aquí:
+- nunca se lee, modifica y guarda la fila en Python (se perderían descuentos concurrentes);
+  se usa UPDATE ... SET stock = stock +/- n, condicionado a stock >= n cuando se descuenta;
+- cada cambio agrega filas a StockMovement en la misma transacción, así el stock
+  actual se puede reconstruir sumando el libro (ver rebuild_stock).
+"""
+
+from collections import namedtuple
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Sum, When
+
+from .models import Inventory, StockMovement
+from .cache import invalidate
+from .events import publish_stock
+
+# Una línea de movimiento: cantidad siempre positiva; ref_id = venta/compra/traslado de origen
+Move = namedtuple('Move', 'branch_id product_id quantity ref_id', defaults=(None,))
+# Pares (sucursal, producto) por sentencia: cada par es un OR más y SQLite corta la expresión a 1000 niveles
+KEY_CHUNK = 300
+
+
+class InsufficientStock(ValueError):
+    """Stock insuficiente para completar la operación (se revierte la transacción)."""
+
+
+def _totals(moves):
+    totals = {}
+    for m in moves: totals[(m.branch_id, m.product_id)] = totals.get((m.branch_id, m.product_id), 0) + m.quantity
+    return totals
+
+def key_chunks(keys, size=KEY_CHUNK):
+    """Pares {(branch_id, product_id)} ordenados y en grupos de a lo más size (una sentencia por grupo)."""
+    keys = sorted(keys)
+    return [keys[i:i + size] for i in range(0, len(keys), size)]
+
+def match(keys, **extra): return reduce(or_, (Q(branch_id=b, product_id=p, **extra) for b, p in keys))
+
+def _when(keys, totals, sign):
+    return Case(*[When(branch_id=b, product_id=p, then=F('stock') + sign * totals[(b, p)]) for b, p in keys], default=F('stock'))
+
+def _log(company_id, kind, moves, sign, user):
+    invalidate(company_id, 'reports')  # stock total, valorizado y críticos salen en los reportes
+    publish_stock(company_id, {key: sign * qty for key, qty in _totals(moves).items()})
+    StockMovement.objects.bulk_create([
+        StockMovement(company_id=company_id, branch_id=m.branch_id, product_id=m.product_id, quantity=sign * m.quantity, kind=kind, ref_id=m.ref_id, user=user)
+        for m in moves if m.quantity
+    ], batch_size=500)
+
+def lock_rows(keys):
+    """
+    SELECT ... FOR UPDATE de las filas {(branch_id, product_id)} en orden (branch_id, product_id), el mismo
+    que checkout y la ingesta: una operación que toca varias sucursales no se cruza con una caja (deadlock).
+    Los grupos salen de key_chunks ya ordenados, así el orden se mantiene entre sentencias.
+    """
+    for chunk in key_chunks(keys):
+        list(Inventory.objects.select_for_update().filter(match(chunk)).order_by('branch_id', 'product_id').values_list('id', flat=True))
+
+def remove_stock(company_id, kind, moves, user=None):
+    """
+    Descuenta stock de muchas filas con un UPDATE condicional (stock >= n por fila) por cada KEY_CHUNK filas.
+    Si alguna fila ya no alcanza (otra caja la consumió) el UPDATE afecta menos filas
+    y se lanza InsufficientStock; el llamador debe estar dentro de transaction.atomic().
+    """
+    totals = _totals(moves)
+    if not totals: return
+    updated = 0
+    for chunk in key_chunks(totals):
+        cond = reduce(or_, (Q(branch_id=b, product_id=p, stock__gte=totals[(b, p)]) for b, p in chunk))
+        updated += Inventory.objects.filter(cond).update(stock=_when(chunk, totals, -1))
+    if updated != len(totals):
+        raise InsufficientStock('Stock insuficiente: otra operación tomó el stock disponible.')
+    _log(company_id, kind, moves, -1, user)
+
+def add_stock(company_id, kind, moves, user=None):
+    """
+    Suma stock en muchas filas: INSERT ... ON CONFLICT DO NOTHING de las filas que falten
+    (stock 0) y un UPDATE con CASE sobre el valor actual. Queries constantes hasta KEY_CHUNK filas.
+    """
+    totals = _totals(moves)
+    if not totals: return
+    Inventory.objects.bulk_create([Inventory(branch_id=b, product_id=p, stock=0) for b, p in totals], ignore_conflicts=True, batch_size=500)
+    for chunk in key_chunks(totals): Inventory.objects.filter(match(chunk)).update(stock=_when(chunk, totals, 1))
+    _log(company_id, kind, moves, 1, user)
+
+def set_stock(company_id, kind, targets, user=None):
+    """
+    Fija el stock absoluto {(branch_id, product_id): cantidad} (importaciones, conteos).
+    Bloquea las filas, calcula la diferencia y la aplica como entrada/salida, así el libro cuadra.
+    """
+    if not targets: return
+    with transaction.atomic():
+        Inventory.objects.bulk_create([Inventory(branch_id=b, product_id=p, stock=0) for b, p in targets], ignore_conflicts=True, batch_size=500)
+        current = {}
+        for chunk in key_chunks(targets):
+            rows = Inventory.objects.select_for_update().filter(match(chunk)).order_by('branch_id', 'product_id')
+            current.update(((b, p), stock) for b, p, stock in rows.values_list('branch_id', 'product_id', 'stock'))
+        deltas = {key: qty - current.get(key, 0) for key, qty in targets.items()}
+        add_stock(company_id, kind, [Move(b, p, d) for (b, p), d in deltas.items() if d > 0], user)
+        remove_stock(company_id, kind, [Move(b, p, -d) for (b, p), d in deltas.items() if d < 0], user)
+
+def rebuild_stock(company_id, apply=False):
+    """
+    Compara Inventory.stock con la suma del libro -> [(inventory_id, stock, según libro)].
+    Con apply=True corrige las diferencias dejando el stock igual al libro.
+    """
+    ledger = {(r['branch_id'], r['product_id']): r['total'] for r in
+              StockMovement.objects.filter(company_id=company_id).values('branch_id', 'product_id').annotate(total=Sum('quantity')).order_by()}
+    drift = [(pk, stock, ledger.get((b, p), 0)) for pk, b, p, stock in
+             Inventory.objects.filter(branch__company_id=company_id).values_list('id', 'branch_id', 'product_id', 'stock')
+             if stock != ledger.get((b, p), 0)]
+    if apply and drift:
+        with transaction.atomic():
+            Inventory.objects.filter(pk__in=[pk for pk, _, _ in drift]).update(stock=Case(*[When(pk=pk, then=total) for pk, _, total in drift]))
+    return drift
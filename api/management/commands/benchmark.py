@@ -0,0 +1,133 @@
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from api.cache import tenant_key
+from api.metrics import QueryRecorder
+from api.models import Branch, Company, Inventory, Product, Sale, User
+
+def percentile(values, p):
+    """Percentil por rango más cercano sobre valores ya ordenados."""
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+@contextmanager
+def rolled_back():
+    """Cada caso corre en una transacción que se revierte: ventas, sesiones y usuarios temporales no quedan en la BD."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+class Command(BaseCommand):
+    help = ('Medir latencia (p50/p95/p99) y cantidad de queries de las vistas críticas sobre un dataset generado '
+            '(generate_load_data); guarda JSON y falla si empeora respecto de la línea base')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, required=True, help='ID de empresa con productos, stock y ventas')
+        parser.add_argument('--iterations', type=int, default=30, help='Peticiones medidas por caso')
+        parser.add_argument('--warmup', type=int, default=3, help='Peticiones previas no medidas (caché, plan de queries)')
+        parser.add_argument('--baskets', default='1,5,20', help='Tamaños de canasta para pos_submit, separados por coma')
+        parser.add_argument('--only', help='Medir sólo los casos cuyo nombre contiene este texto')
+        parser.add_argument('--output', help='Archivo JSON con los resultados')
+        parser.add_argument('--baseline', default='benchmark_baseline.json', help='Línea base para comparar')
+        parser.add_argument('--save-baseline', action='store_true', help='Guardar estos resultados como línea base')
+        parser.add_argument('--latency', choices=['p50_ms', 'p95_ms', 'p99_ms'], default='p50_ms', help='Percentil comparado con la línea base')
+        parser.add_argument('--threshold', type=float, default=0.5, help='Aumento relativo tolerado de la latencia (0.5 = 50%%; el ruido entre corridas es alto)')
+        parser.add_argument('--min-delta-ms', type=float, default=5, help='Aumento absoluto de latencia bajo el cual no se considera regresión')
+        parser.add_argument('--query-threshold', type=int, default=0, help='Queries extra toleradas por petición')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **o):
+        company = Company.objects.filter(pk=o['company']).first()
+        admin = User.objects.filter(company=company, role='admin_cliente').order_by('id').first() if company else None
+        branch = Branch.objects.filter(company=company).order_by('id').first() if company else None
+        if not admin or not branch: raise CommandError('La empresa no existe o no tiene administrador/sucursales.')
+        rng = random.Random(o['seed'])
+        products = list(Inventory.objects.filter(branch=branch, stock__gt=0).values_list('product_id', flat=True))
+        baskets = [int(b) for b in o['baskets'].split(',')]
+        if len(products) < max(baskets): raise CommandError(f'La sucursal {branch.name} tiene sólo {len(products)} productos con stock.')
+
+        cases = [(f'pos_submit[{n}]', admin, lambda c, n=n: c.post(reverse('pos_submit'), content_type='application/json',
+                  data={'items': [{'id': pid, 'qty': 1} for pid in rng.sample(products, n)], 'payment_method': 'cash'}), None) for n in baskets]
+        report_key = lambda: tenant_key(company.id, 'reports', f'index:{timezone.localdate()}')
+        cases += [
+            ('reports', admin, lambda c: c.get(reverse('reports')), None),
+            ('reports[sin caché]', admin, lambda c: c.get(reverse('reports')), lambda: cache.delete(report_key())),
+            ('product_list', admin, lambda c: c.get(reverse('product_list')), None),
+            ('sale_list', admin, lambda c: c.get(reverse('sale_list')), None),
+            ('super_companies', None, lambda c: c.get(reverse('super_companies')), None),
+            ('super_user_list', None, lambda c: c.get(reverse('super_user_list')), None),
+            ('super_plans', None, lambda c: c.get(reverse('super_plans')), None),
+            ('token_obtain_pair', admin, lambda c: c.post(reverse('token_obtain_pair'), {'email': admin.email, 'password': 'benchmark'}), None),
+        ]
+        if o['only']: cases = [case for case in cases if o['only'] in case[0]]
+
+        results = {'meta': {'engine': settings.DATABASES['default']['ENGINE'], 'company': company.id, 'created': datetime.now().isoformat(timespec='seconds'),
+                            'products': Product.objects.filter(company=company).count(), 'sales': Sale.objects.filter(company=company).count(),
+                            'iterations': o['iterations']}, 'cases': {}}
+        logging.getLogger('api.metrics').setLevel(logging.ERROR)  # cada petición medida pasaría por el log de lentas
+        self.stdout.write(f"Motor: {results['meta']['engine']} · {results['meta']['products']} productos · {results['meta']['sales']} ventas")
+        self.stdout.write(f"{'caso':<22} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'máx ms':>8} {'queries':>8}")
+        for name, user, request, before in cases:
+            row = results['cases'][name] = self.measure(name, user, request, before, o)
+            self.stdout.write(f"{name:<22} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} {row['max_ms']:>8} {row['queries']:>8}")
+
+        if o['output']: Path(o['output']).write_text(json.dumps(results, indent=2, ensure_ascii=False))
+        baseline = Path(o['baseline'])
+        if o['save_baseline']:
+            baseline.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+            self.stdout.write(self.style.SUCCESS(f'✔ Línea base guardada en {baseline}'))
+        elif baseline.exists():
+            regressions = compare(json.loads(baseline.read_text())['cases'], results['cases'], o['latency'], o['threshold'], o['min_delta_ms'], o['query_threshold'])
+            if regressions: raise CommandError('Regresiones respecto de la línea base:\n' + '\n'.join(f'  {r}' for r in regressions))
+            self.stdout.write(self.style.SUCCESS(f'✔ Sin regresiones respecto de {baseline}'))
+        else:
+            self.stdout.write(self.style.WARNING(f'No existe la línea base {baseline} (use --save-baseline)'))
+
+    def measure(self, name, user, request, before, o):
+        """Peticiones con el test Client en este proceso: la latencia es la de la vista (sin red ni servidor web)."""
+        timings, queries = [], 0
+        with rolled_back():
+            if user is None:  # superadmin temporal para las listas globales
+                user = User.objects.create(email='benchmark-super@benchmark.local', role='super_admin', is_staff=True)
+            if name == 'token_obtain_pair':
+                user.set_password('benchmark'); user.save(update_fields=['password'])
+            # Host válido según ALLOWED_HOSTS (con DEBUG y lista vacía Django acepta localhost)
+            client = Client(HTTP_HOST=next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost'))
+            if name != 'token_obtain_pair': client.force_login(user)
+            for i in range(o['warmup'] + o['iterations']):
+                if before: before()
+                recorder = QueryRecorder()
+                with rolled_back(), connection.execute_wrapper(recorder):
+                    start = time.perf_counter()
+                    response = request(client)
+                    elapsed = time.perf_counter() - start
+                if response.status_code != 200: raise CommandError(f'{name}: respuesta {response.status_code}')
+                if i >= o['warmup']:
+                    timings.append(elapsed * 1000)
+                    queries = max(queries, recorder.count)
+        timings.sort()
+        return {'p50_ms': round(percentile(timings, 50), 2), 'p95_ms': round(percentile(timings, 95), 2), 'p99_ms': round(percentile(timings, 99), 2),
+                'max_ms': round(timings[-1], 2), 'mean_ms': round(sum(timings) / len(timings), 2), 'queries': queries}
+
+def compare(baseline, current, latency, threshold, min_delta_ms, query_threshold):
+    """Regresiones de los casos presentes en ambas mediciones: queries por petición (exacto, detecta N+1) y latencia (tolerancia relativa y absoluta)."""
+    regressions = []
+    for name, row in current.items():
+        base = baseline.get(name)
+        if not base: continue
+        if row['queries'] > base['queries'] + query_threshold:
+            regressions.append(f"{name}: queries {base['queries']} → {row['queries']}")
+        if row[latency] > base[latency] * (1 + threshold) and row[latency] - base[latency] >= min_delta_ms:
+            regressions.append(f"{name}: {latency} {base[latency]} → {row[latency]}")
+    return regressions
@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from api.exports import EXPORT_CHUNK_SIZE, EXPORT_COLUMNS, FORMATS, date_bounds, stream_export
+
+class Command(BaseCommand):
+    help = 'Exportar ventas, detalle de ventas o stock de una empresa en CSV/NDJSON (streaming, memoria constante)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORT_COLUMNS), help='Qué exportar')
+        parser.add_argument('--company', type=int, required=True, help='ID de empresa')
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, help='Fecha inicial AAAA-MM-DD')
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, help='Fecha final AAAA-MM-DD (incluida)')
+        parser.add_argument('--output', '-o', help='Archivo de salida (por defecto, salida estándar)')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help='Filas leídas por viaje a la BD')
+
+    def handle(self, *args, **options):
+        start, end = date_bounds(options['date_from'], options['date_to'])
+        lines = stream_export(options['company'], options['kind'], options['format'], start, end, chunk_size=options['chunk_size'])
+        if not options['output']:
+            for line in lines: self.stdout.write(line, ending='')
+            return
+        try:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as out:
+                count = 0
+                for line in lines:
+                    out.write(line)
+                    count += 1
+        except OSError as e: raise CommandError(str(e))
+        if options['format'] == 'csv': count -= 1  # encabezado
+        self.stdout.write(self.style.SUCCESS(f"✔ {count} filas exportadas a {options['output']}"))
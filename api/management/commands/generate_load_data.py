@@ -0,0 +1,119 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from api.models import (User, Company, Plan, Subscription, Branch, Product, Inventory, Supplier, Customer,
+                        Sale, SaleItem, StockMovement, DailySalesSummary)
+from api.usage import refresh_usage
+from api.cache import invalidate
+
+PAYMENTS = (('cash', 45), ('debit', 30), ('credit', 20), ('transfer', 5))
+OPEN_HOUR, CLOSE_HOUR = 9, 21
+
+def insert_rows(model, fields, rows, batch_size):
+    """INSERT con executemany sin instanciar modelos: para SaleItem, la tabla de millones de filas."""
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(model._meta.get_field(f).column) for f in fields)
+    sql = f'INSERT INTO {qn(model._meta.db_table)} ({columns}) VALUES ({", ".join(["%s"] * len(fields))})'
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size): cursor.executemany(sql, rows[start:start + batch_size])
+
+class Command(BaseCommand):
+    help = ('Generar empresas sintéticas grandes para pruebas de rendimiento (bulk_create por lotes, RNG con semilla). '
+            'Ej. ~10M SaleItem: --companies 4 --days 365 --sales-per-day 550 --basket 4 --branches 3')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=1)
+        parser.add_argument('--branches', type=int, default=3, help='Sucursales por empresa')
+        parser.add_argument('--skus', type=int, default=2000, help='Productos por empresa')
+        parser.add_argument('--suppliers', type=int, default=10, help='Proveedores por empresa')
+        parser.add_argument('--customers', type=int, default=500, help='Clientes por empresa')
+        parser.add_argument('--cashiers', type=int, default=2, help='Vendedores por sucursal')
+        parser.add_argument('--days', type=int, default=90, help='Días de historial de ventas')
+        parser.add_argument('--sales-per-day', type=int, default=200, help='Ventas diarias por sucursal (promedio)')
+        parser.add_argument('--basket', type=int, default=4, help='Productos por venta (promedio)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **o):
+        rng = random.Random(o['seed'])
+        started = time.monotonic()
+        plan, _ = Plan.objects.get_or_create(name='Premium', defaults={'price': 60000, 'max_branches': 999, 'max_users': 999})
+        password = make_password('carga123')  # un solo hash para todos los usuarios generados
+        first = Company.objects.count() + 1
+        total_items = 0
+        for n in range(first, first + o['companies']):
+            company = self.create_company(rng, n, plan, password, o)
+            total_items += self.create_sales(rng, company, o)
+            refresh_usage(company.id)
+            invalidate(company.id, 'catalog', 'reports')
+            self.stdout.write(self.style.SUCCESS(f'✔ Empresa {company.name} (id {company.id}) · {time.monotonic() - started:.0f}s'))
+        self.stdout.write(self.style.SUCCESS(f'★ {o["companies"]} empresas, {total_items} líneas de venta en {time.monotonic() - started:.0f}s '
+                                             f'(usuarios: carga<empresa>-*@carga.cl / carga123)'))
+
+    def create_company(self, rng, n, plan, password, o):
+        bs = o['batch_size']
+        with transaction.atomic():
+            company = Company.objects.create(name=f'Farmacia Carga {n}', rut='', address=f'Calle {n}')
+            Subscription.objects.create(company=company, plan=plan, end_date=timezone.now() + timedelta(days=365))
+            branches = Branch.objects.bulk_create([Branch(company=company, name=f'Sucursal {b + 1}', address=f'Calle {n}-{b}', phone='+56900000000') for b in range(o['branches'])])
+            users = [User(email=f'carga{n}-admin@carga.cl', password=password, role='admin_cliente', company=company, first_name='Admin')]
+            users += [User(email=f'carga{n}-{b.id}-{c}@carga.cl', password=password, role='vendedor', company=company, first_name=f'Caja {c + 1}') for b in branches for c in range(o['cashiers'])]
+            User.objects.bulk_create(users)
+            Supplier.objects.bulk_create([Supplier(company=company, name=f'Laboratorio {s + 1}', rut='', contact_name=f'Contacto {s + 1}') for s in range(o['suppliers'])])
+            Customer.objects.bulk_create([Customer(company=company, name=f'Cliente {c + 1}') for c in range(o['customers'])], batch_size=bs)
+            products = []
+            for i in range(o['skus']):
+                price = rng.randrange(500, 30000, 10)
+                products.append(Product(company=company, sku=f'SKU-{i:06d}', name=f'Producto {i:06d}', price=price, cost=int(price * rng.uniform(0.4, 0.75))))
+            Product.objects.bulk_create(products, batch_size=bs)
+            inventory = [Inventory(branch=b, product=p, stock=rng.randint(0, 300), min_stock=rng.choice((5, 10, 20))) for b in branches for p in products]
+            Inventory.objects.bulk_create(inventory, batch_size=bs)
+            # El stock generado es el saldo de apertura del libro de movimientos
+            StockMovement.objects.bulk_create([StockMovement(company=company, branch=i.branch, product=i.product, quantity=i.stock, kind='initial') for i in inventory if i.stock], batch_size=bs)
+        return company
+
+    def create_sales(self, rng, company, o):
+        branches = list(Branch.objects.filter(company=company).order_by('id'))
+        cashiers = {}
+        for uid, email in User.objects.filter(company=company, role='vendedor').values_list('id', 'email'):
+            cashiers.setdefault(int(email.split('-')[1]), []).append(uid)
+        products = list(Product.objects.filter(company=company).order_by('id').values_list('id', 'price'))
+        customers = list(Customer.objects.filter(company=company).values_list('id', flat=True))
+        methods, weights = zip(*PAYMENTS)
+        # Popularidad sesgada: pocos productos concentran la mayoría de las ventas
+        popular_scale = max(len(products) / 8, 1)
+        today = timezone.localdate()
+        items_total, summary = 0, {}
+        for d in range(o['days'], 0, -1):
+            day = today - timedelta(days=d)
+            sales, baskets = [], []
+            for b in branches:
+                for _ in range(max(0, int(rng.gauss(o['sales_per_day'], o['sales_per_day'] * 0.15)))):
+                    basket = {}
+                    for _ in range(rng.randint(1, 2 * o['basket'] - 1)):
+                        pid, price = products[min(int(rng.expovariate(1 / popular_scale)), len(products) - 1)]
+                        basket[pid] = (basket.get(pid, (0, price))[0] + rng.choice((1, 1, 1, 2, 3)), price)
+                    ts = timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(seconds=rng.randint(OPEN_HOUR * 3600, CLOSE_HOUR * 3600)))
+                    sales.append(Sale(company=company, branch=b, seller_id=rng.choice(cashiers[b.id]), created_at=ts,
+                                      customer_id=rng.choice(customers) if customers and rng.random() < 0.3 else None,
+                                      payment_method=rng.choices(methods, weights)[0], total=sum(q * p for q, p in basket.values())))
+                    baskets.append(basket)
+            with transaction.atomic():
+                Sale.objects.bulk_create(sales, batch_size=o['batch_size'])
+                items = [(s.id, pid, q, p, q * p) for s, basket in zip(sales, baskets) for pid, (q, p) in basket.items()]
+                insert_rows(SaleItem, ('sale', 'product', 'quantity', 'price_at_moment', 'subtotal'), items, o['batch_size'])
+            items_total += len(items)
+            # El resumen diario se arma aquí mismo: recalcularlo desde SaleItem costaría otra pasada por millones de filas
+            for sale, basket in zip(sales, baskets):
+                row = summary.setdefault((sale.branch_id, day, sale.payment_method), [0, 0, 0])
+                row[0] += 1; row[1] += sale.total; row[2] += sum(q for q, _ in basket.values())
+        DailySalesSummary.objects.bulk_create([
+            DailySalesSummary(company=company, branch_id=b, day=day, payment_method=m, sales_count=n, total=t, items_quantity=q)
+            for (b, day, m), (n, t, q) in summary.items()
+        ], batch_size=o['batch_size'])
+        return items_total
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.models import Branch, User
+from api.importers import IMPORT_BATCH_SIZE, iter_rows, import_products
+
+class Command(BaseCommand):
+    help = 'Importar productos desde CSV/XLSX (crea o actualiza por SKU y fija el stock por sucursal)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Ruta del archivo .csv o .xlsx')
+        parser.add_argument('--company', type=int, required=True, help='ID de empresa')
+        parser.add_argument('--branch', type=int, help='ID de sucursal por defecto (por defecto, la primera)')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Filas por lote')
+
+    def handle(self, *args, **options):
+        # Se importa "como" el admin de la empresa para aplicar los límites de su plan
+        user = User.objects.filter(company_id=options['company'], role='admin_cliente').order_by('id').first()
+        if not user: raise CommandError('La empresa no existe o no tiene usuario admin_cliente.')
+        branch = None
+        if options['branch']:
+            branch = Branch.objects.filter(company_id=options['company'], id=options['branch']).first()
+            if not branch: raise CommandError('Sucursal no encontrada en la empresa.')
+        try:
+            with open(options['path'], 'rb') as f:
+                result = import_products(user, iter_rows(f, options['path']), branch=branch, batch_size=options['batch_size'])
+        except (OSError, ValueError) as e: raise CommandError(str(e))
+        for e in result['errors']: self.stdout.write(self.style.WARNING(f"Línea {e['line']}: {e['error']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"✔ {result['rows']} filas: {result['created']} creados, {result['updated']} actualizados, {result['error_count']} con error"))
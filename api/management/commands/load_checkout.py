@@ -0,0 +1,160 @@
+import logging
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, OperationalError
+from django.db.models import Sum
+from django.test import Client
+from django.urls import reverse
+from api.models import Branch, Inventory, SaleItem, Sale, User
+from api.services import checkout, InsufficientStock
+from api.inventory import set_stock
+
+# Sentencias donde se espera un bloqueo: BEGIN IMMEDIATE (SQLite), SELECT ... FOR UPDATE y UPDATE (PostgreSQL)
+LOCKING_SQL = re.compile(r'^\s*(BEGIN|UPDATE)\b|\bFOR UPDATE\b', re.IGNORECASE)
+
+def percentile(values, p):
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))] if values else 0
+
+class LockTimer:
+    """execute_wrapper por hilo: tiempo en sentencias que bloquean y cuántas esperaron más de `wait_ms`."""
+
+    def __init__(self, wait_ms):
+        self.wait, self.seconds, self.waits = wait_ms / 1000, 0.0, 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if not LOCKING_SQL.search(sql): return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.seconds += elapsed
+            if elapsed >= self.wait: self.waits += 1
+
+class Command(BaseCommand):
+    help = ('Cajas concurrentes vendiendo un set compartido de SKUs "calientes": ventas/s, latencia p50/p99, esperas por bloqueo, '
+            'reintentos y verificación final de stock contra SaleItem (modifica stock: usar una BD de pruebas)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, required=True, help='ID de empresa con productos y stock')
+        parser.add_argument('--branch', type=int, help='ID de sucursal (por defecto, la primera)')
+        parser.add_argument('--workers', default='1,2,4,8', help='Cantidades de workers a medir, separadas por coma')
+        parser.add_argument('--duration', type=float, default=10, help='Segundos por medición')
+        parser.add_argument('--basket', type=int, default=3, help='Productos por venta')
+        parser.add_argument('--hot', type=int, default=10, help='Tamaño del set de SKUs compartido por todas las cajas')
+        parser.add_argument('--hot-ratio', type=float, default=0.8, help='Probabilidad de que cada producto de la canasta salga del set caliente')
+        parser.add_argument('--restock', type=int, help='Fijar este stock en todos los productos de la sucursal antes de cada medición')
+        parser.add_argument('--retries', type=int, default=3, help='Reintentos ante OperationalError (bloqueo, deadlock)')
+        parser.add_argument('--wait-ms', type=float, default=10, help='Una sentencia de bloqueo que tarda más que esto cuenta como espera')
+        parser.add_argument('--via', choices=['service', 'client'], default='service', help='Llamar a checkout() o POST /pos/submit/ con el test Client')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        seller = User.objects.filter(company_id=options['company']).exclude(role='cliente_final').order_by('id').first()
+        branches = Branch.objects.filter(company_id=options['company']).order_by('id')
+        branch = branches.filter(pk=options['branch']).first() if options['branch'] else branches.first()
+        if not seller or not branch: raise CommandError('La empresa no existe o no tiene usuarios/sucursales.')
+        inventory = Inventory.objects.filter(branch=branch) if options['restock'] else Inventory.objects.filter(branch=branch, stock__gt=0)
+        products = list(inventory.order_by('product_id').values_list('product_id', flat=True))
+        if len(products) < max(options['basket'], options['hot']): raise CommandError('La sucursal no tiene suficientes productos con stock.')
+        hot = random.Random(options['seed']).sample(products, options['hot'])
+
+        # Ventas lentas y 400 por falta de stock son el resultado esperado aquí, no ruido para el log
+        for name in ('api.metrics', 'django.request'): logging.getLogger(name).setLevel(logging.CRITICAL)
+        self.stdout.write(f"Motor: {settings.DATABASES['default']['ENGINE']} · sucursal {branch.name} · {len(products)} productos · "
+                          f"{len(hot)} calientes ({options['hot_ratio']:.0%}) · canasta {options['basket']} · vía {options['via']}")
+        self.stdout.write(f"{'workers':>8} {'ventas':>8} {'ventas/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'sin stock':>10} {'reintentos':>11} {'esperas':>8} {'espera ms':>10} {'errores':>8}")
+        inconsistent = 0
+        for workers in [int(w) for w in options['workers'].split(',')]:
+            if options['restock']: set_stock(seller.company_id, 'adjustment', {(branch.id, pid): options['restock'] for pid in products})
+            before = self.snapshot(seller.company_id)
+            stats = self.run(seller, branch, products, hot, workers, options)
+            lat = sorted(stats['latencies'])
+            self.stdout.write(f"{workers:>8} {stats['ok']:>8} {stats['ok'] / options['duration']:>10.1f} {percentile(lat, 50) * 1000:>8.1f} {percentile(lat, 99) * 1000:>8.1f} "
+                              f"{stats['no_stock']:>10} {stats['retries']:>11} {stats['waits']:>8} {stats['lock_seconds'] * 1000:>10.0f} {stats['errors']:>8}")
+            inconsistent += self.check_stock(seller.company_id, before)
+        if inconsistent: raise CommandError(f'{inconsistent} filas de inventario no cuadran con las ventas registradas (actualizaciones perdidas).')
+
+    def stock_by_product(self, company_id):
+        rows = Inventory.objects.filter(branch__company_id=company_id).values('product_id').annotate(s=Sum('stock'))
+        return {r['product_id']: r['s'] for r in rows}
+
+    def snapshot(self, company_id):
+        """Stock por producto (todas las sucursales: el respaldo entre sucursales descuenta de otra) y última venta antes de medir."""
+        return self.stock_by_product(company_id), Sale.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    def check_stock(self, company_id, before):
+        """Stock inicial − unidades vendidas (SaleItem de las ventas nuevas) debe ser el stock final, sin filas negativas."""
+        stock, last_sale = before
+        sold = dict(SaleItem.objects.filter(sale__company_id=company_id, sale_id__gt=last_sale).values('product_id').annotate(q=Sum('quantity')).values_list('product_id', 'q'))
+        negative = set(Inventory.objects.filter(branch__company_id=company_id, stock__lt=0).values_list('product_id', flat=True))
+        bad = [(pid, stock.get(pid, 0) - sold.get(pid, 0), now) for pid, now in self.stock_by_product(company_id).items()
+               if now != stock.get(pid, 0) - sold.get(pid, 0) or pid in negative]
+        for pid, expected, now in bad[:10]: self.stdout.write(self.style.ERROR(f'  producto {pid}: esperado {expected}, en inventario {now}'))
+        if not bad: self.stdout.write(self.style.SUCCESS(f'  ✔ Stock consistente: {sum(sold.values())} unidades vendidas en {len(sold)} productos'))
+        return len(bad)
+
+    def run(self, seller, branch, products, hot, workers, options):
+        """Cada worker es un hilo con su propia conexión a la BD, vendiendo en bucle hasta el plazo."""
+        stats = {'ok': 0, 'no_stock': 0, 'errors': 0, 'retries': 0, 'waits': 0, 'lock_seconds': 0.0, 'latencies': []}
+        lock = threading.Lock()
+        start_gate = threading.Barrier(workers)
+        cold = [pid for pid in products if pid not in set(hot)] or hot
+
+        def cashier(n):
+            rng = random.Random(options['seed'] * 1000 + n)
+            local = {'ok': 0, 'no_stock': 0, 'errors': 0, 'retries': 0, 'latencies': []}
+            timer = LockTimer(options['wait_ms'])
+            client = None
+            if options['via'] == 'client':
+                client = Client(HTTP_HOST=next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost'))
+                client.force_login(seller)
+                session = client.session
+                session['pos_branch_id'] = branch.id
+                session.save()
+            try:
+                start_gate.wait()
+                deadline = time.monotonic() + options['duration']
+                with connection.execute_wrapper(timer):
+                    while time.monotonic() < deadline:
+                        basket = set()
+                        while len(basket) < options['basket']: basket.add(rng.choice(hot if rng.random() < options['hot_ratio'] else cold))
+                        items = [{'id': pid, 'qty': 1} for pid in basket]
+                        started = time.perf_counter()
+                        outcome = self.sell(seller, branch, items, client, options['retries'], local)
+                        local[outcome] += 1
+                        if outcome == 'ok': local['latencies'].append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+                with lock:
+                    for k, v in local.items(): stats[k] += v
+                    stats['waits'] += timer.waits
+                    stats['lock_seconds'] += timer.seconds
+
+        threads = [threading.Thread(target=cashier, args=(n,)) for n in range(workers)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        return stats
+
+    def sell(self, seller, branch, items, client, retries, local):
+        """Una venta con reintentos ante bloqueo/deadlock -> 'ok', 'no_stock' o 'errors'."""
+        for attempt in range(retries + 1):
+            if attempt:
+                local['retries'] += 1
+                time.sleep(0.005 * 2 ** attempt)
+            if client:
+                response = client.post(reverse('pos_submit'), {'items': items, 'payment_method': 'cash'}, content_type='application/json')
+                if response.status_code == 200: return 'ok'
+                if response.status_code == 400: return 'no_stock'
+                continue  # 500: OperationalError dentro de la vista
+            try:
+                checkout(seller.company, seller, items, branch, allow_fallback=False)
+                return 'ok'
+            except InsufficientStock: return 'no_stock'
+            except OperationalError: continue
+        return 'errors'
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+from api.models import Branch, Inventory, User
+
+def percentile(values, p):
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))] if values else 0
+
+class SlowInput:
+    """wsgi.input de un cliente móvil: el cuerpo llega después de `delay` segundos, con el hilo del servidor esperando."""
+
+    def __init__(self, body, delay):
+        self.body, self.delay, self.pos = body, delay, 0
+
+    def read(self, size=-1):
+        if self.pos == 0 and self.delay: time.sleep(self.delay)
+        end = len(self.body) if size is None or size < 0 else self.pos + size
+        chunk, self.pos = self.body[self.pos:end], min(end, len(self.body))
+        return chunk
+
+    def readline(self, size=-1): return self.read(size)
+
+class Command(BaseCommand):
+    help = ('Cajas POS lentas (red móvil) contra el handler ASGI y el WSGI de Django en este proceso: peticiones/s, '
+            'latencia p50/p99 e hilos usados según la cantidad de terminales concurrentes (vende: usar una BD de pruebas)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, required=True, help='ID de empresa con productos y stock')
+        parser.add_argument('--terminals', default='50,200,500', help='Cantidades de terminales a medir, separadas por coma')
+        parser.add_argument('--mode', default='asgi,wsgi', help='Handlers a medir: asgi, wsgi o ambos')
+        parser.add_argument('--threads', type=int, default=8, help='WSGI: hilos del servidor (como gunicorn --threads)')
+        parser.add_argument('--duration', type=float, default=10, help='Segundos por medición')
+        parser.add_argument('--upload-ms', type=float, default=400, help='Tiempo en que el cuerpo de una venta termina de llegar por la red')
+        parser.add_argument('--think-ms', type=float, default=1000, help='Pausa de cada terminal entre peticiones')
+        parser.add_argument('--submit-ratio', type=float, default=0.3, help='Fracción de peticiones que son ventas (el resto consulta el catálogo)')
+        parser.add_argument('--basket', type=int, default=2)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **o):
+        seller = User.objects.filter(company_id=o['company']).exclude(role='cliente_final').order_by('id').first()
+        branch = Branch.objects.filter(company_id=o['company']).order_by('id').first()
+        if not seller or not branch: raise CommandError('La empresa no existe o no tiene usuarios/sucursales.')
+        products = list(Inventory.objects.filter(branch=branch, stock__gt=0).values_list('product_id', flat=True))
+        if len(products) < o['basket']: raise CommandError('La sucursal no tiene suficientes productos con stock.')
+        for name in ('api.metrics', 'django.request'): logging.getLogger(name).setLevel(logging.CRITICAL)
+
+        counts = [int(n) for n in o['terminals'].split(',')]
+        self.stdout.write(f"Motor: {settings.DATABASES['default']['ENGINE']} · subida {o['upload_ms']:.0f} ms · pausa {o['think_ms']:.0f} ms · "
+                          f"{o['submit_ratio']:.0%} ventas · WSGI con {o['threads']} hilos")
+        self.stdout.write(f"{'modo':>6} {'terminales':>11} {'peticiones':>11} {'pet/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'hilos máx':>10} {'errores':>8}")
+        sessions = [self.login(seller) for _ in range(max(counts))]
+        for mode in o['mode'].split(','):
+            for n in counts:
+                stats = asyncio.run(self.run(mode, sessions[:n], products, o))
+                lat = sorted(stats['latencies'])
+                self.stdout.write(f"{mode:>6} {n:>11} {len(lat):>11} {len(lat) / o['duration']:>8.1f} {percentile(lat, 50) * 1000:>8.0f} "
+                                  f"{percentile(lat, 99) * 1000:>8.0f} {stats['threads']:>10} {stats['errors']:>8}")
+
+    def login(self, seller):
+        """Cookie de sesión propia por terminal y token CSRF (secreto sin máscara de 32 caracteres, aceptado por Django)."""
+        client = Client()
+        client.force_login(seller)
+        token = get_random_string(32)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}; {settings.CSRF_COOKIE_NAME}={token}"
+        return [('cookie', cookie), ('x-csrftoken', token), ('host', 'localhost')]
+
+    async def run(self, mode, sessions, products, o):
+        stats = {'latencies': [], 'errors': 0, 'threads': threading.active_count()}
+        deadline = time.monotonic() + o['duration']
+        call = self.asgi_call(ASGIHandler()) if mode == 'asgi' else self.wsgi_call(WSGIHandler(), ThreadPoolExecutor(max_workers=o['threads']))
+
+        async def terminal(n, headers):
+            rng = random.Random(o['seed'] * 1000 + n)
+            await asyncio.sleep(rng.random() * o['think_ms'] / 1000)  # las cajas no llegan todas en el mismo milisegundo
+            etag = None
+            while time.monotonic() < deadline:
+                if rng.random() < o['submit_ratio']:
+                    body = json.dumps({'items': [{'id': pid, 'qty': 1} for pid in rng.sample(products, o['basket'])]}).encode()
+                    request = ('POST', reverse('pos_submit'), headers + [('content-type', 'application/json')], body)
+                else:
+                    request = ('GET', reverse('pos_catalog'), headers + ([('if-none-match', etag)] if etag else []), b'')
+                started = time.perf_counter()
+                status, response_headers = await call(*request, o['upload_ms'] / 1000 if request[3] else 0)
+                if status in (200, 304, 400):  # 400 = sin stock: la venta se procesó
+                    stats['latencies'].append(time.perf_counter() - started)
+                    etag = response_headers.get('etag', etag)
+                else: stats['errors'] += 1
+                await asyncio.sleep(o['think_ms'] / 1000)
+
+        async def sample_threads():
+            while time.monotonic() < deadline:
+                stats['threads'] = max(stats['threads'], threading.active_count())
+                await asyncio.sleep(0.05)
+
+        await asyncio.gather(sample_threads(), *(terminal(n, headers) for n, headers in enumerate(sessions)))
+        return stats
+
+    def asgi_call(self, app):
+        """Una petición por el handler ASGI; la subida lenta es un await, no un hilo bloqueado."""
+        async def call(method, path, headers, body, upload):
+            scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method, 'scheme': 'http',
+                     'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+                     'headers': [(k.encode(), v.encode()) for k, v in headers + [('content-length', str(len(body)))]],
+                     'client': ('127.0.0.1', 0), 'server': ('localhost', 80)}
+            received, response = False, {}
+
+            async def receive():
+                nonlocal received
+                if received: await asyncio.Event().wait()  # el cliente no se desconecta
+                received = True
+                await asyncio.sleep(upload)
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    response['status'] = message['status']
+                    response['headers'] = {k.decode().lower(): v.decode() for k, v in message['headers']}
+
+            await app(scope, receive, send)
+            return response['status'], response['headers']
+        return call
+
+    def wsgi_call(self, app, pool):
+        """Una petición por el handler WSGI en un pool de hilos fijo, como un servidor con N hilos por proceso."""
+        def handle(method, path, headers, body, upload):
+            environ = {'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '', 'SERVER_NAME': 'localhost',
+                       'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'CONTENT_LENGTH': str(len(body)), 'REMOTE_ADDR': '127.0.0.1',
+                       'wsgi.input': SlowInput(body, upload), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http', 'wsgi.version': (1, 0),
+                       'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False}
+            for k, v in headers:
+                environ['CONTENT_TYPE' if k == 'content-type' else f"HTTP_{k.upper().replace('-', '_')}"] = v
+            result = {}
+            def start_response(status, response_headers, exc_info=None):
+                result['status'], result['headers'] = int(status.split()[0]), {k.lower(): v for k, v in response_headers}
+            response = app(environ, start_response)
+            try: b''.join(response)
+            finally: response.close()
+            return result['status'], result['headers']
+
+        async def call(*request):
+            return await asyncio.get_running_loop().run_in_executor(pool, handle, *request)
+        return call
@@ -0,0 +1,8 @@
+from django.core.management.base import BaseCommand
+from api.catalog import TOMBSTONE_TTL, prune_tombstones
+
+class Command(BaseCommand):
+    help = 'Purgar los registros de productos eliminados (ProductTombstone) más viejos que la ventana de sincronización del POS (cron diario)'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f'✔ {prune_tombstones()} registros de borrado purgados (más de {TOMBSTONE_TTL.days} días o sin empresa)'))
@@ -0,0 +1,19 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from api.models import Company
+from api.reports import rebuild_sales_summary
+from api.cache import invalidate
+
+class Command(BaseCommand):
+    help = 'Reconstruir el resumen diario de ventas (DailySalesSummary) desde las ventas registradas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help='ID de empresa (por defecto, todas)')
+        parser.add_argument('--since', type=date.fromisoformat, help='Fecha inicial AAAA-MM-DD (por defecto, todo el historial)')
+
+    def handle(self, *args, **options):
+        rows = rebuild_sales_summary(company_id=options['company'], since=options['since'])
+        for company_id in ([options['company']] if options['company'] else Company.objects.values_list('id', flat=True)):
+            invalidate(company_id, 'reports')
+        self.stdout.write(self.style.SUCCESS(f'✔ Resumen diario reconstruido ({rows} filas)'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.models import Company
+from api.inventory import rebuild_stock
+from api.cache import invalidate
+
+class Command(BaseCommand):
+    help = 'Comparar el stock de Inventory con el libro de movimientos (StockMovement) y, con --apply, reconstruirlo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help='ID de empresa (por defecto, todas)')
+        parser.add_argument('--apply', action='store_true', help='Dejar el stock igual a la suma del libro')
+        parser.add_argument('--check', action='store_true', help='Terminar con error si hay diferencias (CI, monitoreo)')
+
+    def handle(self, *args, **options):
+        total = 0
+        for company_id in ([options['company']] if options['company'] else Company.objects.values_list('id', flat=True)):
+            drift = rebuild_stock(company_id, apply=options['apply'])
+            for pk, stock, ledger in drift:
+                self.stdout.write(self.style.WARNING(f'Empresa {company_id} · inventario {pk}: stock {stock}, libro {ledger}'))
+            if drift and options['apply']: invalidate(company_id, 'reports')
+            total += len(drift)
+        if total and options['check'] and not options['apply']: raise CommandError(f'{total} filas de inventario no cuadran con el libro de movimientos.')
+        action = 'corregidas' if options['apply'] else 'con diferencias'
+        self.stdout.write(self.style.SUCCESS(f'✔ {total} filas {action}'))
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from api.models import User, Company, Plan, Branch, Product, Inventory, Supplier
+from api.inventory import Move, add_stock
 from django.utils import timezone
 
 class Command(BaseCommand):
@@ -37,8 +38,9 @@ class Command(BaseCommand):
             p1 = Product.objects.create(company=company, sku='PAR-500', name='Paracetamol 500mg', description='Caja 16 comp.', price=1500, cost=800)
             p2 = Product.objects.create(company=company, sku='IBU-400', name='Ibuprofeno 400mg', description='Caja 20 comp.', price=2500, cost=1200)
             
-            Inventory.objects.create(branch=branch, product=p1, stock=100, min_stock=10)
-            Inventory.objects.create(branch=branch, product=p2, stock=50, min_stock=5)
+            Inventory.objects.create(branch=branch, product=p1, min_stock=10)
+            Inventory.objects.create(branch=branch, product=p2, min_stock=5)
+            add_stock(company.id, 'initial', [Move(branch.id, p1.id, 100), Move(branch.id, p2.id, 50)], user)
 
             self.stdout.write(self.style.SUCCESS('✔ Cliente de prueba creado (cliente@farmacia.com / cliente123)'))
 
@@ -0,0 +1,131 @@
+"""
+Métricas por vista: cantidad de queries, tiempo en BD, tiempo total y tamaño de respuesta.
+El middleware las agrega al header Server-Timing (visible en las DevTools del navegador),
+las acumula por vista para /super/metrics/ (formato de texto de Prometheus) y deja en el
+log las peticiones lentas con las sentencias SQL más repetidas (típico N+1).
+Los contadores son de este proceso: con varios workers, Prometheus suma cada uno.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger('api.metrics')
+
+# Límites de los buckets del histograma de duración (segundos)
+BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TOP_STATEMENTS = 5
+
+_lock = threading.Lock()
+_views = defaultdict(lambda: {'requests': Counter(), 'queries': 0, 'db_seconds': 0.0, 'seconds': 0.0, 'bytes': 0, 'buckets': [0] * len(BUCKETS)})
+
+
+class QueryRecorder:
+    """execute_wrapper de Django: cuenta y cronometra cada query de la petición."""
+
+    def __init__(self):
+        self.count, self.seconds, self.statements = 0, 0.0, Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+
+class QueryMetricsMiddleware:
+    """Sirve WSGI y ASGI: con ASGI no obliga a Django a pasar las vistas async a un hilo."""
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'METRICS_SLOW_REQUEST_MS', 500)
+        self.slow_queries = getattr(settings, 'METRICS_SLOW_REQUEST_QUERIES', 50)
+        if iscoroutinefunction(get_response): markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self): return self.__acall__(request)
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        self.finish(request, response, recorder, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        # El ORM async ejecuta en el hilo síncrono propio de la petición (ThreadSensitiveContext de ASGIHandler):
+        # el wrapper se instala y se retira en ese mismo hilo
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        wrapper = await sync_to_async(self.install)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(wrapper.__exit__)(None, None, None)
+        self.finish(request, response, recorder, time.perf_counter() - start)
+        return response
+
+    def install(self, recorder):
+        wrapper = connection.execute_wrapper(recorder)
+        wrapper.__enter__()
+        return wrapper
+
+    def finish(self, request, response, recorder, total):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        size = 0 if response.streaming else len(response.content)  # en streaming el cuerpo aún no se genera
+        response['Server-Timing'] = (f'db;dur={recorder.seconds * 1000:.1f};desc="{recorder.count} queries", '
+                                     f'app;dur={(total - recorder.seconds) * 1000:.1f}, total;dur={total * 1000:.1f}')
+        record(view, request.method, response.status_code, recorder.count, recorder.seconds, total, size)
+
+        if total * 1000 >= self.slow_ms or recorder.count >= self.slow_queries:
+            repeated = '\n'.join(f'  {n}× {sql[:300]}' for sql, n in recorder.statements.most_common(TOP_STATEMENTS) if n > 1)
+            logger.warning('Petición lenta %s %s (%s): %.0f ms, %d queries, %.0f ms en BD%s', request.method, request.path, view,
+                           total * 1000, recorder.count, recorder.seconds * 1000, f'\nSQL repetido:\n{repeated}' if repeated else '')
+
+
+def record(view, method, status, queries, db_seconds, seconds, size):
+    with _lock:
+        m = _views[view]
+        m['requests'][(method, status)] += 1
+        m['queries'] += queries
+        m['db_seconds'] += db_seconds
+        m['seconds'] += seconds
+        m['bytes'] += size
+        for i, limit in enumerate(BUCKETS):
+            if seconds <= limit: m['buckets'][i] += 1
+
+def prometheus_text(prefix='temucosoft'):
+    """Exporta los acumulados en el formato de texto de Prometheus (versión 0.0.4)."""
+    with _lock:
+        views = {name: {**m, 'requests': Counter(m['requests']), 'buckets': list(m['buckets'])} for name, m in _views.items()}
+    lines = []
+    def metric(name, kind, help_text, samples):
+        lines.extend([f'# HELP {prefix}_{name} {help_text}', f'# TYPE {prefix}_{name} {kind}'])
+        lines.extend(f'{prefix}_{name}{{{labels}}} {value}' for labels, value in samples)
+
+    metric('http_requests_total', 'counter', 'Peticiones por vista, método y estado.',
+           [(f'view="{v}",method="{method}",status="{status}"', n) for v, m in views.items() for (method, status), n in sorted(m['requests'].items())])
+    metric('db_queries_total', 'counter', 'Queries SQL ejecutadas por vista.', [(f'view="{v}"', m['queries']) for v, m in views.items()])
+    metric('db_duration_seconds_total', 'counter', 'Tiempo en la BD por vista.', [(f'view="{v}"', round(m['db_seconds'], 6)) for v, m in views.items()])
+    metric('response_bytes_total', 'counter', 'Bytes de respuesta por vista (sin contar streaming).', [(f'view="{v}"', m['bytes']) for v, m in views.items()])
+
+    lines.extend([f'# HELP {prefix}_http_request_duration_seconds Duración total de la petición.', f'# TYPE {prefix}_http_request_duration_seconds histogram'])
+    for v, m in views.items():
+        count = sum(m['requests'].values())
+        lines.extend(f'{prefix}_http_request_duration_seconds_bucket{{view="{v}",le="{limit}"}} {n}' for limit, n in zip(BUCKETS, m['buckets']))
+        lines.append(f'{prefix}_http_request_duration_seconds_bucket{{view="{v}",le="+Inf"}} {count}')
+        lines.append(f'{prefix}_http_request_duration_seconds_sum{{view="{v}"}} {round(m["seconds"], 6)}')
+        lines.append(f'{prefix}_http_request_duration_seconds_count{{view="{v}"}} {count}')
+    return '\n'.join(lines) + '\n'
+
+def reset():
+    with _lock: _views.clear()
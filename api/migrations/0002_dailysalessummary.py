@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_summary(apps, schema_editor):
+    # Copia fija del cálculo de api/reports.rebuild_sales_summary con los modelos históricos
+    Sale = apps.get_model('api', 'Sale')
+    SaleItem = apps.get_model('api', 'SaleItem')
+    DailySalesSummary = apps.get_model('api', 'DailySalesSummary')
+    tz = timezone.get_current_timezone()
+    rows = {}
+    for r in Sale.objects.annotate(d=TruncDate('created_at', tzinfo=tz)).order_by().values('company_id', 'branch_id', 'd', 'payment_method').annotate(n=Count('id'), t=Sum('total')):
+        key = (r['company_id'], r['branch_id'], r['d'], r['payment_method'])
+        rows[key] = DailySalesSummary(company_id=key[0], branch_id=key[1], day=key[2], payment_method=key[3], sales_count=r['n'], total=r['t'] or 0)
+    for r in SaleItem.objects.annotate(d=TruncDate('sale__created_at', tzinfo=tz)).order_by().values('sale__company_id', 'sale__branch_id', 'd', 'sale__payment_method').annotate(q=Sum('quantity')):
+        key = (r['sale__company_id'], r['sale__branch_id'], r['d'], r['sale__payment_method'])
+        if key in rows: rows[key].items_quantity = r['q'] or 0
+    DailySalesSummary.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('payment_method', models.CharField(choices=[('cash', 'Efectivo'), ('debit', 'Débito'), ('credit', 'Crédito'), ('transfer', 'Transferencia')], default='cash', max_length=20)),
+                ('sales_count', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=0, default=0, max_digits=14)),
+                ('items_quantity', models.IntegerField(default=0)),
+                ('branch', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='api.branch')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.company')),
+            ],
+            options={
+                'unique_together': {('company', 'branch', 'day', 'payment_method')},
+            },
+        ),
+        migrations.RunPython(backfill_summary, migrations.RunPython.noop),
+    ]
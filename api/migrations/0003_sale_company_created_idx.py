@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_dailysalessummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['company', 'created_at'], name='sale_company_created_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_usage(apps, schema_editor):
+    # Un COUNT agrupado por tabla con los modelos históricos (no depende de api/usage.py)
+    Company = apps.get_model('api', 'Company')
+    CompanyUsage = apps.get_model('api', 'CompanyUsage')
+    counts = {metric: dict(apps.get_model('api', model).objects.filter(company__isnull=False).values('company_id').annotate(n=Count('id')).values_list('company_id', 'n'))
+              for metric, model in (('products', 'Product'), ('suppliers', 'Supplier'), ('branches', 'Branch'), ('users', 'User'))}
+    CompanyUsage.objects.bulk_create([CompanyUsage(company_id=pk, **{metric: rows.get(pk, 0) for metric, rows in counts.items()})
+                                      for pk in Company.objects.values_list('pk', flat=True)])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_sale_company_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('products', models.IntegerField(default=0)),
+                ('suppliers', models.IntegerField(default=0)),
+                ('branches', models.IntegerField(default=0)),
+                ('users', models.IntegerField(default=0)),
+                ('company', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='usage', to='api.company')),
+            ],
+        ),
+        migrations.RunPython(backfill_usage, migrations.RunPython.noop),
+    ]
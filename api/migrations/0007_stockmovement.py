@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def opening_balances(apps, schema_editor):
+    """El stock existente entra al libro como movimiento 'initial', así la suma del libro cuadra desde el día 1."""
+    Inventory = apps.get_model('api', 'Inventory')
+    StockMovement = apps.get_model('api', 'StockMovement')
+    rows = Inventory.objects.exclude(stock=0).values_list('branch__company_id', 'branch_id', 'product_id', 'stock')
+    StockMovement.objects.bulk_create([
+        StockMovement(company_id=c, branch_id=b, product_id=p, quantity=stock, kind='initial') for c, b, p, stock in rows.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_sale_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('kind', models.CharField(choices=[('initial', 'Stock inicial'), ('sale', 'Venta'), ('purchase', 'Compra'), ('adjustment', 'Ajuste'), ('transfer', 'Traslado')], max_length=20)),
+                ('ref_id', models.IntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.branch')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.company')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.product')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['branch', 'product'], name='movement_branch_product_idx'), models.Index(fields=['company', 'created_at'], name='movement_company_created_idx')],
+            },
+        ),
+        migrations.RunPython(opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_stocktransfer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='is_low',
+            field=models.GeneratedField(db_persist=True, expression=models.Q(('stock__lte', models.F('min_stock'))), output_field=models.BooleanField()),
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(condition=models.Q(('is_low', True)), fields=['branch', 'product'], name='inventory_low_stock_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_inventory_is_low'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailysalessummary',
+            index=models.Index(fields=['company', 'day'], name='summary_company_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['company', 'date'], name='purchase_company_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['supplier', 'date'], name='purchase_supplier_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['branch', 'created_at'], name='sale_branch_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['company', 'role'], name='user_company_role_idx'),
+        ),
+    ]
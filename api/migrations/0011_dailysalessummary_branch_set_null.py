@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_tenant_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailysalessummary',
+            name='branch',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.branch'),
+        ),
+    ]
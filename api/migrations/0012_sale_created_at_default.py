@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_dailysalessummary_branch_set_null'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sale',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
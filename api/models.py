@@ -45,6 +45,17 @@ class Subscription(models.Model):
     def __str__(self):
         return f"{self.company.name} - {self.plan.name}"
 
+class CompanyUsage(models.Model):
+    """Contadores de uso del plan por empresa (desnormalizados, se mantienen con señales: ver api/usage.py)."""
+    company = models.OneToOneField(Company, on_delete=models.CASCADE, related_name='usage')
+    products = models.IntegerField(default=0)
+    suppliers = models.IntegerField(default=0)
+    branches = models.IntegerField(default=0)
+    users = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Uso {self.company_id}"
+
 # TABLA USUARIO
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -80,6 +91,9 @@ class User(AbstractUser):
     REQUIRED_FIELDS = []
     objects = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [models.Index(fields=['company', 'role'], name='user_company_role_idx')]
+
 # ==========================================
 # MÓDULO 2: LOGÍSTICA Y PRODUCTOS
 # ==========================================
@@ -118,21 +132,68 @@ class Product(models.Model):
     # Precios no negativos
     price = models.DecimalField(max_digits=10, decimal_places=0, validators=[validar_positivo])
     cost = models.DecimalField(max_digits=10, decimal_places=0, validators=[validar_positivo])
+    updated_at = models.DateTimeField(auto_now=True) # Para sincronización incremental del catálogo POS
     
     class Meta:
         unique_together = ('company', 'sku')
+        indexes = [models.Index(fields=['company', 'updated_at'], name='product_company_updated_idx')]
 
     def __str__(self):
         return self.name
 
+class ProductTombstone(models.Model):
+    """Registro de productos eliminados, para que las cajas los quiten en la sincronización incremental."""
+    company_id = models.IntegerField() # Sin FK: debe sobrevivir al borrado en cascada
+    product_id = models.IntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['company_id', 'deleted_at'], name='tombstone_company_deleted_idx')]
+
 class Inventory(models.Model):
     branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     stock = models.IntegerField(default=0, validators=[validar_positivo]) # Stock no negativo
     min_stock = models.IntegerField(default=5, validators=[validar_positivo])
+    # Columna calculada por la BD en cada INSERT/UPDATE (también en los UPDATE masivos del servicio de inventario)
+    is_low = models.GeneratedField(expression=models.Q(stock__lte=models.F('min_stock')), output_field=models.BooleanField(), db_persist=True)
 
     class Meta:
         unique_together = ('branch', 'product')
+        # Índice parcial: sólo contiene las filas en stock crítico, así listarlas no recorre todo el inventario
+        indexes = [models.Index(fields=['branch', 'product'], condition=models.Q(is_low=True), name='inventory_low_stock_idx')]
+
+class StockMovement(models.Model):
+    """Libro de movimientos de stock (sólo se agregan filas): la suma por (sucursal, producto) reconstruye Inventory.stock."""
+    KINDS = (('initial', 'Stock inicial'), ('sale', 'Venta'), ('purchase', 'Compra'), ('adjustment', 'Ajuste'), ('transfer', 'Traslado'))
+    company = models.ForeignKey(Company, on_delete=models.CASCADE)
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.IntegerField() # Positivo = entrada, negativo = salida
+    kind = models.CharField(max_length=20, choices=KINDS)
+    ref_id = models.IntegerField(null=True, blank=True) # Venta / compra / traslado que originó el movimiento
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['branch', 'product'], name='movement_branch_product_idx'),
+            models.Index(fields=['company', 'created_at'], name='movement_company_created_idx'),
+        ]
+
+class StockTransfer(models.Model):
+    """Documento de traslado de stock entre dos sucursales de la misma empresa."""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE)
+    from_branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='transfers_out')
+    to_branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='transfers_in')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    note = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class StockTransferItem(models.Model):
+    transfer = models.ForeignKey(StockTransfer, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.PROTECT)
+    quantity = models.IntegerField(validators=[MinValueValidator(1)])
 
 # ==========================================
 # MÓDULO 3: COMPRAS
@@ -147,6 +208,12 @@ class Purchase(models.Model):
     date = models.DateTimeField(default=timezone.now, validators=[validar_fecha_pasada]) # No futuro
     total = models.DecimalField(max_digits=12, decimal_places=0, validators=[validar_positivo])
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'date'], name='purchase_company_date_idx'),
+            models.Index(fields=['supplier', 'date'], name='purchase_supplier_date_idx'),
+        ]
+
 class PurchaseItem(models.Model):
     purchase = models.ForeignKey(Purchase, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
@@ -174,11 +241,33 @@ class Sale(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True)
     total = models.DecimalField(max_digits=12, decimal_places=0, validators=[validar_positivo])
     payment_method = models.CharField(max_length=20, choices=PAYMENT_TYPES, default='cash')
-    created_at = models.DateTimeField(auto_now_add=True) # Automático (no valida futuro porque es 'now')
+    created_at = models.DateTimeField(default=timezone.now) # Ahora, o la hora de la caja en ventas offline (services.ingest_sales)
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True) # Generada por la caja (ventas offline)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'created_at'], name='sale_company_created_idx'),
+            models.Index(fields=['branch', 'created_at'], name='sale_branch_created_idx'),
+        ]
+        constraints = [models.UniqueConstraint(fields=['company', 'idempotency_key'], name='sale_company_idempotency_key')]
 
 class SaleItem(models.Model):
     sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
     quantity = models.IntegerField(validators=[MinValueValidator(1)])
     price_at_moment = models.DecimalField(max_digits=10, decimal_places=0, validators=[validar_positivo])
-    subtotal = models.DecimalField(max_digits=12, decimal_places=0, validators=[validar_positivo])
\ No newline at end of file
+    subtotal = models.DecimalField(max_digits=12, decimal_places=0, validators=[validar_positivo])
+
+class DailySalesSummary(models.Model):
+    """Resumen diario de ventas (materializado). Se actualiza en cada venta y se reconstruye con rebuild_sales_summary."""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE)
+    branch = models.ForeignKey(Branch, on_delete=models.SET_NULL, null=True) # Como Sale.branch (ver reports.merge_branch_summary)
+    day = models.DateField()
+    payment_method = models.CharField(max_length=20, choices=Sale.PAYMENT_TYPES, default='cash')
+    sales_count = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=0, default=0)
+    items_quantity = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('company', 'branch', 'day', 'payment_method')
+        indexes = [models.Index(fields=['company', 'day'], name='summary_company_day_idx')]
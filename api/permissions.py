@@ -1,4 +1,5 @@
 from rest_framework import permissions
+from .usage import get_usage_info
 
 class IsSuperAdmin(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -18,27 +19,15 @@ class IsVendedor(permissions.BasePermission):
 
 class CheckPlanLimits(permissions.BasePermission):
     """
-    Ejemplo de validación de Plan:
-    Si intenta crear una Sucursal (Branch), verificar si su plan lo permite.
+    Validación de Plan: si la vista declara `plan_metric` (products, suppliers, branches, users)
+    y se intenta crear un registro, verificar que el plan aún tenga cupo.
+    El cupo se reserva de forma atómica al guardar (ver api/usage.plan_slot).
     """
     message = "Su plan actual no permite realizar esta acción."
 
     def has_permission(self, request, view):
-        if request.method in permissions.SAFE_METHODS:
+        metric = getattr(view, 'plan_metric', None)
+        if request.method != 'POST' or not metric:
             return True
-        
-        # Solo aplicamos lógica si es AdminCliente intentando crear algo
-        if view.basename == 'branches' and request.method == 'POST':
-            company = request.user.company
-            if not hasattr(company, 'subscription') or not company.subscription.active:
-                return False
-            
-            plan = company.subscription.plan_name
-            current_branches = company.branch_set.count()
-            
-            limits = {'basico': 1, 'estandar': 3, 'premium': 999}
-            
-            if current_branches >= limits.get(plan, 0):
-                return False
-                
-        return True
+        usage = get_usage_info(request.user, metric)
+        return usage['is_unlimited'] or usage['current'] < usage['limit']
@@ -0,0 +1,55 @@
+"""
+Lista de reposición: filas de Inventory en stock crítico (columna calculada is_low + índice
+parcial inventory_low_stock_idx), agrupadas por sucursal y proveedor preferido, con una
+cantidad sugerida según lo vendido en los últimos días. Son 3 queries acotadas a las filas
+críticas, sin importar cuántas filas de inventario tenga la empresa.
+"""
+
+from datetime import timedelta
+from math import ceil
+
+from django.db.models import OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .models import Inventory, PurchaseItem, SaleItem, Supplier
+
+VELOCITY_DAYS = 30  # ventana para calcular la venta diaria
+COVER_DAYS = 14     # días de venta que debe cubrir el pedido sugerido
+
+
+def suggested_quantity(stock, min_stock, sold, days=VELOCITY_DAYS, cover=COVER_DAYS):
+    """Pedido para llegar a max(2 × mínimo, venta diaria × días de cobertura); al menos 1 unidad."""
+    target = max(2 * min_stock, ceil(sold / days * cover)) if days else 2 * min_stock
+    return max(target - stock, 1)
+
+def replenishment_list(company_id, branch_id=None, now=None):
+    """
+    -> [{'branch_id', 'branch', 'suppliers': [{'supplier_id', 'supplier', 'items': [...], 'units'}]}].
+    El proveedor preferido de un producto es el de su última compra en la empresa.
+    """
+    since = (now or timezone.now()) - timedelta(days=VELOCITY_DAYS)
+    last_supplier = PurchaseItem.objects.filter(purchase__company_id=company_id, product=OuterRef('product_id')).order_by('-purchase__date', '-id').values('purchase__supplier_id')[:1]
+    low = Inventory.objects.filter(branch__company_id=company_id, is_low=True)
+    if branch_id: low = low.filter(branch_id=branch_id)
+    rows = list(low.annotate(supplier_id=Subquery(last_supplier)).order_by('branch__name', 'product__name').values(
+        'branch_id', 'branch__name', 'product_id', 'product__sku', 'product__name', 'product__cost', 'stock', 'min_stock', 'supplier_id'))
+    if not rows: return []
+
+    sold = {(r['sale__branch_id'], r['product_id']): r['qty'] for r in SaleItem.objects.filter(
+        sale__company_id=company_id, sale__created_at__gte=since, product_id__in={r['product_id'] for r in rows},
+        **({'sale__branch_id': branch_id} if branch_id else {})
+    ).values('sale__branch_id', 'product_id').annotate(qty=Sum('quantity')).order_by()}
+    suppliers = dict(Supplier.objects.filter(id__in={r['supplier_id'] for r in rows if r['supplier_id']}).values_list('id', 'name'))
+
+    branches = {}
+    for r in rows:
+        qty_sold = sold.get((r['branch_id'], r['product_id']), 0)
+        branch = branches.setdefault(r['branch_id'], {'branch_id': r['branch_id'], 'branch': r['branch__name'], 'suppliers': {}})
+        group = branch['suppliers'].setdefault(r['supplier_id'], {'supplier_id': r['supplier_id'], 'supplier': suppliers.get(r['supplier_id'], 'Sin proveedor'), 'items': [], 'units': 0})
+        suggested = suggested_quantity(r['stock'], r['min_stock'], qty_sold)
+        group['items'].append({
+            'product_id': r['product_id'], 'sku': r['product__sku'], 'name': r['product__name'], 'stock': r['stock'], 'min_stock': r['min_stock'],
+            'sold_last_days': qty_sold, 'suggested': suggested, 'estimated_cost': int(suggested * r['product__cost']),
+        })
+        group['units'] += suggested
+    return [{**b, 'suppliers': list(b['suppliers'].values())} for b in branches.values()]
@@ -0,0 +1,148 @@
+from datetime import datetime, time
+
+from django.db import transaction, IntegrityError
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Branch, Supplier, Inventory, Subscription, Sale, SaleItem, DailySalesSummary
+from .usage import get_company_usage
+from .events import publish_sales
+
+
+# ==========================================
+# RESUMEN DIARIO DE VENTAS (ROLLUP)
+# ==========================================
+
+def record_sales(entries):
+    """
+    Suma ventas recién registradas a DailySalesSummary, dentro de la misma transacción.
+    entries: [(sale, cantidad_de_items)]. Un UPDATE con F() por clave (empresa, sucursal, día, pago);
+    la fila del día se crea la primera vez. Al confirmar, las ventas salen por el canal de eventos.
+    """
+    publish_sales([sale for sale, _ in entries])
+    deltas = {}
+    for sale, qty in entries:
+        key = (sale.company_id, sale.branch_id, timezone.localdate(sale.created_at), sale.payment_method)
+        n, t, q = deltas.get(key, (0, 0, 0))
+        deltas[key] = (n + 1, t + sale.total, q + qty)
+    for (company_id, branch_id, day, method), (n, t, q) in deltas.items():
+        lookup = {'company_id': company_id, 'branch_id': branch_id, 'day': day, 'payment_method': method}
+        inc = {'sales_count': F('sales_count') + n, 'total': F('total') + t, 'items_quantity': F('items_quantity') + q}
+        if DailySalesSummary.objects.filter(**lookup).update(**inc): continue
+        try:
+            with transaction.atomic():
+                DailySalesSummary.objects.create(**lookup, sales_count=n, total=t, items_quantity=q)
+        except IntegrityError:
+            # Otra caja creó la fila del día al mismo tiempo
+            DailySalesSummary.objects.filter(**lookup).update(**inc)
+
+def merge_branch_summary(branch_id):
+    """
+    Antes de eliminar una sucursal: sus ventas quedan sin sucursal (Sale.branch es SET_NULL), así que
+    sus filas del resumen pasan al grupo branch=NULL de la empresa. Se suman a la fila que ya exista
+    para ese (día, pago) y el resto sólo cambia de sucursal: los totales del reporte no cambian.
+    """
+    rows = list(DailySalesSummary.objects.filter(branch_id=branch_id))
+    if not rows: return
+    orphans = {(r.day, r.payment_method): r for r in DailySalesSummary.objects.filter(company_id=rows[0].company_id, branch=None, day__in={r.day for r in rows})}
+    merged = []
+    for r in rows:
+        target = orphans.get((r.day, r.payment_method))
+        if target is None: continue
+        target.sales_count += r.sales_count; target.total += r.total; target.items_quantity += r.items_quantity
+        merged.append(r.pk)
+    DailySalesSummary.objects.bulk_update([orphans[(r.day, r.payment_method)] for r in rows if r.pk in merged], ['sales_count', 'total', 'items_quantity'])
+    DailySalesSummary.objects.filter(pk__in=merged).delete()
+    DailySalesSummary.objects.filter(branch_id=branch_id).update(branch=None)
+
+def rebuild_sales_summary(company_id=None, since=None, batch_size=1000):
+    """Recalcula DailySalesSummary desde Sale/SaleItem (backfill). `since` es una fecha local."""
+    sales, items, summary = Sale.objects.all(), SaleItem.objects.all(), DailySalesSummary.objects.all()
+    if company_id:
+        sales, items, summary = sales.filter(company_id=company_id), items.filter(sale__company_id=company_id), summary.filter(company_id=company_id)
+    if since:
+        start = timezone.make_aware(datetime.combine(since, time.min))
+        sales, items, summary = sales.filter(created_at__gte=start), items.filter(sale__created_at__gte=start), summary.filter(day__gte=since)
+
+    tz = timezone.get_current_timezone()
+    rows = {}
+    for r in sales.annotate(d=TruncDate('created_at', tzinfo=tz)).order_by().values('company_id', 'branch_id', 'd', 'payment_method').annotate(n=Count('id'), t=Sum('total')):
+        key = (r['company_id'], r['branch_id'], r['d'], r['payment_method'])
+        rows[key] = DailySalesSummary(company_id=key[0], branch_id=key[1], day=key[2], payment_method=key[3], sales_count=r['n'], total=r['t'] or 0)
+    for r in items.annotate(d=TruncDate('sale__created_at', tzinfo=tz)).order_by().values('sale__company_id', 'sale__branch_id', 'd', 'sale__payment_method').annotate(q=Sum('quantity')):
+        key = (r['sale__company_id'], r['sale__branch_id'], r['d'], r['sale__payment_method'])
+        if key in rows: rows[key].items_quantity = r['q'] or 0
+
+    with transaction.atomic():
+        summary.delete()
+        DailySalesSummary.objects.bulk_create(rows.values(), batch_size=batch_size)
+    return len(rows)
+
+# ==========================================
+# REPORTES DE GESTIÓN
+# ==========================================
+
+def _branch_sum(model, field, **filters):
+    """Subquery con la suma de `field` por sucursal (agrupada por branch)."""
+    qs = model.objects.filter(branch=OuterRef('pk'), **filters).order_by().values('branch')
+    return Subquery(qs.annotate(s=Sum(field)).values('s')[:1])
+
+def build_report(company, now=None):
+    """
+    Arma el contexto de reports/index.html con un número fijo de queries
+    (no depende de la cantidad de sucursales ni de proveedores).
+    """
+    today = timezone.localdate(now)
+    month = today.replace(day=1)
+    sub = Subscription.objects.select_related('plan').filter(company=company).first()
+    plan_name = sub.plan.name if sub else 'Básico'
+    can_see_details = plan_name in ['Estándar', 'Premium']
+
+    # KPIs de ventas desde el resumen diario (pocas filas por día) e inventario: un aggregate por tabla
+    sales = DailySalesSummary.objects.filter(company=company).aggregate(
+        sales_count=Sum('sales_count'),
+        money=Sum('total'),
+        today=Sum('total', filter=Q(day=today)),
+        month=Sum('total', filter=Q(day__gte=month, day__lte=today)),
+    )
+    inventory = Inventory.objects.filter(branch__company=company).aggregate(
+        stock_sum=Sum('stock'),
+        value=Sum(F('stock') * F('product__cost')),
+        low=Count('id', filter=Q(is_low=True)),
+    )
+
+    # 1. Stock y ventas por sucursal (subqueries correlacionadas en un solo SELECT)
+    stock_by_branch = []
+    if can_see_details:
+        branches = Branch.objects.filter(company=company).annotate(
+            b_stock=_branch_sum(Inventory, 'stock'),
+            b_today=_branch_sum(DailySalesSummary, 'total', day=today),
+            b_month=_branch_sum(DailySalesSummary, 'total', day__gte=month, day__lte=today),
+        )
+        stock_by_branch = [{'id': b.id, 'name': b.name, 'stock': b.b_stock or 0, 'sales_today': b.b_today or 0, 'sales_month': b.b_month or 0} for b in branches]
+
+    # 2. Proveedores: conteo y última compra agrupados
+    suppliers = Supplier.objects.filter(company=company).annotate(purchases_count=Count('purchase'), last_purchase=Max('purchase__date'))
+    suppliers_report = [{
+        'name': s.name,
+        'contact': s.contact_name,
+        'rut': s.rut,
+        'purchases_count': s.purchases_count,
+        'last_purchase': s.last_purchase,
+    } for s in suppliers]
+
+    return {
+        'total_sales': sales['sales_count'] or 0,
+        'total_money': sales['money'] or 0,
+        'total_products': get_company_usage(company).products,
+        'total_stock': inventory['stock_sum'] or 0,
+        'inventory_value': inventory['value'] or 0,
+        'low_stock_count': inventory['low'],
+        'sales_today': sales['today'] or 0,
+        'sales_month': sales['month'] or 0,
+        'plan_name': plan_name,
+        'can_see_details': can_see_details,
+        'stock_by_branch': stock_by_branch,
+        'suppliers_report': suppliers_report,
+    }
@@ -1,5 +1,16 @@
 from rest_framework import serializers
-from .models import User, Company, Subscription, Product, Branch, Sale
+from rest_framework.permissions import SAFE_METHODS
+from .models import User, Company, Subscription, Product, Branch, Sale, SaleItem, Inventory, Supplier, Purchase, PurchaseItem, Category, StockTransfer, StockTransferItem
+
+class SparseFieldsMixin:
+    """ ?fields=id,name devuelve sólo esos campos (sparse fieldsets); sólo en lecturas, al escribir se validan todos """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        fields = request.query_params.get('fields') if request and request.method in SAFE_METHODS else None
+        if fields:
+            for name in set(self.fields) - set(fields.split(',')):
+                self.fields.pop(name)
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -44,14 +55,82 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         model = Subscription
         fields = '__all__'
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
         read_only_fields = ('company',) # Company se asigna auto
 
-class BranchSerializer(serializers.ModelSerializer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request and 'category' in self.fields:
+            # Sólo categorías de la propia empresa
+            self.fields['category'].queryset = Category.objects.filter(company=request.user.company)
+
+    def validate_sku(self, value):
+        # unique_together (company, sku): company es de sólo lectura, así que DRF no agrega el validador
+        request = self.context.get('request')
+        qs = Product.objects.filter(company=request.user.company, sku=value) if request else Product.objects.none()
+        if self.instance: qs = qs.exclude(pk=self.instance.pk)
+        if qs.exists(): raise serializers.ValidationError('Ya existe un producto con este SKU.')
+        return value
+
+class BranchSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Branch
         fields = '__all__'
-        read_only_fields = ('company',)
\ No newline at end of file
+        read_only_fields = ('company',)
+
+class SupplierSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Supplier
+        fields = '__all__'
+        read_only_fields = ('company',)
+
+class InventorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    sku = serializers.CharField(source='product.sku', read_only=True)
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    branch_name = serializers.CharField(source='branch.name', read_only=True)
+
+    class Meta:
+        model = Inventory
+        fields = ('id', 'branch', 'branch_name', 'product', 'sku', 'product_name', 'stock', 'min_stock', 'is_low')
+
+class SaleItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SaleItem
+        fields = ('product', 'quantity', 'price_at_moment', 'subtotal')
+
+class SaleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    items = SaleItemSerializer(many=True, read_only=True)
+    seller_email = serializers.CharField(source='seller.email', read_only=True, default=None)
+
+    class Meta:
+        model = Sale
+        fields = ('id', 'branch', 'seller', 'seller_email', 'customer', 'total', 'payment_method', 'created_at', 'idempotency_key', 'items')
+
+class PurchaseItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PurchaseItem
+        fields = ('product', 'quantity', 'unit_cost')
+
+class PurchaseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    items = PurchaseItemSerializer(many=True, read_only=True)
+    supplier_name = serializers.CharField(source='supplier.name', read_only=True)
+
+    class Meta:
+        model = Purchase
+        fields = ('id', 'supplier', 'supplier_name', 'branch', 'user', 'invoice_number', 'date', 'total', 'items')
+
+class StockTransferItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StockTransferItem
+        fields = ('product', 'quantity')
+
+class StockTransferSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    items = StockTransferItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = StockTransfer
+        fields = ('id', 'from_branch', 'to_branch', 'user', 'note', 'created_at', 'items')
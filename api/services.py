@@ -0,0 +1,279 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Branch, Product, Inventory, Sale, SaleItem, Purchase, PurchaseItem, StockTransfer, StockTransferItem
+from .reports import record_sales
+from .cache import invalidate
+from .inventory import InsufficientStock, Move, add_stock, lock_rows, remove_stock
+
+
+# ==========================================
+# VENTAS: CHECKOUT POS
+# ==========================================
+
+def normalize_cart(items):
+    """Agrupa las líneas del carrito por producto -> {product_id: qty}."""
+    cart = {}
+    for i in items:
+        pid, qty = int(i['id']), int(i['qty'])
+        if qty < 1: raise ValueError('Cantidad inválida en el carrito.')
+        cart[pid] = cart.get(pid, 0) + qty
+    return cart
+
+def pick_inventory(cart, branch, allow_fallback=False):
+    """
+    Elige la sucursal desde la que se despacha cada producto -> {product_id: branch_id}.
+    Sin respaldo busca por (branch, product), que usa directamente el índice unique_together.
+    Si la política lo permite, las líneas sin stock local se toman de otra sucursal
+    (la de mayor stock). Todas las filas candidatas se bloquean en un solo SELECT ordenado
+    por (branch_id, product_id), el mismo orden que la ingesta masiva: así dos cajas no se bloquean mutuamente.
+    """
+    rows = Inventory.objects.select_for_update().filter(product_id__in=cart)
+    if not allow_fallback: rows = rows.filter(branch=branch)
+    rows = list(rows.order_by('branch_id', 'product_id').values_list('branch_id', 'product_id', 'stock', 'id'))
+    chosen = {pid: bid for bid, pid, stock, _ in rows if bid == branch.id and stock >= cart[pid]}
+    for bid, pid, stock, _ in sorted(rows, key=lambda r: (-r[2], r[3])):
+        if pid not in chosen and stock >= cart[pid]: chosen[pid] = bid
+    return chosen
+
+def checkout(company, seller, items, branch, payment_method='cash', allow_fallback=None):
+    """
+    Registra una venta con un número constante de queries, sin importar el tamaño del carrito:
+    1 SELECT productos, 1 SELECT (FOR UPDATE) inventario (de la sucursal o, con respaldo,
+    de todas), 1 INSERT venta (con total), 1 bulk INSERT de items, 1 UPDATE condicional
+    de stock + 1 bulk INSERT al libro de movimientos y 1 UPDATE del resumen diario.
+    """
+    cart = normalize_cart(items)
+    if not cart: raise ValueError('Carrito vacío')
+    if branch is None: raise ValueError('La caja no tiene sucursal asignada.')
+    if payment_method not in dict(Sale.PAYMENT_TYPES): raise ValueError('Método de pago inválido.')
+    if allow_fallback is None: allow_fallback = getattr(settings, 'POS_CROSS_BRANCH_FALLBACK', False)
+
+    with transaction.atomic():
+        products = {p.id: p for p in Product.objects.filter(company=company, id__in=cart).only('id', 'name', 'price')}
+        if len(products) != len(cart): raise ValueError('Producto no encontrado.')
+
+        chosen = pick_inventory(cart, branch, allow_fallback)
+        for pid, p in products.items():
+            if pid not in chosen: raise InsufficientStock(f"Sin stock para {p.name} en {branch.name}")
+
+        lines = [(products[pid], qty) for pid, qty in cart.items()]
+        sale = Sale.objects.create(company=company, branch=branch, seller=seller, payment_method=payment_method, total=sum(p.price * qty for p, qty in lines))
+        SaleItem.objects.bulk_create([
+            SaleItem(sale=sale, product=p, quantity=qty, price_at_moment=p.price, subtotal=p.price * qty) for p, qty in lines
+        ])
+        remove_stock(company.id, 'sale', [Move(chosen[pid], pid, qty, sale.id) for pid, qty in cart.items()], seller)
+        record_sales([(sale, sum(cart.values()))])
+    return sale
+
+# ==========================================
+# VENTAS: INGESTA MASIVA (CAJAS OFFLINE)
+# ==========================================
+BULK_MAX_SALES = 1000
+BULK_CHUNK_SIZE = 100
+BULK_RETRIES = 3
+BULK_MAX_AGE = timedelta(days=30)       # ventas offline más antiguas se rechazan
+BULK_CLOCK_SKEW = timedelta(minutes=5)  # reloj de la caja adelantado: hasta aquí se toma como "ahora"
+
+# Código de error por venta -> texto fijo. La respuesta nunca lleva el texto de una excepción.
+BULK_ERRORS = {
+    'invalid_key': 'Llave de idempotencia inválida.',
+    'repeated_key': 'Llave repetida en el lote.',
+    'invalid_branch': 'Sucursal inválida.',
+    'invalid_payment_method': 'Método de pago inválido.',
+    'invalid_items': 'Carrito vacío o con líneas inválidas.',
+    'invalid_created_at': 'Fecha de venta inválida, futura o de hace más de 30 días.',
+    'product_not_found': 'Producto no encontrado.',
+    'insufficient_stock': 'Sin stock suficiente en la sucursal.',
+    'conflict': 'Conflicto concurrente, reintente.',
+}
+
+class BulkSaleRejected(Exception):
+    """Venta del lote que no pasa la validación; `code` es una llave de BULK_ERRORS."""
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+def _bulk_error(key, code, **extra): return {'key': key, 'status': 'error', 'error': code, 'detail': BULK_ERRORS[code], **extra}
+
+def sale_timestamp(value, now):
+    """Hora de la venta según la caja (ISO 8601; sin zona = hora local). Sin dato, la venta es de ahora."""
+    if value in (None, ''): return now
+    try: dt = parse_datetime(value) if isinstance(value, str) else None
+    except ValueError: dt = None
+    if dt is None: raise BulkSaleRejected('invalid_created_at')
+    if timezone.is_naive(dt): dt = timezone.make_aware(dt)
+    if dt > now + BULK_CLOCK_SKEW or dt < now - BULK_MAX_AGE: raise BulkSaleRejected('invalid_created_at')
+    return min(dt, now)
+
+def _parse_bulk_sale(data, branches, default_branch, now):
+    """Valida una venta del lote -> (sucursal, pago, hora, carrito)."""
+    try: branch = branches.get(int(data['branch'])) if data.get('branch') else default_branch
+    except (TypeError, ValueError): branch = None
+    if branch is None: raise BulkSaleRejected('invalid_branch')
+    method = data.get('payment_method', 'cash')
+    if not isinstance(method, str) or method not in dict(Sale.PAYMENT_TYPES): raise BulkSaleRejected('invalid_payment_method')
+    created_at = sale_timestamp(data.get('created_at'), now)
+    try: cart = normalize_cart(data.get('items') or [])
+    except (KeyError, TypeError, ValueError): raise BulkSaleRejected('invalid_items')
+    if not cart: raise BulkSaleRejected('invalid_items')
+    return branch, method, created_at, cart
+
+def ingest_sales(company, seller, sales, default_branch=None, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Registra un lote de ventas hechas sin conexión. Cada venta trae una llave de idempotencia
+    (`key`) generada por la caja: reenviar el mismo lote devuelve 'duplicate' y nunca descuenta
+    stock dos veces. `created_at` (opcional) es la hora en que se vendió: la venta cuenta en el
+    resumen de ese día. Se procesa en transacciones por bloques; cada bloque hace un descuento de
+    stock agregado y bulk_create de Sale/SaleItem. Devuelve un resultado por venta, en orden.
+    """
+    results = [None] * len(sales)
+    branches = {b.id: b for b in Branch.objects.filter(company=company)}
+    now = timezone.now()
+    pending = []
+    seen = set()
+    for idx, data in enumerate(sales):
+        key = data.get('key') if isinstance(data, dict) else None
+        try:
+            if not isinstance(key, str) or not key or len(key) > 64: raise BulkSaleRejected('invalid_key')
+            if key in seen: raise BulkSaleRejected('repeated_key')
+            seen.add(key)
+            pending.append((idx, key, *_parse_bulk_sale(data, branches, default_branch, now)))
+        except BulkSaleRejected as e:
+            results[idx] = _bulk_error(key if isinstance(key, str) else None, e.code)
+
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        for attempt in range(BULK_RETRIES):
+            try:
+                for idx, result in _ingest_chunk(company, seller, chunk).items(): results[idx] = result
+                break
+            except (IntegrityError, InsufficientStock):
+                # Otra caja reenvió las mismas llaves o tomó el stock entre la lectura y el UPDATE: se relee el bloque
+                if attempt == BULK_RETRIES - 1:
+                    for idx, key, *_ in chunk: results[idx] = _bulk_error(key, 'conflict')
+    invalidate(company.id, 'reports')
+    return results
+
+def _ingest_chunk(company, seller, chunk):
+    """Aplica un bloque de ventas en una sola transacción -> {índice: resultado}."""
+    results = {}
+    with transaction.atomic():
+        existing = dict(Sale.objects.filter(company=company, idempotency_key__in=[key for _, key, *_ in chunk]).values_list('idempotency_key', 'id'))
+        todo = []
+        for entry in chunk:
+            idx, key = entry[0], entry[1]
+            if key in existing: results[idx] = {'key': key, 'status': 'duplicate', 'sale_id': existing[key]}
+            else: todo.append(entry)
+        if not todo: return results
+
+        product_ids = set().union(*(cart for *_, cart in todo))
+        products = {p.id: p for p in Product.objects.filter(company=company, id__in=product_ids).only('id', 'name', 'price')}
+        rows = Inventory.objects.select_for_update().filter(branch_id__in={b.id for _, _, b, *_ in todo}, product_id__in=product_ids).order_by('branch_id', 'product_id').values_list('branch_id', 'product_id', 'stock')
+        available = {(bid, pid): stock for bid, pid, stock in rows}
+
+        # Se valida venta por venta contra el stock restante; el descuento real es un solo UPDATE agregado
+        accepted = []
+        for entry in todo:
+            idx, key, branch, _, _, cart = entry
+            missing = [pid for pid in cart if pid not in products]
+            short = [pid for pid, qty in cart.items() if available.get((branch.id, pid), 0) < qty]
+            if missing or short:
+                results[idx] = _bulk_error(key, 'product_not_found', product=missing[0]) if missing else _bulk_error(key, 'insufficient_stock', product=short[0])
+                continue
+            for pid, qty in cart.items(): available[(branch.id, pid)] -= qty
+            accepted.append(entry)
+
+        new_sales = Sale.objects.bulk_create([
+            Sale(company=company, branch=branch, seller=seller, payment_method=method, idempotency_key=key, created_at=created_at,
+                 total=sum(products[pid].price * qty for pid, qty in cart.items()))
+            for idx, key, branch, method, created_at, cart in accepted
+        ])
+        SaleItem.objects.bulk_create([
+            SaleItem(sale=sale, product=products[pid], quantity=qty, price_at_moment=products[pid].price, subtotal=products[pid].price * qty)
+            for sale, (*_, cart) in zip(new_sales, accepted) for pid, qty in cart.items()
+        ], batch_size=500)
+        remove_stock(company.id, 'sale', [Move(branch.id, pid, qty, sale.id) for sale, (_, _, branch, *_, cart) in zip(new_sales, accepted) for pid, qty in cart.items()], seller)
+        record_sales([(sale, sum(cart.values())) for sale, (*_, cart) in zip(new_sales, accepted)])
+        for sale, (idx, key, *_) in zip(new_sales, accepted): results[idx] = {'key': key, 'status': 'created', 'sale_id': sale.id}
+    return results
+
+# ==========================================
+# COMPRAS: RECEPCIÓN DE FACTURAS
+# ==========================================
+
+def normalize_purchase_lines(items):
+    """Valida las líneas de la factura -> [(product_id, qty, unit_cost)] (un producto puede repetirse)."""
+    lines = []
+    for n, i in enumerate(items, start=1):
+        try: pid, qty, cost = int(i['product']), int(i['quantity']), int(i['unit_cost'])
+        except (KeyError, TypeError, ValueError): raise ValueError(f'Línea {n}: se espera producto, cantidad y costo unitario numéricos.')
+        if qty < 1: raise ValueError('Cantidad inválida en la factura.')
+        if cost < 0: raise ValueError('Costo unitario inválido en la factura.')
+        lines.append((pid, qty, cost))
+    return lines
+
+def receive_purchase(company, user, supplier, branch, invoice_number, items, date=None):
+    """
+    Registra la factura de un proveedor y suma el stock recibido en la sucursal, en una transacción
+    con queries constantes: 1 SELECT productos, 1 INSERT compra (con total), 1 bulk INSERT de items
+    y 3 para el inventario (add_stock + libro de movimientos). Da lo mismo si la entrega trae 3 o 300 líneas.
+    """
+    lines = normalize_purchase_lines(items)
+    if not lines: raise ValueError('La factura no tiene líneas.')
+    if supplier.company_id != company.id or branch.company_id != company.id: raise ValueError('Proveedor o sucursal inválidos.')
+    invoice_number = (invoice_number or '').strip()
+    if not invoice_number: raise ValueError('Falta el número de factura.')
+
+    product_ids = {pid for pid, _, _ in lines}
+    with transaction.atomic():
+        if Product.objects.filter(company=company, id__in=product_ids).count() != len(product_ids): raise ValueError('Producto no encontrado.')
+        purchase = Purchase.objects.create(company=company, supplier=supplier, branch=branch, user=user, invoice_number=invoice_number,
+                                           date=date or timezone.now(), total=sum(qty * cost for _, qty, cost in lines))
+        PurchaseItem.objects.bulk_create([PurchaseItem(purchase=purchase, product_id=pid, quantity=qty, unit_cost=cost) for pid, qty, cost in lines], batch_size=500)
+        add_stock(company.id, 'purchase', [Move(branch.id, pid, qty, purchase.id) for pid, qty, _ in lines], user)
+    invalidate(company.id, 'reports')
+    return purchase
+
+# ==========================================
+# INVENTARIO: TRASLADOS ENTRE SUCURSALES
+# ==========================================
+
+def transfer_stock(company, user, from_branch, to_branch, items, note=''):
+    """
+    Traslada stock de una sucursal a otra en una transacción: 1 SELECT productos, 1 SELECT ... FOR UPDATE
+    de las filas de ambas sucursales (en orden, como checkout), 1 INSERT documento, 1 bulk INSERT de líneas,
+    1 UPDATE condicional en el origen (remove_stock), 2 en el destino (add_stock) y los movimientos del libro.
+    Los bloqueos y UPDATE se repiten por cada KEY_CHUNK filas (inventory.key_chunks) en envíos grandes.
+    Si alguna línea no tiene stock suficiente en el origen, no se mueve nada.
+    items: [{"product": id, "quantity": n}]
+    """
+    if from_branch.id == to_branch.id: raise ValueError('El origen y el destino deben ser sucursales distintas.')
+    if from_branch.company_id != company.id or to_branch.company_id != company.id: raise ValueError('Sucursal inválida.')
+    lines = {}
+    for n, i in enumerate(items, start=1):
+        try: pid, qty = int(i['product']), int(i['quantity'])
+        except (KeyError, TypeError, ValueError): raise ValueError(f'Línea {n}: se espera producto y cantidad numéricos.')
+        if qty < 1: raise ValueError(f'Línea {n}: cantidad inválida.')
+        lines[pid] = lines.get(pid, 0) + qty
+    if not lines: raise ValueError('El traslado no tiene líneas.')
+
+    with transaction.atomic():
+        products = dict(Product.objects.filter(company=company, id__in=lines).values_list('id', 'name'))
+        if len(products) != len(lines): raise ValueError('Producto no encontrado.')
+        lock_rows([(b.id, pid) for b in (from_branch, to_branch) for pid in lines])
+        transfer = StockTransfer.objects.create(company=company, from_branch=from_branch, to_branch=to_branch, user=user, note=(note or '')[:200])
+        StockTransferItem.objects.bulk_create([StockTransferItem(transfer=transfer, product_id=pid, quantity=qty) for pid, qty in lines.items()], batch_size=500)
+        try:
+            remove_stock(company.id, 'transfer', [Move(from_branch.id, pid, qty, transfer.id) for pid, qty in lines.items()], user)
+        except InsufficientStock:
+            available = dict(Inventory.objects.filter(branch=from_branch, product_id__in=lines).values_list('product_id', 'stock'))
+            short = next(pid for pid, qty in lines.items() if available.get(pid, 0) < qty)
+            raise InsufficientStock(f'Sin stock suficiente de {products[short]} en {from_branch.name}.')
+        add_stock(company.id, 'transfer', [Move(to_branch.id, pid, qty, transfer.id) for pid, qty in lines.items()], user)
+    invalidate(company.id, 'reports')
+    return transfer
@@ -0,0 +1,92 @@
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Company, Product, Supplier, Branch, User, Inventory, Sale, Purchase, Subscription, Plan, ProductTombstone
+from .usage import bump_usage
+from .cache import invalidate
+from .events import publish_catalog
+from .reports import merge_branch_summary
+
+# ==========================================
+# CONTADORES DE USO DEL PLAN
+# ==========================================
+USAGE_METRICS = {Product: 'products', Supplier: 'suppliers', Branch: 'branches', User: 'users'}
+
+def _from_company(origin):
+    """El borrado empezó en la empresa (origin: la instancia o el queryset que se borra): sus datos se van completos."""
+    return getattr(origin, 'model', type(origin)) is Company
+
+def usage_on_create(sender, instance, created, raw=False, **kwargs):
+    if created and not raw: bump_usage(instance.company_id, USAGE_METRICS[sender], 1)
+
+def usage_on_delete(sender, instance, origin=None, **kwargs):
+    # Al borrar la empresa la fila de contadores también se va: nada que descontar fila por fila
+    if not _from_company(origin): bump_usage(instance.company_id, USAGE_METRICS[sender], -1)
+
+# Conectadas por modelo: un receptor de post_delete sin sender quita el borrado rápido a todas las tablas
+for model in USAGE_METRICS:
+    post_save.connect(usage_on_create, sender=model)
+    post_delete.connect(usage_on_delete, sender=model)
+
+@receiver(pre_save, sender=User)
+def usage_on_user_move(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Un usuario que cambia de empresa (SuperUserForm) descuenta en una y suma en otra."""
+    if raw or not instance.pk or (update_fields is not None and 'company' not in update_fields): return
+    old = User.objects.filter(pk=instance.pk).values_list('company_id', flat=True).first()
+    if old != instance.company_id:
+        bump_usage(old, 'users', -1)
+        bump_usage(instance.company_id, 'users', 1)
+
+# ==========================================
+# INVALIDACIÓN DE CACHÉ POR EMPRESA
+# ==========================================
+# Modelo -> scopes de caché que dependen de él
+CACHE_SCOPES = {
+    Product: ('catalog', 'reports'),
+    Inventory: ('reports',),
+    Sale: ('reports',),
+    Branch: ('reports',),
+    Supplier: ('reports',),
+    Purchase: ('reports',),
+    Subscription: ('reports',),
+}
+# Sólo se borran en cascada de su sucursal, producto o empresa, que ya invalidan una vez. Sin post_delete
+# el Collector las borra con un DELETE por tabla en vez de cargarlas y avisar fila por fila.
+CASCADE_ONLY = (Inventory, Sale, Purchase)
+
+def _company_id(instance):
+    if isinstance(instance, Inventory): return Branch.objects.filter(pk=instance.branch_id).values_list('company_id', flat=True).first()
+    return instance.company_id
+
+def cache_on_change(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or _from_company(origin): return
+    invalidate(_company_id(instance), *CACHE_SCOPES[sender])
+    if sender is Product: publish_catalog(instance.company_id)  # las cajas abiertas piden el delta
+
+for model in CACHE_SCOPES:
+    post_save.connect(cache_on_change, sender=model)
+    if model not in CASCADE_ONLY: post_delete.connect(cache_on_change, sender=model)
+
+@receiver(post_save, sender=Plan)
+@receiver(post_delete, sender=Plan)
+def cache_on_plan_change(sender, instance, raw=False, **kwargs):
+    if raw: return
+    invalidate(None, 'plans')
+    for company_id in Subscription.objects.filter(plan_id=instance.pk).values_list('company_id', flat=True):
+        invalidate(company_id, 'reports')
+
+# ==========================================
+# CATÁLOGO POS: REGISTRO DE BORRADOS
+# ==========================================
+@receiver(post_delete, sender=Product)
+def catalog_tombstone(sender, instance, origin=None, **kwargs):
+    # Sin empresa no quedan cajas que sincronizar; los registros viejos los purga manage.py prune_tombstones
+    if not _from_company(origin): ProductTombstone.objects.create(company_id=instance.company_id, product_id=instance.pk)
+
+# ==========================================
+# RESUMEN DIARIO: SUCURSALES ELIMINADAS
+# ==========================================
+@receiver(pre_delete, sender=Branch)
+def summary_on_branch_delete(sender, instance, origin=None, **kwargs):
+    """Las ventas de la sucursal se conservan sin sucursal; su resumen también. Si se borra la empresa completa no hace falta."""
+    if not _from_company(origin): merge_branch_summary(instance.id)
@@ -1,3 +1,662 @@
-from django.test import TestCase
+import json
+import random
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.management import call_command, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import (Company, CompanyUsage, Plan, Subscription, Branch, User, Product, Inventory, Supplier, Purchase, Sale,
+                     PurchaseItem, SaleItem, DailySalesSummary, ProductTombstone, StockMovement, StockTransferItem)
+from .events import EventReader
+from .importers import import_products, iter_rows
+from .inventory import InsufficientStock, Move, add_stock, lock_rows, rebuild_stock, remove_stock, set_stock
+from .usage import get_usage_info
+from .views import SALES_PER_PAGE
+from .services import checkout, receive_purchase, transfer_stock
+from .reports import build_report, rebuild_sales_summary
+from .replenishment import replenishment_list
+
+
+class HotQueryPlanTests(TestCase):
+    """
+    Las consultas más frecuentes filtran por empresa (o sucursal) + fecha/estado: cada una
+    debe resolverse con su índice compuesto y no recorriendo la tabla completa. Los listados
+    traen lo de cada fila en el mismo SELECT (queries constantes).
+    """
+    COMPANIES, BRANCHES, PRODUCTS, SALES = 8, 3, 150, 6000
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(7)
+        now = timezone.now()
+        cls.companies = Company.objects.bulk_create([Company(name=f'C{i}', rut='', address='x') for i in range(cls.COMPANIES)])
+        cls.company = cls.companies[0]
+        branches = Branch.objects.bulk_create([Branch(company=c, name=f'B{i}', address='x', phone='1') for c in cls.companies for i in range(cls.BRANCHES)])
+        cls.branch = branches[0]
+        User.objects.bulk_create([User(email=f'u{c.id}-{i}@x.cl', company=c, role=rng.choice(['vendedor', 'gerente'])) for c in cls.companies for i in range(10)])
+        suppliers = Supplier.objects.bulk_create([Supplier(company=c, name=f'S{i}', rut='', contact_name='x') for c in cls.companies for i in range(3)])
+        cls.supplier = suppliers[0]
+        products = Product.objects.bulk_create([Product(company=c, sku=f'P{i}', name=f'P{i}', price=100, cost=50) for c in cls.companies for i in range(cls.PRODUCTS)])
+        by_company = {}
+        for p in products: by_company.setdefault(p.company_id, []).append(p)
+        Inventory.objects.bulk_create([Inventory(branch=b, product=p, stock=rng.randint(0, 40)) for b in branches for p in by_company[b.company_id]])
+        Sale.objects.bulk_create([
+            Sale(company_id=b.company_id, branch=b, total=100, created_at=now - timedelta(minutes=rng.randint(0, 60 * 24 * 180)))
+            for b in (rng.choice(branches) for _ in range(cls.SALES))
+        ], batch_size=1000)
+        Purchase.objects.bulk_create([
+            Purchase(company_id=s.company_id, supplier=s, branch=branches[0], invoice_number='F', total=1, date=now - timedelta(days=rng.randint(0, 365)))
+            for s in (rng.choice(suppliers) for _ in range(2000))
+        ], batch_size=1000)
+        DailySalesSummary.objects.bulk_create([
+            DailySalesSummary(company_id=b.company_id, branch=b, day=(now - timedelta(days=d)).date(), sales_count=1, total=100)
+            for b in branches for d in range(180)
+        ], batch_size=1000)
+        StockMovement.objects.bulk_create([
+            StockMovement(company_id=b.company_id, branch=b, product=p, quantity=5, kind='initial') for b in branches for p in by_company[b.company_id]
+        ], batch_size=1000)
+        with connection.cursor() as cursor: cursor.execute('ANALYZE')
+
+    def setUp(self):
+        # Con pocas filas PostgreSQL puede preferir un seq scan aunque el índice sirva
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor: cursor.execute('SET enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f'Se esperaba el índice {index_name}:\n{plan}')
+
+    def test_sale_history_by_company_and_range(self):
+        since = timezone.now() - timedelta(days=7)
+        qs = Sale.objects.filter(company=self.company, created_at__gte=since, created_at__lt=timezone.now()).order_by('-created_at', '-id')[:51]
+        self.assertUsesIndex(qs, 'sale_company_created_idx')
+
+    def test_sales_by_branch_and_range(self):
+        qs = Sale.objects.filter(branch=self.branch, created_at__gte=timezone.now() - timedelta(days=30))
+        self.assertUsesIndex(qs, 'sale_branch_created_idx')
+
+    def test_purchases_by_company_and_supplier(self):
+        self.assertUsesIndex(Purchase.objects.filter(company=self.company).order_by('-date')[:100], 'purchase_company_date_idx')
+        self.assertUsesIndex(Purchase.objects.filter(supplier=self.supplier, date__gte=timezone.now() - timedelta(days=90)), 'purchase_supplier_date_idx')
+
+    def test_daily_summary_by_company_and_day(self):
+        today = timezone.localdate()
+        qs = DailySalesSummary.objects.filter(company=self.company, day__gte=today.replace(day=1), day__lte=today)
+        self.assertUsesIndex(qs, 'summary_company_day_idx')
+
+    def test_low_stock_rows(self):
+        self.assertUsesIndex(Inventory.objects.filter(branch=self.branch, is_low=True), 'inventory_low_stock_idx')
+
+    def test_catalog_delta(self):
+        qs = Product.objects.filter(company=self.company, updated_at__gt=timezone.now() - timedelta(minutes=5))
+        self.assertUsesIndex(qs, 'product_company_updated_idx')
+
+    def test_product_list_queries_do_not_grow_with_rows(self):
+        user = User.objects.filter(company=self.company).first()
+        self.client.force_login(user)
+        get_usage_info(user, 'products')  # la primera visita crea la fila de contadores
+        stock = dict(Inventory.objects.filter(branch=self.branch).values_list('product_id', 'stock'))
+        # sesión, usuario, empresa, contadores, sucursal principal, COUNT y la página con stock anotado
+        for url, count in (('/products/', 150), ('/products/?page=3', 150), ('/products/?q=P1', 61)):
+            with self.assertNumQueries(7):
+                response = self.client.get(url)
+            page = response.context['page']
+            self.assertEqual((len(page), page.paginator.count), (50, count), url)
+            self.assertEqual({p.id: p.stock for p in page}, {p.id: stock[p.id] for p in page})
+        self.assertEqual([p.sku for p in self.client.get('/products/?q=P14').context['page']], [f'P14{i}' for i in ('', *range(10))])
+
+    def test_users_by_company_and_role(self):
+        self.assertUsesIndex(User.objects.filter(company=self.company, role='vendedor'), 'user_company_role_idx')
+
+    def test_stock_ledger_by_branch_and_product(self):
+        product = Product.objects.filter(company=self.company).first()
+        self.assertUsesIndex(StockMovement.objects.filter(branch=self.branch, product=product), 'movement_branch_product_idx')
+
+
+class StockServiceTests(TestCase):
+    """
+    Servicio de inventario (api/inventory.py): descuentos condicionales que se revierten completos,
+    queries constantes en venta/compra/traslado y libro de movimientos que cuadra con Inventory.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Stock', rut='', address='x')
+        cls.branch, cls.other = Branch.objects.bulk_create([Branch(company=cls.company, name=f'B{i}', address='x', phone='1') for i in range(2)])
+        cls.user = User.objects.create(email='admin@stock.cl', company=cls.company, role='admin_cliente')
+        Subscription.objects.create(company=cls.company, plan=Plan.objects.create(name='Premium', price=1, max_branches=999, max_users=999), end_date=timezone.localdate() + timedelta(days=30))
+        cls.supplier = Supplier.objects.create(company=cls.company, name='S', rut='', contact_name='x')
+        cls.products = [Product.objects.create(company=cls.company, sku=f'S{i:02d}', name=f'P{i}', price=100, cost=50) for i in range(40)]
+        set_stock(cls.company.id, 'initial', {(cls.branch.id, p.id): 10 for p in cls.products})
+
+    def stock(self, product, branch=None):
+        return Inventory.objects.get(branch=branch or self.branch, product=product).stock
+
+    def count_queries(self, action, sizes):
+        action(1)  # la primera venta del día crea la fila del resumen diario
+        counts = []
+        for n in sizes:
+            with CaptureQueriesContext(connection) as ctx: action(n)
+            counts.append(len(ctx))
+        return counts
+
+    def test_partial_update_raises_and_leaves_no_trace(self):
+        movements = StockMovement.objects.count()
+        with self.assertRaises(InsufficientStock), transaction.atomic():
+            remove_stock(self.company.id, 'sale', [Move(self.branch.id, self.products[0].id, 3), Move(self.branch.id, self.products[1].id, 11)])
+        self.assertEqual((self.stock(self.products[0]), self.stock(self.products[1])), (10, 10))
+        self.assertEqual(StockMovement.objects.count(), movements)
+
+    def test_constant_queries_for_checkout_purchase_and_transfer(self):
+        sale = lambda n: checkout(self.company, self.user, [{'id': p.id, 'qty': 1} for p in self.products[:n]], self.branch)
+        purchase = lambda n: receive_purchase(self.company, self.user, self.supplier, self.branch, f'F{n}', [{'product': p.id, 'quantity': 2, 'unit_cost': 40} for p in self.products[:n]])
+        transfer = lambda n: transfer_stock(self.company, self.user, self.branch, self.other, [{'product': p.id, 'quantity': 1} for p in self.products[:n]])
+        for name, action in (('checkout', sale), ('compra', purchase), ('traslado', transfer)):
+            first, second = self.count_queries(action, (2, 40))
+            self.assertEqual(first, second, name)
+        self.assertEqual((self.stock(self.products[0]), self.stock(self.products[0], self.other)), (10 - 3 + 6 - 3, 3))
+
+    def test_ledger_matches_inventory_after_every_kind_of_move(self):
+        checkout(self.company, self.user, [{'id': self.products[0].id, 'qty': 4}, {'id': self.products[1].id, 'qty': 1}], self.branch)
+        receive_purchase(self.company, self.user, self.supplier, self.other, 'F-1', [{'product': self.products[0].id, 'quantity': 5, 'unit_cost': 40}])
+        transfer_stock(self.company, self.user, self.branch, self.other, [{'product': self.products[1].id, 'quantity': 3}])
+        import_products(self.user, iter_rows(BytesIO(b'sku,name,price,stock\nS02,P2,100,25\nNEW,Nuevo,10,4\n'), 'p.csv'))
+        with transaction.atomic():
+            add_stock(self.company.id, 'adjustment', [Move(self.branch.id, self.products[3].id, 2)])
+        self.assertEqual((self.stock(self.products[0]), self.stock(self.products[0], self.other), self.stock(self.products[1], self.other)), (6, 5, 3))
+        self.assertEqual(self.stock(self.products[2]), 25)
+        call_command('rebuild_stock', company=self.company.id, check=True, stdout=StringIO())
+
+        Inventory.objects.filter(branch=self.branch, product=self.products[5]).update(stock=99)  # cambio por fuera del servicio
+        with self.assertRaisesMessage(CommandError, '1 filas'):
+            call_command('rebuild_stock', company=self.company.id, check=True, stdout=StringIO())
+        call_command('rebuild_stock', company=self.company.id, apply=True, stdout=StringIO())
+        self.assertEqual(self.stock(self.products[5]), 10)
+
+    def test_more_keys_than_sqlite_expression_depth(self):
+        products = Product.objects.bulk_create([Product(company=self.company, sku=f'K{i}', name='K', price=1, cost=1) for i in range(520)])
+        keys = [(b.id, p.id) for b in (self.branch, self.other) for p in products]
+        with transaction.atomic():
+            set_stock(self.company.id, 'initial', dict.fromkeys(keys, 5))
+            lock_rows(keys)
+            add_stock(self.company.id, 'adjustment', [Move(b, p, 2) for b, p in keys])
+            remove_stock(self.company.id, 'sale', [Move(b, p, 3) for b, p in keys])
+        with self.assertRaises(InsufficientStock), transaction.atomic():  # falla sólo la última fila del último grupo
+            remove_stock(self.company.id, 'sale', [Move(b, p, 4) for b, p in keys[:-1]] + [Move(*keys[-1], 5)])
+        self.assertEqual(set(Inventory.objects.filter(product__in=products).values_list('stock', flat=True)), {4})
+        call_command('rebuild_stock', company=self.company.id, check=True, stdout=StringIO())
+
+
+class CrossBranchFallbackTests(TestCase):
+    """Con respaldo entre sucursales, todas las filas candidatas se bloquean en un solo SELECT ordenado."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='F', rut='', address='x')
+        cls.home, cls.other, cls.third = Branch.objects.bulk_create([Branch(company=cls.company, name=f'B{i}', address='x', phone='1') for i in range(3)])
+        cls.user = User.objects.create(email='caja@respaldo.cl', company=cls.company, role='vendedor')
+        cls.product = Product.objects.create(company=cls.company, sku='P', name='P', price=100, cost=50)
+        Inventory.objects.bulk_create([Inventory(branch=b, product=cls.product, stock=n) for b, n in ((cls.home, 2), (cls.other, 30), (cls.third, 50))])
+
+    def test_fallback_takes_branch_with_most_stock_in_one_lock_query(self):
+        with self.assertRaises(InsufficientStock):
+            checkout(self.company, self.user, [{'id': self.product.id, 'qty': 20}], self.home)
+        with override_settings(POS_CROSS_BRANCH_FALLBACK=True), CaptureQueriesContext(connection) as ctx:
+            checkout(self.company, self.user, [{'id': self.product.id, 'qty': 20}], self.home)
+        reads = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT') and 'api_inventory' in q['sql']]
+        self.assertEqual(len(reads), 1)
+        self.assertEqual(dict(Inventory.objects.values_list('branch_id', 'stock')), {self.home.id: 2, self.other.id: 30, self.third.id: 30})
+        with override_settings(POS_CROSS_BRANCH_FALLBACK=True):
+            checkout(self.company, self.user, [{'id': self.product.id, 'qty': 1}], self.home)
+        self.assertEqual(Inventory.objects.get(branch=self.home).stock, 1)
+
+
+class StockTransferTests(TestCase):
+    """El traslado bloquea las filas de ambas sucursales antes de modificarlas, como checkout."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='T', rut='', address='x')
+        cls.source, cls.target = Branch.objects.bulk_create([Branch(company=cls.company, name=f'B{i}', address='x', phone='1') for i in range(2)])
+        cls.user = User.objects.create(email='bodega@traslado.cl', company=cls.company, role='gerente')
+        cls.products = [Product.objects.create(company=cls.company, sku=f'P{i}', name=f'P{i}', price=100, cost=50) for i in range(3)]
+        Inventory.objects.bulk_create([Inventory(branch=cls.source, product=p, stock=10) for p in cls.products])
+
+    def test_rows_locked_before_updates(self):
+        with CaptureQueriesContext(connection) as ctx:
+            transfer_stock(self.company, self.user, self.source, self.target, [{'product': p.id, 'quantity': 4} for p in self.products])
+        inventory = [q['sql'].split()[0] for q in ctx.captured_queries if 'api_inventory' in q['sql']]
+        self.assertEqual(inventory[0], 'SELECT')
+        self.assertEqual(dict(Inventory.objects.filter(branch=self.target).values_list('product_id', 'stock')), {p.id: 4 for p in self.products})
+        with self.assertRaises(InsufficientStock):
+            transfer_stock(self.company, self.user, self.source, self.target, [{'product': self.products[0].id, 'quantity': 7}])
+
+    def test_large_shipment_from_the_form(self):
+        products = Product.objects.bulk_create([Product(company=self.company, sku=f'L{i:03d}', name='L', price=1, cost=1) for i in range(500)])
+        Inventory.objects.bulk_create([Inventory(branch=self.source, product=p, stock=5) for p in products])
+        self.client.force_login(self.user)
+        lines = '\n'.join(f'{p.sku},2' for p in products)
+        response = self.client.post('/transfers/add/', {'from_branch': self.source.id, 'to_branch': self.target.id, 'lines': lines})
+        self.assertRedirects(response, '/transfers/', fetch_redirect_response=False)
+        self.assertEqual(StockTransferItem.objects.filter(transfer__to_branch=self.target).count(), 500)
+        self.assertEqual(set(Inventory.objects.filter(product__in=products).values_list('branch_id', 'stock')), {(self.source.id, 3), (self.target.id, 2)})
+
+
+class SalesSummaryTests(TestCase):
+    """El resumen diario cuadra con las ventas aunque se eliminen sucursales (las ventas quedan sin sucursal)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='R', rut='', address='x')
+        cls.branches = Branch.objects.bulk_create([Branch(company=cls.company, name=f'B{i}', address='x', phone='1') for i in range(3)])
+        cls.user = User.objects.create(email='caja@resumen.cl', company=cls.company, role='vendedor')
+        cls.product = Product.objects.create(company=cls.company, sku='P', name='P', price=100, cost=50)
+        Inventory.objects.bulk_create([Inventory(branch=b, product=cls.product, stock=50) for b in cls.branches])
+
+    def summary(self):
+        return sorted(DailySalesSummary.objects.values_list('branch_id', 'day', 'payment_method', 'sales_count', 'total', 'items_quantity'), key=str)
+
+    def test_branch_delete_keeps_report_totals(self):
+        for branch, qty in ((self.branches[0], 1), (self.branches[1], 2), (self.branches[1], 3), (self.branches[2], 4)):
+            checkout(self.company, self.user, [{'id': self.product.id, 'qty': qty}], branch)
+        before = build_report(self.company)
+        self.assertEqual((before['total_sales'], before['total_money']), (4, 1000))
+        for branch in self.branches[1:]:  # la primera pasa sus filas al grupo sin sucursal, la segunda se suma a ellas
+            branch.delete()
+            after = build_report(self.company)
+            self.assertEqual((after['total_sales'], after['total_money'], after['sales_today']), (4, 1000, 1000))
+        maintained = self.summary()
+        self.assertEqual(DailySalesSummary.objects.filter(branch=None).get().sales_count, 3)
+        rebuild_sales_summary(self.company.id)
+        self.assertEqual(self.summary(), maintained)
+
+
+class ReplenishmentTests(TestCase):
+    """Reposición: filas críticas agrupadas por sucursal y último proveedor, con la cantidad sugerida por la venta reciente."""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.company = Company.objects.create(name='Repo', rut='', address='x')
+        cls.centro, cls.norte = Branch.objects.bulk_create([Branch(company=cls.company, name=n, address='x', phone='1') for n in ('Centro', 'Norte')])
+        cls.old_supplier, cls.new_supplier = Supplier.objects.bulk_create([Supplier(company=cls.company, name=n, rut='', contact_name='x') for n in ('Antiguo', 'Nuevo')])
+        cls.p1, cls.p2, cls.p3, cls.p4 = Product.objects.bulk_create([Product(company=cls.company, sku=f'R{i}', name=f'R{i}', price=20, cost=10) for i in range(1, 5)])
+        for supplier, product, days in ((cls.old_supplier, cls.p1, 60), (cls.new_supplier, cls.p1, 5), (cls.old_supplier, cls.p2, 10)):
+            purchase = Purchase.objects.create(company=cls.company, supplier=supplier, branch=cls.centro, invoice_number='F', total=1, date=now - timedelta(days=days))
+            PurchaseItem.objects.create(purchase=purchase, product=product, quantity=1, unit_cost=10)
+        Inventory.objects.bulk_create([Inventory(branch=b, product=p, stock=stock, min_stock=min_stock) for b, p, stock, min_stock in (
+            (cls.centro, cls.p1, 2, 5), (cls.centro, cls.p2, 1, 3), (cls.centro, cls.p3, 0, 4), (cls.centro, cls.p4, 50, 5), (cls.norte, cls.p1, 1, 2))])
+        for product, qty, days in ((cls.p1, 40, 3), (cls.p1, 20, 20), (cls.p2, 90, 40)):  # la venta de hace 40 días queda fuera
+            sale = Sale.objects.create(company=cls.company, branch=cls.centro, total=1, created_at=now - timedelta(days=days))
+            SaleItem.objects.create(sale=sale, product=product, quantity=qty, price_at_moment=20, subtotal=20 * qty)
+
+    def test_groups_and_suggested_quantities(self):
+        summary = [(b['branch'], [(g['supplier'], g['units'], [(i['sku'], i['sold_last_days'], i['suggested'], i['estimated_cost']) for i in g['items']]) for g in b['suppliers']])
+                   for b in replenishment_list(self.company.id)]
+        self.assertEqual(summary, [
+            # R1: max(2×5, ceil(60/30×14)=28) − 2 = 26; R2: 2×3 − 1 = 5; R3: 2×4 − 0 = 8
+            ('Centro', [('Nuevo', 26, [('R1', 60, 26, 260)]), ('Antiguo', 5, [('R2', 0, 5, 50)]), ('Sin proveedor', 8, [('R3', 0, 8, 80)])]),
+            ('Norte', [('Nuevo', 3, [('R1', 0, 3, 30)])]),
+        ])
+        self.assertEqual([b['branch'] for b in replenishment_list(self.company.id, self.norte.id)], ['Norte'])
+
+
+class CompanyDeleteTests(TestCase):
+    """
+    Eliminar una empresa o sucursal borra en cascada sus datos sin que las señales de contadores recreen
+    su fila de uso, y con queries que no crecen con las filas hijas (borrado rápido por tabla).
+    """
+
+    def test_super_admin_deletes_company_with_data(self):
+        company = Company.objects.create(name='Borrar', rut='', address='x')
+        branch = Branch.objects.create(company=company, name='B', address='x', phone='1')
+        seller = User.objects.create(email='caja@borrar.cl', company=company, role='vendedor')
+        products = [Product.objects.create(company=company, sku=f'P{i}', name=f'P{i}', price=100, cost=50) for i in range(4)]
+        Inventory.objects.bulk_create([Inventory(branch=branch, product=p, stock=5) for p in products])
+        checkout(company, seller, [{'id': products[0].id, 'qty': 1}], branch)
+        self.assertEqual(CompanyUsage.objects.get(company=company).products, 4)
+
+        self.client.force_login(User.objects.create(email='super@borrar.cl', role='super_admin', is_staff=True))
+        response = self.client.post(f'/super/companies/delete/{company.id}/')
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Company.objects.filter(pk=company.pk).exists())
+        self.assertFalse(CompanyUsage.objects.exists())
+        self.assertFalse(User.objects.filter(company_id=company.id).exists())
+
+    def delete_queries(self, obj):
+        with CaptureQueriesContext(connection) as ctx: obj.delete()
+        return [q['sql'] for q in ctx.captured_queries]
+
+    def test_company_delete_skips_per_row_counters(self):
+        company = Company.objects.create(name='Contadores', rut='', address='x')
+        Product.objects.bulk_create([Product(company=company, sku=f'P{i}', name='P', price=1, cost=1) for i in range(50)])
+        Branch.objects.create(company=company, name='B', address='x', phone='1')
+        self.assertEqual(CompanyUsage.objects.get(company=company).products, 50)
+        self.assertFalse([sql for sql in self.delete_queries(company) if 'api_companyusage' in sql and sql.startswith('UPDATE')])
+        self.assertFalse(CompanyUsage.objects.exists())
+
+    def test_branch_delete_does_not_load_inventory_rows(self):
+        company = Company.objects.create(name='Sucursales', rut='', address='x')
+        products = Product.objects.bulk_create([Product(company=company, sku=f'P{i}', name='P', price=1, cost=1) for i in range(200)])
+        small, large = Branch.objects.bulk_create([Branch(company=company, name=f'B{i}', address='x', phone='1') for i in range(2)])
+        for branch, n in ((small, 5), (large, 200)):
+            set_stock(company.id, 'initial', {(branch.id, p.id): 2 for p in products[:n]})
+        self.assertEqual(len(self.delete_queries(small)), len(self.delete_queries(large)))
+        self.assertFalse(Inventory.objects.exists() or StockMovement.objects.exists())
+
+    def test_tombstones_skip_company_delete_and_are_pruned(self):
+        kept, gone = Company.objects.bulk_create([Company(name=n, rut='', address='x') for n in ('Queda', 'Sale')])
+        old, recent = Product.objects.bulk_create([Product(company=kept, sku=f'T{i}', name='T', price=1, cost=1) for i in range(2)])
+        Product.objects.bulk_create([Product(company=gone, sku=f'T{i}', name='T', price=1, cost=1) for i in range(20)])
+        old_id, recent_id = old.id, recent.id
+        old.delete(); recent.delete()
+        ProductTombstone.objects.filter(product_id=old_id).update(deleted_at=timezone.now() - timedelta(days=40))
+        ProductTombstone.objects.create(company_id=gone.id, product_id=0)  # dejado por un borrado anterior
+        gone.delete()
+        self.assertEqual(ProductTombstone.objects.count(), 3)
+        call_command('prune_tombstones', stdout=StringIO())
+        self.assertEqual(list(ProductTombstone.objects.values_list('product_id', flat=True)), [recent_id])
+
+    def test_user_without_company_has_no_usage(self):
+        self.assertEqual(get_usage_info(User.objects.create(email='sin@empresa.cl', role='vendedor'), 'products')['current'], 0)
+
+
+class TenantApiWriteTests(TestCase):
+    """Errores de escritura como 400/409 en la API y como mensaje en las vistas HTML, no como 500."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Api', rut='', address='x')
+        cls.branch = Branch.objects.create(company=cls.company, name='B', address='x', phone='1')
+        cls.user = User.objects.create(email='gerente@api.cl', company=cls.company, role='admin_cliente')
+        Subscription.objects.create(company=cls.company, plan=Plan.objects.create(name='Premium', price=1, max_branches=999, max_users=999), end_date=timezone.localdate() + timedelta(days=30))
+        cls.supplier = Supplier.objects.create(company=cls.company, name='S', rut='', contact_name='x')
+        cls.product = Product.objects.create(company=cls.company, sku='P1', name='P1', price=100, cost=50)
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_duplicate_sku_is_rejected(self):
+        response = self.api.post('/api/products/', {'sku': 'P1', 'name': 'Otro', 'price': 1, 'cost': 1}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sku', response.json())
+        self.assertEqual(self.api.patch(f'/api/products/{self.product.id}/', {'sku': 'P1', 'name': 'Mismo'}, format='json').status_code, 200)
+
+    def test_sparse_fields_only_apply_to_reads(self):
+        self.assertEqual(list(self.api.get('/api/products/?fields=id,sku').json()['results'][0]), ['id', 'sku'])
+        self.assertEqual(self.api.post('/api/products/?fields=id', {'name': 'Sin SKU', 'price': 1, 'cost': 1}, format='json').json().keys(), {'sku'})
+        response = self.api.post('/api/products/?fields=id', {'sku': 'P2', 'name': 'P2', 'price': 1, 'cost': 1}, format='json')
+        self.assertEqual((response.status_code, response.json()['sku']), (201, 'P2'))
+
+    def test_delete_of_referenced_product_and_supplier_conflicts(self):
+        receive_purchase(self.company, self.user, self.supplier, self.branch, 'F-1', [{'product': self.product.id, 'quantity': 2, 'unit_cost': 40}])
+        for url in (f'/api/products/{self.product.id}/', f'/api/suppliers/{self.supplier.id}/'):
+            response = self.api.delete(url)
+            self.assertEqual(response.status_code, 409, url)
+            self.assertIn('compras', response.json()['detail'])
+        self.assertTrue(Product.objects.filter(pk=self.product.pk).exists())
+
+    def test_html_delete_of_received_product_shows_message(self):
+        receive_purchase(self.company, self.user, self.supplier, self.branch, 'F-1', [{'product': self.product.id, 'quantity': 2, 'unit_cost': 40}])
+        self.client.force_login(self.user)
+        for url, name in ((f'/products/delete/{self.product.id}/', 'producto'), (f'/suppliers/delete/{self.supplier.id}/', 'proveedor')):
+            response = self.client.post(url, follow=True)
+            self.assertIn(f'el {name} tiene compras', [str(m) for m in response.context['messages']][0])
+        self.assertTrue(Supplier.objects.filter(pk=self.supplier.pk).exists())
+
+
+class BulkIngestTests(TestCase):
+    """Ingesta de ventas offline: reenviar el lote nunca descuenta dos veces y cada venta cuenta en su día."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Offline', rut='', address='x')
+        cls.branch = Branch.objects.create(company=cls.company, name='B', address='x', phone='1')
+        cls.user = User.objects.create(email='caja@offline.cl', company=cls.company, role='vendedor')
+        cls.products = [Product.objects.create(company=cls.company, sku=f'P{i}', name=f'P{i}', price=100, cost=50) for i in range(2)]
+        Inventory.objects.bulk_create([Inventory(branch=cls.branch, product=p, stock=10) for p in cls.products])
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def post(self, sales):
+        return self.api.post('/api/sales/bulk/', {'branch': self.branch.id, 'sales': sales}, format='json').json()
+
+    def test_replayed_batch_is_reported_as_duplicates(self):
+        sales = [{'key': f'k{i}', 'items': [{'id': self.products[0].id, 'qty': 2}, {'id': self.products[1].id, 'qty': 1}]} for i in range(4)]
+        self.assertEqual(self.post(sales)['created'], 4)
+        stock = dict(Inventory.objects.values_list('product_id', 'stock'))
+        self.assertEqual(stock, {self.products[0].id: 2, self.products[1].id: 6})
+
+        replay = self.post(sales)
+        self.assertEqual((replay['created'], replay['duplicate'], replay['error']), (0, 4, 0))
+        self.assertEqual(dict(Inventory.objects.values_list('product_id', 'stock')), stock)
+        self.assertEqual(Sale.objects.count(), 4)
+        self.assertEqual(StockMovement.objects.filter(kind='sale').count(), 8)
+        self.assertEqual(DailySalesSummary.objects.get().sales_count, 4)
+
+    def test_client_timestamp_and_error_codes(self):
+        yesterday = timezone.now() - timedelta(days=1)
+        results = self.post([
+            {'key': 'ayer', 'created_at': yesterday.isoformat(), 'items': [{'id': self.products[0].id, 'qty': 1}]},
+            {'key': 'futura', 'created_at': (timezone.now() + timedelta(days=1)).isoformat(), 'items': [{'id': self.products[0].id, 'qty': 1}]},
+            {'key': 'vieja', 'created_at': '2000-01-01T10:00:00', 'items': [{'id': self.products[0].id, 'qty': 1}]},
+            {'key': 'mala', 'items': [{'id': 'x', 'qty': 1}]},
+            {'key': 'sin-stock', 'items': [{'id': self.products[0].id, 'qty': 99}]},
+        ])['results']
+        self.assertEqual([r.get('error') for r in results], [None, 'invalid_created_at', 'invalid_created_at', 'invalid_items', 'insufficient_stock'])
+        self.assertEqual(Sale.objects.get().created_at, yesterday)
+        self.assertEqual(DailySalesSummary.objects.get().day, timezone.localdate(yesterday))
+        self.assertEqual(build_report(self.company)['sales_today'], 0)
+
+
+class ProductImportTests(TestCase):
+    """Importación por lotes: columnas ausentes no pisan datos existentes y una fila con un error no se importa a medias."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Import', rut='', address='x')
+        cls.branch = Branch.objects.create(company=cls.company, name='Central', address='x', phone='1')
+        cls.user = User.objects.create(email='admin@import.cl', company=cls.company, role='admin_cliente')
+        Subscription.objects.create(company=cls.company, plan=Plan.objects.create(name='Premium', price=1, max_branches=999, max_users=999), end_date=timezone.localdate() + timedelta(days=30))
+        cls.product = Product.objects.create(company=cls.company, sku='S0', name='Viejo', description='Conservar', price=100, cost=70)
+        Inventory.objects.create(branch=cls.branch, product=cls.product, stock=0, min_stock=20)
+
+    def run_import(self, text):
+        return import_products(self.user, iter_rows(BytesIO(text.encode()), 'productos.csv'))
+
+    def test_missing_columns_keep_existing_values(self):
+        result = self.run_import('sku;name;price;stock\nS0;Nuevo nombre;150;8\nN1;Nuevo;10;3\n')
+        self.assertEqual((result['created'], result['updated'], result['error_count']), (1, 1, 0))
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.name, product.price, product.description, product.cost), ('Nuevo nombre', 150, 'Conservar', 70))
+        self.assertEqual(Inventory.objects.filter(product=product).values_list('stock', 'min_stock').get(), (8, 20))
+        self.assertEqual(Inventory.objects.get(product__sku='N1').min_stock, 5)
+        self.assertEqual(rebuild_stock(self.company.id), [])  # el stock importado quedó en el libro
+
+    def test_row_with_invalid_field_is_rejected_whole(self):
+        result = self.run_import('sku,name,price,stock,min_stock\nN1,Nuevo,10,abc,\nN2,Otro,10,4,x\nN3,Bien,10,2,1\n')
+        self.assertEqual((result['created'], result['error_count']), (1, 2))
+        self.assertEqual([e['line'] for e in result['errors']], [2, 3])
+        self.assertEqual(list(Product.objects.filter(company=self.company).order_by('sku').values_list('sku', flat=True)), ['N3', 'S0'])
+        self.assertEqual(CompanyUsage.objects.get(company=self.company).products, 2)
+
+    def test_batch_with_more_stock_rows_than_sqlite_expression_depth(self):
+        result = self.run_import('sku,name,price,stock\n' + ''.join(f'M{i:04d},M,10,{i % 7}\n' for i in range(1200)))
+        self.assertEqual((result['created'], result['error_count']), (1200, 0))
+        self.assertEqual(Inventory.objects.filter(branch=self.branch, product__sku__startswith='M').aggregate(total=Sum('stock'))['total'], sum(i % 7 for i in range(1200)))
+        self.assertEqual(rebuild_stock(self.company.id), [])
+
+
+class BenchmarkCommandTests(TestCase):
+    """El benchmark mide sin dejar rastro en la BD y falla si una vista suma queries (N+1) respecto de la línea base."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_load_data', skus=30, days=3, sales_per_day=5, branches=1, customers=5, stdout=StringIO())
+        cls.company = Company.objects.get()
+
+    def run_benchmark(self, baseline, *args):
+        call_command('benchmark', company=self.company.id, iterations=2, warmup=0, baskets='1,3', baseline=str(baseline), *args, stdout=StringIO())
+
+    def test_baseline_and_query_regression(self):
+        sales = Sale.objects.count()
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = Path(tmp) / 'baseline.json'
+            self.run_benchmark(baseline, '--save-baseline')
+            self.assertEqual(Sale.objects.count(), sales)
+            self.assertFalse(User.objects.filter(role='super_admin').exists())
+            results = json.loads(baseline.read_text())
+            self.assertEqual(results['cases']['pos_submit[1]']['queries'], results['cases']['pos_submit[3]']['queries'])
+
+            results['cases']['sale_list']['queries'] -= 1
+            baseline.write_text(json.dumps(results))
+            with self.assertRaisesMessage(CommandError, 'sale_list: queries'):
+                self.run_benchmark(baseline, '--only', 'sale_list')
+
+
+class AsyncPosViewTests(TestCase):
+    """Las vistas del POS por ASGI (AsyncClient): ORM async, venta en un hilo y métricas de queries del middleware."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Async', rut='', address='x')
+        cls.branch = Branch.objects.create(company=cls.company, name='B', address='x', phone='1')
+        cls.user = User.objects.create(email='caja@async.cl', company=cls.company, role='vendedor')
+        cls.products = Product.objects.bulk_create([Product(company=cls.company, sku=f'A{i}', name=f'A{i}', price=100, cost=50) for i in range(3)])
+        Inventory.objects.bulk_create([Inventory(branch=cls.branch, product=p, stock=5) for p in cls.products])
+
+    async def test_catalog_and_submit(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        response = await client.get('/pos/catalog/')
+        self.assertEqual([row[1] for row in response.json()['products']], ['A0', 'A1', 'A2'])
+        self.assertNotIn('"0 queries"', response['Server-Timing'])
+        self.assertEqual((await client.get('/pos/catalog/', headers={'If-None-Match': response['ETag']})).status_code, 304)
+        self.assertTrue((await client.get('/pos/catalog/?since=1')).json()['full'])  # más viejo que los registros de borrado
+
+        response = await client.post('/pos/submit/', {'items': [{'id': self.products[0].id, 'qty': 2}]}, content_type='application/json')
+        self.assertTrue(response.json()['success'])
+        self.assertEqual((await Inventory.objects.aget(product=self.products[0])).stock, 3)
+        response = await client.post('/pos/submit/', {'items': [{'id': self.products[0].id, 'qty': 9}]}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_export_streams_async_under_asgi(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        await sync_to_async(checkout)(self.company, self.user, [{'id': p.id, 'qty': 1} for p in self.products], self.branch)
+        response = await client.get('/reports/export/sale_items/')
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual([line.split(',')[4] for line in lines], ['sku', 'A0', 'A1', 'A2'])
+        await sync_to_async(self.client.force_login)(self.user)
+        sync_response = await sync_to_async(self.client.get)('/reports/export/sale_items/')
+        self.assertFalse(sync_response.is_async)
+        self.assertEqual((await sync_to_async(b''.join)(sync_response.streaming_content)).decode().splitlines(), lines)
+
+    async def test_reports_and_sale_list(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        for url in ('/reports/', '/sales/', '/reports/replenishment/'):
+            self.assertEqual((await client.get(url)).status_code, 200, url)
+        self.assertEqual((await client.get('/sales/?date_from=2025-02-30&date_to=2025-13-01')).status_code, 200)
+        for query in ('date_from=2025-02-30', 'date_to=ayer'):
+            response = await client.get(f'/reports/export/sales/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn('fecha inválida', response.content.decode())
+
+    async def test_sale_list_cursor_pages_forward_and_back(self):
+        now = timezone.now()
+        # Varias ventas por instante: el id desempata dentro del mismo created_at
+        await Sale.objects.abulk_create([Sale(company=self.company, branch=self.branch, seller=self.user, total=i + 1, created_at=now - timedelta(minutes=i // 3)) for i in range(2 * SALES_PER_PAGE + 7)])
+        expected = [s.id async for s in Sale.objects.filter(company=self.company).order_by('-created_at', '-id')]
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        pages, url = [], '/sales/'
+        while url:
+            context = (await client.get(url)).context
+            pages.append([s.id for s in context['sales']])
+            url = f"/sales/?after={context['older_cursor']}" if context['older_cursor'] else None
+        self.assertEqual([len(p) for p in pages], [SALES_PER_PAGE, SALES_PER_PAGE, 7])
+        self.assertEqual(sum(pages, []), expected)
+        back = []
+        while context['newer_cursor']:
+            context = (await client.get(f"/sales/?before={context['newer_cursor']}")).context
+            back.append([s.id for s in context['sales']])
+        self.assertEqual(back, pages[-2::-1])
+
+
+@override_settings(EVENTS_ENABLED=True)
+class EventChannelTests(TestCase):
+    """Canal en vivo: lo publicado al confirmar llega fusionado y sólo a la empresa dueña."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company, cls.other = Company.objects.bulk_create([Company(name=n, rut='', address='x') for n in ('E1', 'E2')])
+        cls.branch = Branch.objects.create(company=cls.company, name='B', address='x', phone='1')
+        cls.user = User.objects.create(email='caja@eventos.cl', company=cls.company, role='vendedor')
+        cls.product = Product.objects.create(company=cls.company, sku='P', name='P', price=100, cost=50)
+        Inventory.objects.create(branch=cls.branch, product=cls.product, stock=10)
+
+    def setUp(self):
+        self.reader, self.other_reader = EventReader(self.company.id), EventReader(self.other.id)
+
+    def messages(self, text):
+        """Texto SSE -> {evento: datos}."""
+        blocks = [dict(line.split(': ', 1) for line in block.split('\n')) for block in text.strip().split('\n\n')]
+        return {b['event']: json.loads(b['data']) for b in blocks}
+
+    def test_burst_is_coalesced_and_tenant_scoped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3): checkout(self.company, self.user, [{'id': self.product.id, 'qty': 2}], self.branch)
+        messages = self.messages(self.reader.poll())
+        self.assertEqual(messages['stock']['rows'], [[self.branch.id, self.product.id, 4, -6]])
+        self.assertEqual(messages['sales']['branches'], {str(self.branch.id): {'count': 3, 'total': 600}})
+        self.assertEqual(self.reader.poll(), '')
+        self.assertEqual(self.other_reader.poll(), '')
+
+    def test_large_commit_publishes_every_row(self):
+        products = Product.objects.bulk_create([Product(company=self.company, sku=f'K{i}', name='K', price=1, cost=1) for i in range(1100)])
+        with self.captureOnCommitCallbacks(execute=True):
+            set_stock(self.company.id, 'initial', {(self.branch.id, p.id): 3 for p in products})
+        self.assertEqual(len(self.messages(self.reader.poll())['stock']['rows']), 1100)
+
+    def test_rollback_publishes_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(InsufficientStock):
+                checkout(self.company, self.user, [{'id': self.product.id, 'qty': 99}], self.branch)
+        self.assertEqual(self.reader.poll(), '')
+
+    def test_catalog_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertIn('catalog', self.messages(self.reader.poll()))
+
+    @override_settings(EVENTS_ENABLED=False)
+    def test_disabled_channel_publishes_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout(self.company, self.user, [{'id': self.product.id, 'qty': 1}], self.branch)
+        self.assertEqual(self.reader.poll(), '')
+
+    async def test_stream_view_only_under_asgi(self):
+        await sync_to_async(self.client.force_login)(self.user)
+        self.assertEqual((await sync_to_async(self.client.get)('/events/')).status_code, 204)
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        response = await client.get('/events/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(await anext(aiter(response.streaming_content)), b'retry: 3000\n\n')
+        await response.streaming_content.aclose()
+        with self.settings(EVENTS_ENABLED=False):
+            self.assertEqual((await client.get('/events/')).status_code, 204)
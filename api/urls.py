@@ -2,9 +2,16 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.contrib.auth import views as auth_views
-from . import views
+from . import views, viewsets
 
 router = DefaultRouter()
+router.register('products', viewsets.ProductViewSet, basename='products')
+router.register('branches', viewsets.BranchViewSet, basename='branches')
+router.register('inventory', viewsets.InventoryViewSet, basename='inventory')
+router.register('sales', viewsets.SaleViewSet, basename='sales')
+router.register('suppliers', viewsets.SupplierViewSet, basename='suppliers')
+router.register('purchases', viewsets.PurchaseViewSet, basename='purchases')
+router.register('transfers', viewsets.StockTransferViewSet, basename='transfers')
 
 urlpatterns = [
     path('', views.home_redirect, name='home'),
@@ -27,6 +34,8 @@ urlpatterns = [
     path('super/plans/', views.super_dashboard_plans, name='super_plans'),
     path('super/plans/add/', views.super_plan_create, name='super_plan_create'),
     path('super/plans/edit/<int:pk>/', views.super_plan_edit, name='super_plan_edit'),
+    path('super/cache/', views.super_cache_stats, name='super_cache_stats'),
+    path('super/metrics/', views.super_metrics, name='super_metrics'),
 
     path('team/', views.team_list, name='team_list'),
     path('team/add/', views.team_create, name='team_create'),
@@ -45,6 +54,7 @@ urlpatterns = [
 
     path('products/', views.product_list, name='product_list'),
     path('products/add/', views.product_create, name='product_create'),
+    path('products/import/', views.product_import, name='product_import'),
     path('products/edit/<int:pk>/', views.product_edit, name='product_edit'),
     path('products/delete/<int:pk>/', views.product_delete, name='product_delete'),
     # NUEVA RUTA PARA AJUSTE DE STOCK
@@ -52,8 +62,16 @@ urlpatterns = [
 
     path('pos/', views.pos_view, name='pos'),
     path('pos/submit/', views.pos_submit, name='pos_submit'),
+    path('pos/catalog/', views.pos_catalog, name='pos_catalog'),
+    path('events/', views.events_stream, name='events'),
     path('sales/', views.sale_list, name='sale_list'),
+    path('purchases/', views.purchase_list, name='purchase_list'),
+    path('purchases/add/', views.purchase_create, name='purchase_create'),
+    path('transfers/', views.transfer_list, name='transfer_list'),
+    path('transfers/add/', views.transfer_create, name='transfer_create'),
     path('reports/', views.reports_view, name='reports'),
+    path('reports/replenishment/', views.replenishment_view, name='replenishment'),
+    path('reports/export/<str:kind>/', views.export_data, name='export_data'),
     path('subscription/', views.subscription_detail, name='subscription'),
     path('subscription/change/<int:plan_id>/', views.subscribe_plan, name='subscribe_plan'),
 
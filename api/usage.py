@@ -0,0 +1,89 @@
+from contextlib import contextmanager
+
+from django.db import transaction, IntegrityError
+from django.db.models import F
+
+from .models import Branch, CompanyUsage, Product, Supplier, User
+
+PLAN_DEFAULTS = {'Básico': {'products': 500, 'suppliers': 5}, 'Estándar': {'products': 1000, 'suppliers': 20}, 'Premium': {'products': 999999, 'suppliers': 999}}
+METRICS = ('products', 'suppliers', 'branches', 'users')
+
+
+class PlanLimitReached(Exception):
+    pass
+
+
+# ==========================================
+# CONTADORES DESNORMALIZADOS
+# ==========================================
+
+def count_usage(company_id):
+    """Conteo real (COUNT por tabla). Sólo para crear/reparar la fila de contadores."""
+    return {
+        'products': Product.objects.filter(company_id=company_id).count(),
+        'suppliers': Supplier.objects.filter(company_id=company_id).count(),
+        'branches': Branch.objects.filter(company_id=company_id).count(),
+        'users': User.objects.filter(company_id=company_id).count(),
+    }
+
+def refresh_usage(company_id):
+    """Recalcula los contadores desde las tablas (después de bulk_create/borrados masivos que no emiten señales)."""
+    counts = count_usage(company_id)
+    try:
+        with transaction.atomic():
+            CompanyUsage.objects.update_or_create(company_id=company_id, defaults=counts)
+    except IntegrityError:
+        CompanyUsage.objects.filter(company_id=company_id).update(**counts)
+
+def bump_usage(company_id, metric, delta):
+    """
+    Suma/resta al contador con un UPDATE ... SET x = x + delta (sin leer la fila).
+    Al restar nunca se recrea la fila: si falta es porque la empresa se está eliminando
+    (el borrado en cascada ya la quitó); get_company_usage la crea cuando se vuelva a necesitar.
+    """
+    if not company_id: return
+    if not CompanyUsage.objects.filter(company_id=company_id).update(**{metric: F(metric) + delta}) and delta > 0:
+        refresh_usage(company_id)
+
+def get_company_usage(company):
+    """Fila de contadores con suscripción y plan en un solo SELECT (se crea la primera vez)."""
+    usage = CompanyUsage.objects.select_related('company__subscription__plan').filter(company=company).first()
+    if usage is None:
+        refresh_usage(company.id)
+        usage = CompanyUsage.objects.select_related('company__subscription__plan').get(company=company)
+    return usage
+
+# ==========================================
+# LÍMITES DEL PLAN
+# ==========================================
+
+def get_usage_info(user, metric_key):
+    if user.role == 'super_admin': return {'current': 0, 'limit': 999, 'percent': 0, 'is_unlimited': True, 'plan_name': 'SuperAdmin'}
+    if not user.company_id: return {'current': 0, 'limit': 0, 'percent': 0, 'is_unlimited': False, 'plan_name': 'Sin Plan'}
+    usage = get_company_usage(user.company)
+    company = usage.company
+    plan = company.subscription.plan if hasattr(company, 'subscription') and company.subscription.is_active else None
+    plan_name = plan.name if plan else 'Sin Plan'
+    limit = 0
+    if metric_key == 'branches': limit = plan.max_branches if plan else 0
+    elif metric_key == 'users': limit = plan.max_users if plan else 0
+    else: limit = PLAN_DEFAULTS.get(plan_name, {'products': 0, 'suppliers': 0}).get(metric_key, 0)
+    current = getattr(usage, metric_key)
+    is_unlimited = limit >= 999
+    percent = 0 if (is_unlimited or limit == 0) else (current / limit) * 100
+    return {'current': current, 'limit': limit, 'percent': min(percent, 100), 'is_unlimited': is_unlimited, 'plan_name': plan_name}
+
+@contextmanager
+def plan_slot(user, metric_key, amount=1):
+    """
+    Transacción que reserva `amount` cupos del plan antes de crear registros.
+    El UPDATE condicional bloquea la fila de contadores, así dos usuarios creando
+    al mismo tiempo no pueden pasar el límite (el segundo espera y vuelve a evaluar).
+    """
+    usage = get_usage_info(user, metric_key)
+    with transaction.atomic():
+        if user.role != 'super_admin' and not usage['is_unlimited']:
+            locked = CompanyUsage.objects.filter(company_id=user.company_id, **{f'{metric_key}__lte': usage['limit'] - amount}).update(**{metric_key: F(metric_key)})
+            if not locked:
+                raise PlanLimitReached(f"⚠️ Límite del plan {usage['plan_name']} alcanzado ({usage['current']}/{usage['limit']}).")
+        yield usage
@@ -2,34 +2,50 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Sum, F
+from django.utils.dateparse import parse_date
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.db.models import Count, Sum, F, Q, OuterRef, Subquery, ExpressionWrapper, BooleanField, ProtectedError
+from django.db.models.functions import Coalesce
+from django.core.paginator import Paginator
 from django.db import transaction, IntegrityError
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 import json
+import hashlib
+from datetime import datetime
+from asgiref.sync import sync_to_async
 
 # IMPORTANTE: Agregamos Purchase al import
-from .models import Branch, Supplier, Product, User, Sale, SaleItem, Plan, Subscription, Company, Inventory, Purchase
+from .models import Branch, Supplier, Product, User, Sale, Plan, Subscription, Company, Inventory, Purchase, StockTransfer, DailySalesSummary
 from .forms import (BranchForm, SupplierForm, ProductForm, TeamMemberForm, 
                     RegistroClienteForm, PlanForm, CompanyForm, SuperUserForm)
+from .services import checkout, receive_purchase, transfer_stock
+from .inventory import Move, add_stock, remove_stock
+from .usage import get_usage_info, plan_slot, PlanLimitReached
+from .reports import build_report
+from .cache import cached, acached, cache_stats
+from .metrics import prometheus_text
+from .catalog import CATALOG_FIELDS, delta_floor, acatalog_version, afull_catalog, acatalog_delta, asearch_catalog
+from .importers import COLUMNS as IMPORT_COLUMNS, iter_rows, import_products
+from .replenishment import VELOCITY_DAYS, COVER_DAYS, replenishment_list
+from .exports import EXPORT_COLUMNS, FORMATS as EXPORT_FORMATS, date_bounds, stream_export, astream_export
+from .events import astream as event_astream, enabled as events_enabled
 
-PLAN_DEFAULTS = {'Básico': {'products': 500, 'suppliers': 5}, 'Estándar': {'products': 1000, 'suppliers': 20}, 'Premium': {'products': 999999, 'suppliers': 999}}
-
-def get_usage_info(user, metric_key, model_class):
-    if user.role == 'super_admin': return {'current': 0, 'limit': 999, 'percent': 0, 'is_unlimited': True, 'plan_name': 'SuperAdmin'}
-    company = user.company
-    plan = company.subscription.plan if hasattr(company, 'subscription') and company.subscription.is_active else None
-    plan_name = plan.name if plan else 'Sin Plan'
-    limit = 0
-    if metric_key == 'branches': limit = plan.max_branches if plan else 0
-    elif metric_key == 'users': limit = plan.max_users if plan else 0
-    else: limit = PLAN_DEFAULTS.get(plan_name, {'products': 0, 'suppliers': 0}).get(metric_key, 0)
-    current = User.objects.filter(company=company).count() if metric_key == 'users' else model_class.objects.filter(company=company).count()
-    is_unlimited = limit >= 999
-    percent = 0 if (is_unlimited or limit == 0) else (current / limit) * 100
-    return {'current': current, 'limit': limit, 'percent': min(percent, 100), 'is_unlimited': is_unlimited, 'plan_name': plan_name}
-
-def check_limit_block(request, metric_key, model_class):
-    usage = get_usage_info(request.user, metric_key, model_class)
+def get_plans(): return cached(None, 'plans', 'all', lambda: list(Plan.objects.all().order_by('price')))
+
+# Vistas async (POS, reportes, historial): con ASGI una caja esperando la red no ocupa un hilo.
+# El ORM async se usa directo; sync_to_async sólo para transacciones y para render(),
+# cuyos context processors (usuario, mensajes) leen la sesión y el ORM de forma síncrona.
+async def get_user(request):
+    """Usuario cargado con el ORM async; se deja en request.user para que render() no lo vuelva a consultar."""
+    request.user = await request.auser()
+    return request.user
+
+async def arender(request, template, context): return await sync_to_async(render)(request, template, context)
+
+def check_limit_block(request, metric_key):
+    usage = get_usage_info(request.user, metric_key)
     if not usage['is_unlimited'] and usage['current'] >= usage['limit']:
         messages.error(request, f"⚠️ Límite del plan {usage['plan_name']} alcanzado ({usage['current']}/{usage['limit']}).")
         return False
@@ -38,7 +54,12 @@ def check_limit_block(request, metric_key, model_class):
 # --- GENERAL ---
 def home_redirect(request): return redirect('dashboard') if request.user.is_authenticated else redirect('login')
 @login_required
-def dashboard_view(request): return render(request, 'dashboard.html')
+def dashboard_view(request):
+    """Menú principal; las ventas del día salen del resumen diario y se actualizan en vivo por /events/."""
+    today = None
+    if request.user.company_id:
+        today = DailySalesSummary.objects.filter(company_id=request.user.company_id, day=timezone.localdate()).aggregate(count=Sum('sales_count'), total=Sum('total'))
+    return render(request, 'dashboard.html', {'today': today})
 def register_view(request):
     if request.method == 'POST':
         form = RegistroClienteForm(request.POST)
@@ -102,7 +123,17 @@ def super_user_delete(request, pk):
 @login_required
 def super_dashboard_plans(request):
     if request.user.role != 'super_admin': return redirect('dashboard')
-    return render(request, 'superadmin/plan_list.html', {'plans': Plan.objects.all().order_by('price')})
+    return render(request, 'superadmin/plan_list.html', {'plans': get_plans()})
+@login_required
+def super_cache_stats(request):
+    if request.user.role != 'super_admin': return redirect('dashboard')
+    return JsonResponse(cache_stats())
+def super_metrics(request):
+    """Métricas por vista en formato Prometheus: superadmin con sesión, o scraper con METRICS_TOKEN (Authorization: Bearer)."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    allowed = (token and request.headers.get('Authorization') == f'Bearer {token}') or (request.user.is_authenticated and request.user.role == 'super_admin')
+    if not allowed: return HttpResponse(status=403)
+    return HttpResponse(prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
 @login_required
 def super_plan_create(request):
     if request.method == 'POST':
@@ -120,32 +151,62 @@ def super_plan_edit(request, pk):
     return render(request, 'superadmin/plan_form.html', {'form': form, 'title': 'Editar Plan'})
 
 # --- PRODUCTOS ---
+PRODUCTS_PER_PAGE = 50
+
 @login_required
 def product_list(request):
-    usage = get_usage_info(request.user, 'products', Product)
-    return render(request, 'products/list.html', {'products': Product.objects.filter(company=request.user.company), 'usage': usage})
+    """Listado paginado: stock de la sucursal principal y estado crítico vienen anotados en el mismo SELECT."""
+    usage = get_usage_info(request.user, 'products')
+    q = request.GET.get('q', '').strip()
+    branch = Branch.objects.filter(company=request.user.company).first()
+    inv = Inventory.objects.filter(branch=branch, product=OuterRef('pk'))
+    products = Product.objects.filter(company=request.user.company).annotate(
+        stock=Coalesce(Subquery(inv.values('stock')[:1]), 0),
+        min_stock=Coalesce(Subquery(inv.values('min_stock')[:1]), 5),
+    ).annotate(is_critical=ExpressionWrapper(Q(stock__lte=F('min_stock')), output_field=BooleanField())).order_by('name', 'id')
+    if q: products = products.filter(Q(sku__icontains=q) | Q(name__icontains=q))
+    page = Paginator(products, PRODUCTS_PER_PAGE).get_page(request.GET.get('page'))
+    return render(request, 'products/list.html', {'products': page, 'page': page, 'q': q, 'usage': usage})
 
 @login_required
 def product_create(request):
-    if not check_limit_block(request, 'products', Product): return redirect('product_list')
+    if not check_limit_block(request, 'products'): return redirect('product_list')
     if request.method == 'POST':
         form = ProductForm(request.POST)
         if form.is_valid(): 
             try:
-                p = form.save(commit=False)
-                p.company = request.user.company
-                p.save()
-                stock_val = form.cleaned_data.get('initial_stock', 0)
-                first_branch = Branch.objects.filter(company=request.user.company).first()
-                if first_branch: Inventory.objects.create(branch=first_branch, product=p, stock=stock_val)
-                else: messages.warning(request, "Producto creado sin inventario (Falta sucursal).")
+                with plan_slot(request.user, 'products'):
+                    p = form.save(commit=False)
+                    p.company = request.user.company
+                    p.save()
+                    stock_val = form.cleaned_data.get('initial_stock', 0)
+                    first_branch = Branch.objects.filter(company=request.user.company).first()
+                    if first_branch: add_stock(p.company_id, 'initial', [Move(first_branch.id, p.id, stock_val)], request.user)
+                    else: messages.warning(request, "Producto creado sin inventario (Falta sucursal).")
                 messages.success(request, 'Producto creado exitosamente.')
                 return redirect('product_list')
+            except PlanLimitReached as e: messages.error(request, str(e)); return redirect('product_list')
             except IntegrityError:
                 messages.error(request, f'Error: El SKU "{form.cleaned_data.get("sku")}" ya existe.')
     else: form = ProductForm()
     return render(request, 'products/form.html', {'form': form, 'title': 'Nuevo'})
 
+@login_required
+def product_import(request):
+    """Carga masiva CSV/XLSX: el archivo se lee fila a fila y se guarda por lotes (ver api/importers.py)."""
+    branches = Branch.objects.filter(company=request.user.company)
+    result = None
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        branch = branches.filter(id=request.POST.get('branch')).first() if request.POST.get('branch') else None
+        if not upload: messages.error(request, 'Seleccione un archivo.')
+        else:
+            try:
+                result = import_products(request.user, iter_rows(upload.file, upload.name), branch=branch)
+                messages.success(request, f"Importación: {result['created']} creados, {result['updated']} actualizados, {result['error_count']} filas con error.")
+            except (ValueError, UnicodeDecodeError) as e: messages.error(request, f'Archivo inválido: {e}')
+    return render(request, 'products/import.html', {'branches': branches, 'result': result, 'columns': IMPORT_COLUMNS})
+
 @login_required
 def product_edit(request, pk):
     p = get_object_or_404(Product, pk=pk, company=request.user.company)
@@ -160,7 +221,10 @@ def product_edit(request, pk):
 @login_required
 def product_delete(request, pk):
     p = get_object_or_404(Product, pk=pk, company=request.user.company)
-    if request.method == 'POST': p.delete(); return redirect('product_list')
+    if request.method == 'POST':
+        try: p.delete()
+        except ProtectedError: messages.error(request, 'No se puede eliminar: el producto tiene compras o traslados registrados.')
+        return redirect('product_list')
     return render(request, 'generic_delete.html', {'object': p, 'cancel_url': 'product_list'})
 
 @login_required
@@ -169,28 +233,86 @@ def product_adjust_stock(request, pk):
     if request.method == 'POST':
         try:
             qty = int(request.POST.get('quantity', 0))
-            op = request.POST.get('operation', 'add')
+            if qty < 1: raise ValueError('La cantidad debe ser mayor a 0.')
             branch = Branch.objects.filter(company=request.user.company).first()
-            if branch:
-                inv, _ = Inventory.objects.get_or_create(branch=branch, product=product)
-                if op == 'add': inv.stock += qty
-                elif op == 'subtract' and inv.stock >= qty: inv.stock -= qty
-                inv.save()
-                messages.success(request, 'Stock actualizado.')
-        except: pass
+            if not branch: raise ValueError('Falta sucursal.')
+            move = [Move(branch.id, product.id, qty)]
+            with transaction.atomic():
+                if request.POST.get('operation', 'add') == 'subtract': remove_stock(product.company_id, 'adjustment', move, request.user)
+                else: add_stock(product.company_id, 'adjustment', move, request.user)
+            messages.success(request, 'Stock actualizado.')
+        except ValueError as e: messages.error(request, f'No se pudo ajustar el stock: {e}')
     return redirect('product_list')
 
+# --- COMPRAS ---
+@login_required
+def purchase_list(request):
+    purchases = Purchase.objects.filter(company=request.user.company).select_related('supplier', 'branch').order_by('-date', '-id')[:100]
+    return render(request, 'purchases/list.html', {'purchases': purchases})
+
+def parse_sku_lines(company, text, columns=('quantity', 'unit_cost')):
+    """Texto pegado "SKU, cantidad[, costo unitario]" (coma, punto y coma o tab) -> líneas con id de producto."""
+    rows = [[c.strip() for c in line.replace(';', ',').replace('\t', ',').split(',')] for line in text.splitlines() if line.strip()]
+    skus = dict(Product.objects.filter(company=company, sku__in={r[0] for r in rows}).values_list('sku', 'id'))
+    expected = ', '.join(['SKU', 'cantidad', 'costo unitario'][:len(columns) + 1])
+    items = []
+    for n, r in enumerate(rows, start=1):
+        if len(r) < len(columns) + 1: raise ValueError(f'Línea {n}: se espera "{expected}".')
+        if r[0] not in skus: raise ValueError(f'Línea {n}: SKU "{r[0]}" no existe.')
+        items.append({'product': skus[r[0]], **dict(zip(columns, r[1:]))})
+    return items
+
+@login_required
+def purchase_create(request):
+    """Recepción de una factura completa en un solo envío (ver services.receive_purchase)."""
+    c = request.user.company
+    suppliers, branches = Supplier.objects.filter(company=c), Branch.objects.filter(company=c)
+    if request.method == 'POST':
+        try:
+            supplier = get_object_or_404(Supplier, pk=request.POST.get('supplier'), company=c)
+            branch = get_object_or_404(Branch, pk=request.POST.get('branch'), company=c)
+            p = receive_purchase(c, request.user, supplier, branch, request.POST.get('invoice_number'), parse_sku_lines(c, request.POST.get('lines', '')))
+            messages.success(request, f'Compra {p.invoice_number} recibida: {p.items.count()} líneas, total ${p.total}.')
+            return redirect('purchase_list')
+        except ValueError as e: messages.error(request, str(e))
+    return render(request, 'purchases/form.html', {'suppliers': suppliers, 'branches': branches, 'data': request.POST})
+
+# --- TRASLADOS ---
+@login_required
+def transfer_list(request):
+    transfers = StockTransfer.objects.filter(company=request.user.company).select_related('from_branch', 'to_branch', 'user').annotate(lines=Count('items'), units=Sum('items__quantity')).order_by('-id')[:100]
+    return render(request, 'transfers/list.html', {'transfers': transfers})
+
+@login_required
+def transfer_create(request):
+    """Traslado de muchas líneas en un envío: descuenta el origen y suma el destino en una transacción."""
+    c = request.user.company
+    branches = Branch.objects.filter(company=c)
+    if request.method == 'POST':
+        try:
+            source = get_object_or_404(Branch, pk=request.POST.get('from_branch'), company=c)
+            target = get_object_or_404(Branch, pk=request.POST.get('to_branch'), company=c)
+            t = transfer_stock(c, request.user, source, target, parse_sku_lines(c, request.POST.get('lines', ''), columns=('quantity',)), request.POST.get('note', ''))
+            messages.success(request, f'Traslado #{t.id} realizado: {source.name} → {target.name}.')
+            return redirect('transfer_list')
+        except ValueError as e: messages.error(request, str(e))
+    return render(request, 'transfers/form.html', {'branches': branches, 'data': request.POST})
+
 # --- MANTENEDORES ---
 @login_required
 def team_list(request):
-    usage = get_usage_info(request.user, 'users', User)
+    usage = get_usage_info(request.user, 'users')
     return render(request, 'team/list.html', {'members': User.objects.filter(company=request.user.company).exclude(id=request.user.id), 'usage': usage})
 @login_required
 def team_create(request):
-    if not check_limit_block(request, 'users', User): return redirect('team_list')
+    if not check_limit_block(request, 'users'): return redirect('team_list')
     if request.method == 'POST':
         form = TeamMemberForm(request.POST)
-        if form.is_valid(): form.save(company=request.user.company); messages.success(request, 'Creado.'); return redirect('team_list')
+        if form.is_valid():
+            try:
+                with plan_slot(request.user, 'users'): form.save(company=request.user.company)
+                messages.success(request, 'Creado.'); return redirect('team_list')
+            except PlanLimitReached as e: messages.error(request, str(e)); return redirect('team_list')
     else: form = TeamMemberForm()
     return render(request, 'team/form.html', {'form': form, 'title': 'Nuevo'})
 @login_required
@@ -209,14 +331,18 @@ def team_delete(request, pk):
 
 @login_required
 def branch_list(request):
-    usage = get_usage_info(request.user, 'branches', Branch)
+    usage = get_usage_info(request.user, 'branches')
     return render(request, 'branches/list.html', {'branches': Branch.objects.filter(company=request.user.company), 'usage': usage})
 @login_required
 def branch_create(request):
-    if not check_limit_block(request, 'branches', Branch): return redirect('branch_list')
+    if not check_limit_block(request, 'branches'): return redirect('branch_list')
     if request.method == 'POST':
         f = BranchForm(request.POST)
-        if f.is_valid(): b=f.save(commit=False); b.company=request.user.company; b.save(); return redirect('branch_list')
+        if f.is_valid():
+            try:
+                with plan_slot(request.user, 'branches'): b=f.save(commit=False); b.company=request.user.company; b.save()
+                return redirect('branch_list')
+            except PlanLimitReached as e: messages.error(request, str(e)); return redirect('branch_list')
     else: f = BranchForm()
     return render(request, 'branches/form.html', {'form': f, 'title': 'Nueva'})
 @login_required
@@ -235,14 +361,18 @@ def branch_delete(request, pk):
 
 @login_required
 def supplier_list(request):
-    usage = get_usage_info(request.user, 'suppliers', Supplier)
+    usage = get_usage_info(request.user, 'suppliers')
     return render(request, 'suppliers/list.html', {'suppliers': Supplier.objects.filter(company=request.user.company), 'usage': usage})
 @login_required
 def supplier_create(request):
-    if not check_limit_block(request, 'suppliers', Supplier): return redirect('supplier_list')
+    if not check_limit_block(request, 'suppliers'): return redirect('supplier_list')
     if request.method == 'POST':
         f = SupplierForm(request.POST)
-        if f.is_valid(): s=f.save(commit=False); s.company=request.user.company; s.save(); return redirect('supplier_list')
+        if f.is_valid():
+            try:
+                with plan_slot(request.user, 'suppliers'): s=f.save(commit=False); s.company=request.user.company; s.save()
+                return redirect('supplier_list')
+            except PlanLimitReached as e: messages.error(request, str(e)); return redirect('supplier_list')
     else: f = SupplierForm()
     return render(request, 'suppliers/form.html', {'form': f, 'title': 'Nuevo'})
 @login_required
@@ -256,111 +386,185 @@ def supplier_edit(request, pk):
 @login_required
 def supplier_delete(request, pk):
     s = get_object_or_404(Supplier, pk=pk, company=request.user.company)
-    if request.method == 'POST': s.delete(); return redirect('supplier_list')
+    if request.method == 'POST':
+        try: s.delete()
+        except ProtectedError: messages.error(request, 'No se puede eliminar: el proveedor tiene compras registradas.')
+        return redirect('supplier_list')
     return render(request, 'generic_delete.html', {'object': s, 'cancel_url': 'supplier_list'})
 
 # --- VENTAS Y REPORTES ---
+def get_pos_branch(request):
+    """Sucursal de la caja guardada en la sesión (por defecto, la primera de la empresa)."""
+    branches = Branch.objects.filter(company=request.user.company).order_by('id')
+    bid = request.session.get('pos_branch_id')
+    branch = (branches.filter(pk=bid).first() if bid else None) or branches.first()
+    if branch: request.session['pos_branch_id'] = branch.id
+    return branch
+
 @login_required
 def pos_view(request):
-    return render(request, 'sales/pos.html', {'products': Product.objects.filter(company=request.user.company)})
+    if 'branch' in request.GET:
+        b = get_object_or_404(Branch, pk=request.GET['branch'], company=request.user.company)
+        request.session['pos_branch_id'] = b.id
+    return render(request, 'sales/pos.html', {
+        'branches': Branch.objects.filter(company=request.user.company).order_by('id'),
+        'current_branch': get_pos_branch(request),
+    })
+@login_required
+async def pos_catalog(request):
+    """
+    Catálogo JSON del POS: completo, incremental (?since=<versión>) o búsqueda (?q=).
+    El ETag es la versión del catálogo: si la caja ya la tiene responde 304 sin tocar la base de datos.
+    """
+    cid = (await get_user(request)).company_id
+    version = await acatalog_version(cid)
+    q = request.GET.get('q', '').strip()
+    since = request.GET.get('since', '')
+    etag = f'"{cid}-{version}-{hashlib.md5(q.encode()).hexdigest()[:8]}"' if q else f'"{cid}-{version}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        if q: data = {'version': version, 'full': False, 'products': await asearch_catalog(cid, q), 'deleted': []}
+        elif since.isdigit() and int(since) >= version: data = {'version': version, 'full': False, 'products': [], 'deleted': []}
+        elif since.isdigit() and int(since) >= delta_floor():  # más atrás los borrados pueden estar purgados
+            changed, deleted = await acatalog_delta(cid, int(since))
+            data = {'version': version, 'full': False, 'products': changed, 'deleted': deleted}
+        else: data = {'version': version, 'full': True, 'products': await afull_catalog(cid), 'deleted': []}
+        response = JsonResponse({'fields': CATALOG_FIELDS, **data})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+@login_required
+async def events_stream(request):
+    """
+    Server-Sent Events de la empresa del usuario: stock, ventas y avisos de catálogo ya fusionados (api/events.py).
+    La empresa sale de la sesión, nunca de la URL. Sólo con ASGI, donde cada conexión es una corrutina:
+    con WSGI (runserver, gunicorn síncrono) cada pestaña abierta ocuparía un hilo del servidor.
+    """
+    user = await get_user(request)
+    # 204: EventSource no reconecta y las pantallas quedan con los datos de la carga
+    if not isinstance(request, ASGIRequest) or not events_enabled() or not user.company_id: return HttpResponse(status=204)
+    last_id = request.headers.get('Last-Event-ID', '')
+    last_id = int(last_id) if last_id.isdigit() else None
+    response = StreamingHttpResponse(event_astream(user.company_id, last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: entregar cada mensaje sin acumular
+    return response
+
+def pos_checkout(request, items, payment_method):
+    return checkout(request.user.company, request.user, items, get_pos_branch(request), payment_method)
+
 @login_required
-def pos_submit(request):
+async def pos_submit(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
             items = data.get('items', [])
             if not items: return JsonResponse({'error': 'Carrito vacío'}, status=400)
-            with transaction.atomic():
-                sale = Sale.objects.create(company=request.user.company, seller=request.user, total=0)
-                total = 0
-                for i in items:
-                    p = Product.objects.get(id=i['id'], company=request.user.company)
-                    qty = int(i['qty'])
-                    inv = Inventory.objects.filter(product=p, stock__gte=qty).first()
-                    if not inv: raise ValueError(f"Sin stock para {p.name}")
-                    inv.stock -= qty
-                    inv.save()
-                    subtotal = p.price * qty
-                    total += subtotal
-                    SaleItem.objects.create(sale=sale, product=p, quantity=qty, price_at_moment=p.price, subtotal=subtotal)
-                sale.total = total
-                sale.save()
-            return JsonResponse({'success': True})
+            await get_user(request)
+            # La venta es una transacción (bloqueo de stock): el ORM async no tiene atomic(), corre en un hilo
+            sale = await sync_to_async(pos_checkout)(request, items, data.get('payment_method', 'cash'))
+            return JsonResponse({'success': True, 'sale_id': sale.id})
+        except ValueError as e: return JsonResponse({'error': str(e)}, status=400)
         except Exception as e: return JsonResponse({'error': str(e)}, status=500)
     return JsonResponse({'error': 'Error'}, status=405)
+SALES_PER_PAGE = 50
+
+def query_date(value):
+    """Fecha AAAA-MM-DD de un filtro GET; None si no viene, está mal escrita o no existe (2025-02-30)."""
+    try: return parse_date(value or '')
+    except ValueError: return None
+
+def encode_cursor(sale): return urlsafe_base64_encode(f"{sale.created_at.isoformat()}|{sale.id}".encode())
+def decode_cursor(value):
+    """Cursor (created_at, id) de la paginación por llave; None si no viene o es inválido."""
+    if not value: return None
+    try:
+        ts, pk = urlsafe_base64_decode(value).decode().split('|')
+        return datetime.fromisoformat(ts), int(pk)
+    except (TypeError, ValueError): return None
+
+
 @login_required
-def sale_list(request):
-    return render(request, 'sales/list.html', {'sales': Sale.objects.filter(company=request.user.company).order_by('-created_at')})
+async def sale_list(request):
+    """Historial con paginación por cursor (created_at, id): abrir cualquier página cuesta lo mismo el día 1 y el año 5."""
+    f = request.GET
+    cid = (await get_user(request)).company_id
+    sales = Sale.objects.filter(company_id=cid).select_related('seller', 'branch')
+    # Rango semiabierto sobre created_at (no __date): usa el índice (company, created_at)
+    start, end = date_bounds(query_date(f.get('date_from')), query_date(f.get('date_to')))
+    if start: sales = sales.filter(created_at__gte=start)
+    if end: sales = sales.filter(created_at__lt=end)
+    if f.get('branch', '').isdigit(): sales = sales.filter(branch_id=f['branch'])
+    if f.get('seller', '').isdigit(): sales = sales.filter(seller_id=f['seller'])
+    if f.get('payment_method') in dict(Sale.PAYMENT_TYPES): sales = sales.filter(payment_method=f['payment_method'])
+
+    after, before = decode_cursor(f.get('after')), decode_cursor(f.get('before'))
+    if before:
+        ts, pk = before
+        rows = [s async for s in sales.filter(Q(created_at__gt=ts) | Q(created_at=ts, id__gt=pk)).order_by('created_at', 'id')[:SALES_PER_PAGE + 1]]
+        has_newer, has_older = len(rows) > SALES_PER_PAGE, True
+        rows = rows[:SALES_PER_PAGE][::-1]
+    else:
+        if after:
+            ts, pk = after
+            sales = sales.filter(Q(created_at__lt=ts) | Q(created_at=ts, id__lt=pk))
+        rows = [s async for s in sales.order_by('-created_at', '-id')[:SALES_PER_PAGE + 1]]
+        has_newer, has_older = after is not None, len(rows) > SALES_PER_PAGE
+        rows = rows[:SALES_PER_PAGE]
+
+    filters = f.copy()
+    for k in ('after', 'before'): filters.pop(k, None)
+    return await arender(request, 'sales/list.html', {
+        'sales': rows,
+        'filters': f,
+        'filters_qs': filters.urlencode(),
+        'newer_cursor': encode_cursor(rows[0]) if rows and has_newer else None,
+        'older_cursor': encode_cursor(rows[-1]) if rows and has_older else None,
+        'branches': [b async for b in Branch.objects.filter(company_id=cid)],
+        'sellers': [u async for u in User.objects.filter(company_id=cid)],
+        'payment_types': Sale.PAYMENT_TYPES,
+    })
 
 @login_required
-def reports_view(request):
+async def reports_view(request):
     """Genera reportes detallados de gestión"""
-    c = request.user.company
-    now = timezone.now()
-    plan_name = c.subscription.plan.name if hasattr(c, 'subscription') else 'Básico'
-    can_see_details = plan_name in ['Estándar', 'Premium']
-
-    # KPIs Generales
-    total_sales = Sale.objects.filter(company=c).count()
-    total_money = Sale.objects.filter(company=c).aggregate(Sum('total'))['total__sum'] or 0
-    total_products = Product.objects.filter(company=c).count()
-    
-    # Inventario Global
-    total_stock = Inventory.objects.filter(branch__company=c).aggregate(Sum('stock'))['stock__sum'] or 0
-    inventory_value = Inventory.objects.filter(branch__company=c).annotate(val=F('stock') * F('product__cost')).aggregate(Sum('val'))['val__sum'] or 0
-    low_stock_count = Inventory.objects.filter(branch__company=c, stock__lte=F('min_stock')).count()
-
-    # Ventas por periodo (Global)
-    sales_today = Sale.objects.filter(company=c, created_at__date=now.date()).aggregate(Sum('total'))['total__sum'] or 0
-    sales_month = Sale.objects.filter(company=c, created_at__month=now.month, created_at__year=now.year).aggregate(Sum('total'))['total__sum'] or 0
-
-    # 1. Reporte Stock y Ventas por Sucursal
-    stock_by_branch = []
-    if can_see_details:
-        branches = Branch.objects.filter(company=c)
-        for b in branches:
-            b_stock = Inventory.objects.filter(branch=b).aggregate(Sum('stock'))['stock__sum'] or 0
-            b_sales_today = Sale.objects.filter(branch=b, created_at__date=now.date()).aggregate(Sum('total'))['total__sum'] or 0
-            b_sales_month = Sale.objects.filter(branch=b, created_at__month=now.month).aggregate(Sum('total'))['total__sum'] or 0
-            stock_by_branch.append({
-                'name': b.name,
-                'stock': b_stock,
-                'sales_today': b_sales_today,
-                'sales_month': b_sales_month
-            })
-
-    # 2. Reporte de Proveedores
-    suppliers_report = []
-    for s in Supplier.objects.filter(company=c):
-        # Última compra
-        last_p = Purchase.objects.filter(supplier=s).order_by('-date').first()
-        purchases_count = Purchase.objects.filter(supplier=s).count()
-        suppliers_report.append({
-            'name': s.name,
-            'contact': s.contact_name,
-            'rut': s.rut,
-            'purchases_count': purchases_count,
-            'last_purchase': last_p.date if last_p else None
-        })
-
-    return render(request, 'reports/index.html', {
-        'total_sales': total_sales,
-        'total_money': total_money,
-        'total_products': total_products,
-        'total_stock': total_stock,
-        'inventory_value': inventory_value,
-        'low_stock_count': low_stock_count,
-        'sales_today': sales_today,
-        'sales_month': sales_month,
-        'plan_name': plan_name,
-        'can_see_details': can_see_details,
-        'stock_by_branch': stock_by_branch,
-        'suppliers_report': suppliers_report
-    })
+    user = await get_user(request)
+    # build_report arma una docena de agregaciones síncronas: sólo corre en un hilo si no está en caché
+    report = await acached(user.company_id, 'reports', f'index:{timezone.localdate()}', sync_to_async(lambda: build_report(user.company)), timeout=300)
+    return await arender(request, 'reports/index.html', report)
+
+@login_required
+async def replenishment_view(request):
+    """Lista de reposición: productos en stock crítico por sucursal y proveedor, con pedido sugerido."""
+    cid = (await get_user(request)).company_id
+    branches = [b async for b in Branch.objects.filter(company_id=cid)]
+    branch = request.GET.get('branch', '')
+    groups = await sync_to_async(replenishment_list)(cid, int(branch) if branch.isdigit() else None)
+    return await arender(request, 'reports/replenishment.html', {'groups': groups, 'branches': branches, 'branch': branch, 'velocity_days': VELOCITY_DAYS, 'cover_days': COVER_DAYS})
+
+@login_required
+def export_data(request, kind):
+    """
+    Descarga en streaming (CSV/NDJSON) de ventas, detalle de ventas o stock; ?format=&date_from=&date_to=
+    Una fecha mal escrita o inexistente responde 400 (exportar todo el historial en su lugar sería caro).
+    Con ASGI el cuerpo es un generador async (memoria constante); con WSGI, uno síncrono.
+    """
+    if kind not in EXPORT_COLUMNS: return redirect('reports')
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS: fmt = 'csv'
+    dates = {key: query_date(request.GET.get(key)) for key in ('date_from', 'date_to')}
+    for key, value in dates.items():
+        if request.GET.get(key) and value is None: return HttpResponse(f'{key}: fecha inválida, use AAAA-MM-DD.', status=400, content_type='text/plain; charset=utf-8')
+    start, end = date_bounds(dates['date_from'], dates['date_to'])
+    lines = (astream_export if isinstance(request, ASGIRequest) else stream_export)(request.user.company_id, kind, fmt, start, end)
+    response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{kind}_{timezone.localdate():%Y%m%d}.{fmt}"'
+    return response
 
 @login_required
 def subscription_detail(request):
-    return render(request, 'subscription/detail.html', {'subscription': getattr(request.user.company, 'subscription', None), 'plans': Plan.objects.all().order_by('price')})
+    return render(request, 'subscription/detail.html', {'subscription': getattr(request.user.company, 'subscription', None), 'plans': get_plans()})
 @login_required
 def subscribe_plan(request, plan_id):
     if request.method == 'POST':
@@ -373,6 +577,22 @@ def api_docs_view(request):
     base_url = request.build_absolute_uri('/')[:-1]
     docs = [
         {"category": "1. Autenticación", "endpoints": [{"title": "Token", "method": "POST", "url": "/api/token/", "desc": "Login", "body": json.dumps({"email":"admin@test.com","password":"123"}, indent=2)}]},
-        {"category": "2. Productos", "endpoints": [{"title": "Listar", "method": "GET", "url": "/api/products/", "desc": "Ver productos", "body": None}]},
+        {"category": "2. Productos", "endpoints": [
+            {"title": "Listar", "method": "GET", "url": "/api/products/?fields=id,sku,name,price", "desc": "Ver productos (cursor, ?search=, ?sku=, ?fields=)", "body": None},
+            {"title": "Crear", "method": "POST", "url": "/api/products/", "desc": "Crear producto (respeta límite del plan)", "body": json.dumps({"sku": "PAR-500", "name": "Paracetamol 500mg", "price": 1500, "cost": 800}, indent=2)},
+        ]},
+        {"category": "3. Inventario y Sucursales", "endpoints": [
+            {"title": "Sucursales", "method": "GET", "url": "/api/branches/", "desc": "Ver sucursales", "body": None},
+            {"title": "Stock", "method": "GET", "url": "/api/inventory/?branch=1", "desc": "Stock por sucursal (?branch=, ?product=, ?sku=, ?low=1 sólo críticos)", "body": None},
+            {"title": "Reposición", "method": "GET", "url": "/api/inventory/replenishment/?branch=1", "desc": "Stock crítico por sucursal y proveedor preferido, con cantidad sugerida", "body": None},
+        ]},
+        {"category": "4. Ventas y Compras", "endpoints": [
+            {"title": "Ventas", "method": "GET", "url": "/api/sales/?created_after=2025-01-01", "desc": "Ventas con items (?branch=, ?seller=, ?payment_method=, ?created_after=, ?created_before=)", "body": None},
+            {"title": "Proveedores", "method": "GET", "url": "/api/suppliers/", "desc": "Ver proveedores", "body": None},
+            {"title": "Compras", "method": "GET", "url": "/api/purchases/", "desc": "Compras con items (?supplier=, ?branch=, ?date_after=)", "body": None},
+            {"title": "Recibir Factura", "method": "POST", "url": "/api/purchases/", "desc": "Registra la compra y suma el stock de todas las líneas (Gerente)", "body": json.dumps({"supplier": 1, "branch": 1, "invoice_number": "F-1001", "items": [{"product": 5, "quantity": 24, "unit_cost": 990}]}, indent=2)},
+            {"title": "Traslados", "method": "GET", "url": "/api/transfers/", "desc": "Traslados entre sucursales con items (?from_branch=, ?to_branch=)", "body": None},
+            {"title": "Trasladar Stock", "method": "POST", "url": "/api/transfers/", "desc": "Descuenta en origen y suma en destino en una transacción (Gerente)", "body": json.dumps({"from_branch": 1, "to_branch": 2, "note": "Reposición", "items": [{"product": 5, "quantity": 12}]}, indent=2)},
+        ]},
     ]
     return render(request, 'docs/api_reference.html', {'docs': docs, 'base_url': base_url})
\ No newline at end of file
@@ -0,0 +1,183 @@
+from contextlib import nullcontext
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError
+from django.db.models import ProtectedError
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.exceptions import APIException, PermissionDenied, ValidationError
+from rest_framework.pagination import CursorPagination
+
+from .models import Product, Branch, Inventory, Sale, Supplier, Purchase, StockTransfer
+from .serializers import (ProductSerializer, BranchSerializer, InventorySerializer,
+                          SaleSerializer, SupplierSerializer, PurchaseSerializer, StockTransferSerializer)
+from .permissions import IsVendedor, IsGerente, CheckPlanLimits
+from .usage import plan_slot, PlanLimitReached
+from .replenishment import replenishment_list
+from .services import ingest_sales, receive_purchase, transfer_stock, BULK_MAX_SALES
+
+
+# Modelos con on_delete=PROTECT -> cómo se nombran en el mensaje de 409
+PROTECTED_BY = {'purchase': 'compras', 'purchaseitem': 'compras', 'stocktransferitem': 'traslados'}
+
+
+class Conflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'El registro está en uso.'
+    default_code = 'conflict'
+
+
+class TenantCursorPagination(CursorPagination):
+    """Paginación por cursor sobre el id: el costo de cada página no crece con el historial."""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = '-id'
+
+
+class TenantQuerysetMixin:
+    """
+    Base de la API REST: todo se filtra por request.user.company.
+    `filter_fields` mapea parámetros del query string a lookups del ORM (?branch=3, ?created_after=...).
+    """
+    company_lookup = 'company'
+    filter_fields = {}
+    pagination_class = TenantCursorPagination
+
+    def get_permissions(self):
+        if self.request.method in permissions.SAFE_METHODS: return [IsVendedor()]
+        return [IsGerente(), CheckPlanLimits()]
+
+    def get_queryset(self):
+        qs = self.queryset.filter(**{self.company_lookup: self.request.user.company})
+        try:
+            for param, lookup in self.filter_fields.items():
+                value = self.request.query_params.get(param)
+                if value not in (None, ''): qs = qs.filter(**{lookup: value})
+        except (ValueError, DjangoValidationError) as e:
+            raise ValidationError({'filter': str(e)})
+        return qs
+
+
+class TenantViewSet(TenantQuerysetMixin, viewsets.ModelViewSet):
+    plan_metric = None
+
+    def perform_create(self, serializer):
+        try:
+            with plan_slot(self.request.user, self.plan_metric) if self.plan_metric else nullcontext():
+                serializer.save(company=self.request.user.company)
+        except PlanLimitReached as e:
+            raise PermissionDenied(str(e))
+        except IntegrityError:
+            # Otra petición creó el mismo registro único (p. ej. SKU) entre la validación y el INSERT
+            raise ValidationError({'error': 'Ya existe un registro con esos datos.'})
+
+    def perform_destroy(self, instance):
+        try:
+            instance.delete()
+        except ProtectedError as e:
+            used_by = sorted({PROTECTED_BY.get(obj._meta.model_name, obj._meta.verbose_name_plural) for obj in e.protected_objects})
+            raise Conflict(f"No se puede eliminar: tiene {' y '.join(used_by)} asociados.")
+
+
+class TenantReadOnlyViewSet(TenantQuerysetMixin, viewsets.ReadOnlyModelViewSet):
+    pass
+
+
+# ==========================================
+# ENDPOINTS
+# ==========================================
+
+class ProductViewSet(TenantViewSet):
+    queryset = Product.objects.all()
+    serializer_class = ProductSerializer
+    plan_metric = 'products'
+    filter_fields = {'sku': 'sku', 'category': 'category_id', 'search': 'name__icontains', 'updated_after': 'updated_at__gt'}
+
+class BranchViewSet(TenantViewSet):
+    queryset = Branch.objects.all()
+    serializer_class = BranchSerializer
+    plan_metric = 'branches'
+
+class SupplierViewSet(TenantViewSet):
+    queryset = Supplier.objects.all()
+    serializer_class = SupplierSerializer
+    plan_metric = 'suppliers'
+    filter_fields = {'rut': 'rut', 'search': 'name__icontains'}
+
+class InventoryViewSet(TenantReadOnlyViewSet):
+    """Sólo lectura: el stock cambia por ventas, compras y ajustes (api/services.py)."""
+    queryset = Inventory.objects.select_related('product', 'branch')
+    serializer_class = InventorySerializer
+    company_lookup = 'branch__company'
+    filter_fields = {'branch': 'branch_id', 'product': 'product_id', 'sku': 'product__sku', 'low': 'is_low'}
+
+    @action(detail=False)
+    def replenishment(self, request):
+        """Stock crítico agrupado por sucursal y proveedor preferido, con cantidad sugerida (?branch=)."""
+        branch = request.query_params.get('branch', '')
+        return Response({'branches': replenishment_list(request.user.company_id, int(branch) if branch.isdigit() else None)})
+
+class SaleViewSet(TenantReadOnlyViewSet):
+    queryset = Sale.objects.select_related('seller').prefetch_related('items')
+    serializer_class = SaleSerializer
+    filter_fields = {'branch': 'branch_id', 'seller': 'seller_id', 'payment_method': 'payment_method',
+                     'created_after': 'created_at__gte', 'created_before': 'created_at__lt'}
+
+    def get_permissions(self):
+        if self.action == 'bulk': return [IsVendedor()]
+        return super().get_permissions()
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Ingesta de ventas offline: {"branch": 1, "sales": [{"key": "<uuid>", "payment_method": "cash",
+        "created_at": "2026-01-31T18:05:00-03:00", "items": [{"id": 5, "qty": 2}]}]}. Responde un resultado
+        por venta (created / duplicate / error con un código de services.BULK_ERRORS).
+        """
+        sales = request.data.get('sales')
+        if not isinstance(sales, list) or not sales: return Response({'error': 'Lote vacío'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(sales) > BULK_MAX_SALES: return Response({'error': f'Máximo {BULK_MAX_SALES} ventas por lote'}, status=status.HTTP_400_BAD_REQUEST)
+        branches = Branch.objects.filter(company=request.user.company).order_by('id')
+        default_branch = branches.filter(pk=request.data['branch']).first() if str(request.data.get('branch', '')).isdigit() else branches.first()
+        results = ingest_sales(request.user.company, request.user, sales, default_branch)
+        summary = {s: sum(1 for r in results if r['status'] == s) for s in ('created', 'duplicate', 'error')}
+        return Response({**summary, 'results': results})
+
+class PurchaseViewSet(TenantReadOnlyViewSet):
+    queryset = Purchase.objects.select_related('supplier').prefetch_related('items')
+    serializer_class = PurchaseSerializer
+    filter_fields = {'branch': 'branch_id', 'supplier': 'supplier_id', 'date_after': 'date__gte', 'date_before': 'date__lt'}
+
+    def create(self, request):
+        """
+        Recepción de factura: {"supplier": 2, "branch": 1, "invoice_number": "F-123",
+        "items": [{"product": 5, "quantity": 10, "unit_cost": 990}]}. Suma el stock de todas las líneas de una vez.
+        """
+        data, company = request.data, request.user.company
+        supplier = Supplier.objects.filter(company=company, pk=data.get('supplier') or 0).first()
+        branch = Branch.objects.filter(company=company, pk=data.get('branch') or 0).first()
+        if not supplier or not branch: raise ValidationError({'error': 'Proveedor o sucursal inválidos.'})
+        try:
+            purchase = receive_purchase(company, request.user, supplier, branch, data.get('invoice_number'), data.get('items') or [])
+        except ValueError as e:
+            raise ValidationError({'error': str(e)})
+        return Response(self.get_serializer(purchase).data, status=status.HTTP_201_CREATED)
+
+class StockTransferViewSet(TenantReadOnlyViewSet):
+    queryset = StockTransfer.objects.prefetch_related('items')
+    serializer_class = StockTransferSerializer
+    filter_fields = {'from_branch': 'from_branch_id', 'to_branch': 'to_branch_id', 'created_after': 'created_at__gte', 'created_before': 'created_at__lt'}
+
+    def create(self, request):
+        """Traslado: {"from_branch": 1, "to_branch": 2, "note": "", "items": [{"product": 5, "quantity": 12}]}."""
+        data, company = request.data, request.user.company
+        branches = {b.id: b for b in Branch.objects.filter(company=company)}
+        try:
+            source, target = branches.get(int(data.get('from_branch') or 0)), branches.get(int(data.get('to_branch') or 0))
+            if not source or not target: raise ValueError('Sucursal inválida.')
+            transfer = transfer_stock(company, request.user, source, target, data.get('items') or [], data.get('note', ''))
+        except ValueError as e:
+            raise ValidationError({'error': str(e)})
+        return Response(self.get_serializer(transfer).data, status=status.HTTP_201_CREATED)
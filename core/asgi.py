@@ -5,6 +5,41 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Servir con ASGI (recomendado para las cajas POS en redes móviles lentas):
+
+    pip install uvicorn
+    DB_ENGINE=postgres DB_POOL=1 uvicorn core.asgi:application --host 0.0.0.0 --port 8000 --workers 4
+    # o con gunicorn como gestor de procesos:
+    gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker --workers 4
+
+Vistas async (api/views.py): pos_catalog, pos_submit, reports_view, replenishment_view y sale_list.
+Una caja que sube su venta lentamente o espera la respuesta ocupa una corrutina, no un hilo.
+El canal en vivo /events/ sólo se sirve aquí; con WSGI responde 204 y las pantallas no se actualizan solas.
+Con varios workers necesita CACHE_BACKEND=redis; con WSGI ni siquiera se publica (EVENTS_ENABLED en core/settings.py).
+El resto de las vistas son síncronas; Django las ejecuta en un hilo, igual que con WSGI.
+Todos los middleware de MIDDLEWARE aceptan async, así que las vistas async no pasan por un hilo extra.
+
+Base de datos con ASGI:
+  - Django ejecuta el código síncrono de cada petición (ORM async, transacciones) en un hilo propio
+    de la petición. Las conexiones persistentes quedarían atadas a hilos que ya terminaron.
+  - PostgreSQL: DB_POOL=1 (pool de psycopg; CONN_MAX_AGE queda en 0). DB_POOL_MAX acota las
+    conexiones por proceso.
+  - SQLite (desarrollo): DB_CONN_MAX_AGE=0.
+
+Cuánto aguanta un proceso: manage.py load_terminals --company <id> compara este handler con el WSGI
+(N hilos) para cajas con subida lenta, pausa entre peticiones y una mezcla de consultas de catálogo y ventas.
+Referencia en SQLite, 1 proceso, subida 1 s, pausa 5 s, 30% ventas (p50 / p99):
+
+    terminales   ASGI              WSGI 8 hilos
+       100       83 ms / 1,3 s     24 ms / 1,5 s
+       300      0,75 s / 2,8 s     5,5 s / 8,0 s
+       600       8,2 s / 11,8 s    12,2 s / 21,7 s   (ambos limitados por CPU)
+
+Con pocas terminales WSGI responde antes. ASGI paga unos ms por petición al saltar entre el loop y el hilo de la BD.
+La ventaja aparece cuando los hilos de WSGI se quedan esperando la red. Con CPU saturada, sumar --workers.
+Detrás de nginx con proxy_request_buffering on, nginx recibe el cuerpo completo antes de pasarlo a WSGI,
+así que la diferencia se achica. En ese caso ASGI sirve para conexiones largas.
 """
 
 import os
@@ -12,5 +47,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('EVENTS_CHANNEL', '1')  # /events/ sólo se sirve aquí (ver EVENTS_ENABLED)
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.metrics.QueryMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,18 +83,89 @@ REST_FRAMEWORK = {
 AUTH_USER_MODEL = 'api.User'
 CORS_ALLOW_ALL_ORIGINS = True
 
+# POS: permitir despachar desde otra sucursal cuando la sucursal de la caja no tiene stock
+POS_CROSS_BRANCH_FALLBACK = False
+
+# Métricas por vista (api/metrics.py): Server-Timing, /super/metrics/ y log de peticiones lentas
+METRICS_SLOW_REQUEST_MS = int(os.environ.get('METRICS_SLOW_REQUEST_MS', '500'))
+METRICS_SLOW_REQUEST_QUERIES = int(os.environ.get('METRICS_SLOW_REQUEST_QUERIES', '50'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # para que Prometheus lea /super/metrics/ sin sesión
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {'api.metrics': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False}},
+}
+
 WSGI_APPLICATION = 'core.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=postgres en producción; SQLite queda para desarrollo.
+# PostgreSQL: pool de conexiones de psycopg (psycopg[binary,pool] en requirements.txt) y health checks.
+# Django no permite pool + CONN_MAX_AGE, así que con DB_POOL=0 se usan conexiones persistentes por worker.
+# SQLite: espera por el lock (DB_SQLITE_TIMEOUT segundos) y transacciones IMMEDIATE, que lo toman al empezar
+# en vez de fallar con "database is locked" a mitad de la venta. DB_SQLITE_WAL=1 activa WAL (lectores no bloquean al escritor);
+# queda apagado por defecto porque el modo WAL se guarda en el archivo y modificaría el db.sqlite3 del repositorio.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    DB_POOL = os.environ.get('DB_POOL', '1') == '1'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'temucosoft'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('DB_POOL_MIN', '2')),
+                    'max_size': int(os.environ.get('DB_POOL_MAX', '20')),
+                    'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+                },
+            } if DB_POOL else {},
+        }
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            # Con ASGI usar DB_CONN_MAX_AGE=0: cada petición corre su código síncrono en un hilo propio (ver core/asgi.py)
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+            'OPTIONS': {
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;' if os.environ.get('DB_SQLITE_WAL') == '1' else '',
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': int(os.environ.get('DB_SQLITE_TIMEOUT', '20')),  # sqlite3 lo aplica como busy_timeout
+            },
+        }
+    }
+
+
+# Caché: 'locmem' (desarrollo, un solo proceso), 'file' o 'redis' (compartida entre workers).
+# Las claves van por empresa y se invalidan con señales (api/cache.py).
+CACHE_BACKENDS = {
+    'locmem': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'temucosoft'},
+    'file': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / '.cache'))},
+    'redis': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': os.environ.get('CACHE_LOCATION', 'redis://127.0.0.1:6379/1')},
+}
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHES = {
+    'default': {**CACHE_BACKENDS[CACHE_BACKEND], 'KEY_PREFIX': 'temucosoft', 'TIMEOUT': 3600},
 }
+# Canal en vivo /events/ (api/events.py): numera los eventos con cache.incr, que debe ser atómico y compartido.
+# Con varios workers se necesita redis; locmem sirve para un solo proceso (desarrollo). Con 'file' incr no es
+# atómico (dos ventas podrían pisarse el lote), así que el canal queda apagado.
+# Sólo se sirve con ASGI: core/asgi.py define EVENTS_CHANNEL=1. Con WSGI no se publica nada (nadie lo leería);
+# un proceso aparte que deba publicar (manage.py import_products por cron, con redis) define EVENTS_CHANNEL=1.
+EVENTS_ENABLED = CACHE_BACKEND != 'file' and os.environ.get('EVENTS_CHANNEL') == '1'
 
 
 # Password validation